@@ -0,0 +1,126 @@
+"""
+Async versions of the read-only API endpoints, for ASGI deployments.
+
+Django 4.0 has no async ORM, so the database work of a request runs in its own worker thread through sync_to_async
+(thread sensitive, one thread per request under ASGI) while the event loop keeps serving other requests. BGG lookups
+release that thread while BoardGameGeek answers. Responses are built by the serializers, paginators and response
+cache of the synchronous views.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.db.models import Prefetch
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from rest_framework.exceptions import NotAuthenticated, ValidationError
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.views import exception_handler
+
+from api.pagination import KeysetCursorPagination, StatsCursorPagination
+from api.serializers import GameSerializer, GameRetrieveSerializer, GameRetrieveQuerySerializer, StatsSerializer
+from bg_tracker.models import Game, Score, Statistic
+from services.bgg_info import alookup_bgg_info
+from services.cache import get_or_set
+from services.overall_stat import StatsFromModels
+from services.queries import filter_model_or_qs
+
+
+def _json(data, status=200):
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+def _authenticated_request(request):
+    # DRF request authenticated like the synchronous views (token, basic or session).
+    request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    if not request.user.is_authenticated:
+        raise NotAuthenticated()
+    return request
+
+
+def _respond(build, request, kwargs):
+    # Everything touching the database, in the request's worker thread. Errors are answered like DRF would.
+    try:
+        return build(_authenticated_request(request), **kwargs), 200
+    except Exception as error:
+        response = exception_handler(error, {})
+        if response is None:
+            raise
+        return response.data, response.status_code
+
+
+def async_api_view(build):
+    """
+    Turn build(request, **kwargs), returning the response data, into an async GET view.
+
+    build gets an authenticated DRF request and runs in a worker thread, so it can use the ORM.
+    """
+    @functools.wraps(build)
+    async def view(request, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return _json({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+        return _json(*await sync_to_async(_respond)(build, request, kwargs))
+    return view
+
+
+def _paginate(request, queryset, serializer_class, pagination_class):
+    paginator = pagination_class()
+    page = paginator.paginate_queryset(queryset, request)
+    serializer = serializer_class(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data).data
+
+
+@async_api_view
+def game_list(request):
+    return get_or_set('api-game-list', request.user.pk,
+                      lambda: _paginate(request, filter_model_or_qs(Game, user_id=request.user), GameSerializer,
+                                        KeysetCursorPagination),
+                      variant=request.build_absolute_uri())
+
+
+@async_api_view
+def game_detail(request, slug):
+    query = GameRetrieveQuerySerializer(data=request.query_params)
+    query.is_valid(raise_exception=True)
+
+    def build():
+        game = get_object_or_404(filter_model_or_qs(Game, user_id=request.user), slug=slug)
+        return GameRetrieveSerializer(game, context={'request': request} | query.validated_data).data
+    return get_or_set('api-game-detail', request.user.pk, build, game_slug=slug,
+                      variant=request.build_absolute_uri())
+
+
+@async_api_view
+def stats_list(request, game_slug):
+    stats = filter_model_or_qs(Statistic, game__slug=game_slug, user_id=request.user).select_related('winner') \
+        .prefetch_related('players', Prefetch('score_set', queryset=Score.objects.select_related('player')))
+    return get_or_set('api-stats-list', request.user.pk,
+                      lambda: _paginate(request, stats, StatsSerializer, StatsCursorPagination),
+                      game_slug=game_slug, variant=request.build_absolute_uri())
+
+
+@async_api_view
+def overall_stat(request, game_slug):
+    return get_or_set('api-overall-stat', request.user.pk,
+                      lambda: StatsFromModels(game_slug=game_slug, user=request.user).get_overall_stat(),
+                      game_slug=game_slug)
+
+
+async def bgg_lookup(request):
+    # BoardGameGeek details of ?game_name=, the thread is only held for the cache and the authentication.
+    try:
+        await sync_to_async(_authenticated_request)(request)
+        game_name = request.GET.get('game_name', '').strip()
+        if not game_name:
+            raise ValidationError({'game_name': ['This field is required.']})
+    except Exception as error:
+        response = exception_handler(error, {})
+        if response is None:
+            raise
+        return _json(response.data, status=response.status_code)
+
+    info = await alookup_bgg_info(game_name)
+    if info is None:
+        return _json({'detail': 'Not found.'}, status=404)
+    return _json(info)
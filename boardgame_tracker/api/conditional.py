@@ -0,0 +1,57 @@
+from functools import wraps
+
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date, quote_etag
+
+from bg_tracker.models import Game, Statistic
+from services.cache import ALL_GAMES, get_etag, get_last_modified
+
+CONDITIONAL_HEADERS = ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE', 'HTTP_IF_MATCH', 'HTTP_IF_UNMODIFIED_SINCE')
+
+
+def _owned(user, game_slug, statistic_pk):
+    if not user.is_authenticated:
+        return False
+    if statistic_pk is not None:
+        return Statistic.objects.filter(pk=statistic_pk, user_id=user, game__slug=game_slug).exists()
+    if game_slug not in (None, ALL_GAMES):
+        return Game.objects.filter(slug=game_slug, user_id=user).exists()
+    return True
+
+
+def conditional(name, game_slug_kwarg=None, statistic_kwarg=None):
+    """
+    Add ETag and Last-Modified to a GET handler of an API view and answer matching requests with 304.
+
+    Both are derived from the response cache versions of the user (and game), so a 304 costs the authentication
+    queries and one exists() query checking that the user owns the game (or statistic): the handler, its queries
+    and serializers are skipped. Unknown or foreign objects reach the handler and get its 404, and validators are
+    only added to 200 responses. The ETag also depends on the URL and the Accept header, since those select the
+    page and the renderer. A view routed with and without the game slug kwarg covers all games when it's missing.
+    """
+    def decorator(handler):
+        @wraps(handler)
+        def inner(request, *args, **kwargs):
+            game_slug = kwargs.get(game_slug_kwarg, ALL_GAMES) if game_slug_kwarg else None
+            # computed before the handler, so they can't describe newer data than the response
+            variant = f'{request.build_absolute_uri()} {request.META.get("HTTP_ACCEPT", "")}'
+            etag = quote_etag(get_etag(name, request.user.pk, game_slug, variant=variant))
+            last_modified = int(get_last_modified(request.user.pk, game_slug).timestamp())
+
+            response = None
+            if any(header in request.META for header in CONDITIONAL_HEADERS) and \
+                    _owned(request.user, game_slug, kwargs.get(statistic_kwarg) if statistic_kwarg else None):
+                response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = handler(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+
+            if request.method in ('GET', 'HEAD'):
+                response.headers.setdefault('Last-Modified', http_date(last_modified))
+                response.headers.setdefault('ETag', etag)
+            return response
+        return inner
+
+    return method_decorator(decorator)
@@ -0,0 +1,24 @@
+from services.instrumentation import get_request_metrics, timed
+
+
+def _timed_method(method):
+    def wrapper(*args, **kwargs):
+        with timed('serializer'):
+            return method(*args, **kwargs)
+    return wrapper
+
+
+class InstrumentedSerializerMixin:
+    """
+    Time the validation and representation of the view's serializers as the "serializer" section of the request
+    metrics of RequestInstrumentationMiddleware. Does nothing when the middleware is off.
+
+    Only the outermost serializer is timed, so nested and list children aren't counted twice.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if get_request_metrics() is not None:
+            serializer.run_validation = _timed_method(serializer.run_validation)
+            serializer.to_representation = _timed_method(serializer.to_representation)
+        return serializer
@@ -3,22 +3,32 @@ import logging
 from rest_framework import permissions
 
 from bg_tracker.models import Statistic
-from services.queries import instance_get
+from services.queries import filter_model_or_qs
 
 logger = logging.getLogger(__name__)
 
 
 class IsOwnerStatistic(permissions.BasePermission):
+    """
+    The statistic of the URL belongs to the user.
+
+    Ownership is checked by the query fetching the statistic, which is kept as request.statistic for the view and
+    its serializer, with its game needed by the cache invalidation.
+    """
+
     def has_permission(self, request, view):
-        stat_id = request.resolver_match.kwargs.get('pk')
-        try:
-            obj = instance_get(Statistic, pk=stat_id)
-        except Statistic.DoesNotExist as e:
-            logger.warning(f'{type(e)}, {e}; fields: [id] - {stat_id}')
-        else:
-            return request.user and request.user.is_authenticated and obj.user_id == request.user
+        if not (request.user and request.user.is_authenticated):
+            return False
+        stat_id = view.kwargs.get('pk')
+        request.statistic = filter_model_or_qs(Statistic, pk=stat_id, user_id=request.user.pk) \
+            .select_related('game').first()
+        if request.statistic is None:
+            logger.warning(f'statistic not found for user {request.user.pk}; fields: [id] - {stat_id}')
+            return False
+        return True
 
 
 class IsOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        return request.user and request.user.is_authenticated and obj.user_id == request.user
+        # compares ids, obj.user_id would load the user again
+        return request.user and request.user.is_authenticated and obj.user_id_id == request.user.pk
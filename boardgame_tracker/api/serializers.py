@@ -1,8 +1,17 @@
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer
 
 from bg_tracker.models import Game, Player, Statistic, Score
-from services.queries import filter_model_or_qs, create_model_instance, filter_game_stat, add_players_in_stats
+from services.queries import create_model_instance, filter_game_stat, get_players_by_username
+from services.ratings import add_statistic_to_ratings
+from services.rollups import add_statistic_to_rollups, add_scores_to_rollups
+from services.trends import count_periods, latest_date_to
 
 
 class PlayerSerializer(ModelSerializer):
@@ -20,15 +29,37 @@ class ScoreSerializer(ModelSerializer):
         model = Score
         fields = ('stats_id', 'player', 'score')
 
+    def validate(self, attrs):
+        # ScoreAPIView passes the statistic its permission fetched, so it isn't loaded again
+        stat = self.context.get('statistic')
+        if stat is None:
+            return attrs
+        if attrs['stats_id'] != stat.pk:
+            raise serializers.ValidationError('stats_id must be the statistic of the URL')
+        return {field: value for field, value in attrs.items() if field != 'stats_id'} | {'stats': stat}
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            score = super().create(validated_data)
+            add_scores_to_rollups(score.stats, score)
+        return score
+
     def to_representation(self, instance):
         response = super().to_representation(instance)
         response['player'] = instance.player.username
         return response
 
 
+class StatScoreSerializer(serializers.Serializer):
+    """A score nested in a statistic, the player is referenced by username."""
+    player = serializers.CharField(max_length=100, source='player.username')
+    score = serializers.IntegerField()
+
+
 class StatsSerializer(ModelSerializer):
     user_id = serializers.HiddenField(default=serializers.CurrentUserDefault())
-    scores = serializers.SerializerMethodField('get_score', read_only=True)
+    # score_set is prefetched together with the players by StatsAPIView.get_queryset
+    scores = StatScoreSerializer(source='score_set', many=True, required=False)
     players = PlayerSerializer(many=True)
     winner = PlayerSerializer()
 
@@ -36,17 +67,81 @@ class StatsSerializer(ModelSerializer):
         model = Statistic
         fields = ('id', 'stats_name', 'game_date', 'duration', 'comments', 'winner', 'players', 'scores', 'user_id')
 
-    def get_score(self, stat):
-        scores = filter_model_or_qs(Score, stats=stat)
-        return [ScoreSerializer(score).data for score in scores]
+    def validate(self, attrs):
+        # Usernames are resolved to the user's players with a single query, whatever the number of players.
+        scores = attrs.get('score_set', [])
+        usernames = {attrs['winner']['username'], *(player['username'] for player in attrs['players']),
+                     *(score['player']['username'] for score in scores)}
+        players = get_players_by_username(attrs['user_id'], usernames)
+        unknown = usernames - players.keys()
+        if unknown:
+            raise serializers.ValidationError(f'Unknown players: {", ".join(sorted(unknown))}')
+
+        score_players = [score['player']['username'] for score in scores]
+        if len(score_players) != len(set(score_players)):
+            raise serializers.ValidationError('Only one score can be given per player')
+        if not set(score_players) <= {player['username'] for player in attrs['players']}:
+            raise serializers.ValidationError('Scores can only be given for the players of the game')
+
+        attrs['winner'] = players[attrs['winner']['username']]
+        attrs['players'] = list({player['username']: players[player['username']] for player in attrs['players']}
+                                .values())
+        attrs['score_set'] = [{'player': players[score['player']['username']], 'score': score['score']}
+                              for score in scores]
+        return attrs
 
     def create(self, validated_data):
         players = validated_data.pop('players')
-        stat = create_model_instance(Statistic, **validated_data)
-        add_players_in_stats(stat, *players)
+        scores = validated_data.pop('score_set')
+        with transaction.atomic():
+            stat = create_model_instance(Statistic, **validated_data)
+            Statistic.players.through.objects.bulk_create(
+                [Statistic.players.through(statistic_id=stat.id, player_id=player.id) for player in players])
+            scores = Score.objects.bulk_create([Score(stats=stat, **score) for score in scores])
+            add_statistic_to_rollups(stat, [player.id for player in players])
+            add_scores_to_rollups(stat, *scores)
+            add_statistic_to_ratings(stat, [player.id for player in players])
         return stat
 
 
+class ImportScoreSerializer(serializers.Serializer):
+    player = serializers.CharField(max_length=100)
+    score = serializers.IntegerField()
+
+
+class ImportScoresField(serializers.ListField):
+    # Scores as exported, [{'player': username, 'score': score}], or as the older {username: score} dict.
+    child = ImportScoreSerializer()
+
+    def to_internal_value(self, data):
+        if isinstance(data, dict):
+            data = [{'player': player, 'score': score} for player, score in data.items()]
+        return super().to_internal_value(data)
+
+
+class StatsImportSerializer(serializers.Serializer):
+    """One play of a bulk import, players are referenced by username and resolved from context['players']."""
+    stats_name = serializers.CharField(max_length=100)
+    game_date = serializers.DateField()
+    duration = serializers.TimeField(default=datetime.time())
+    comments = serializers.CharField(allow_blank=True, allow_null=True, required=False)
+    winner = serializers.CharField(max_length=100)
+    players = serializers.ListField(child=serializers.CharField(max_length=100), allow_empty=False)
+    scores = ImportScoresField(required=False, default=list)
+
+    def validate(self, attrs):
+        known_players = self.context['players']
+        score_players = [score['player'] for score in attrs['scores']]
+        unknown = {attrs['winner'], *attrs['players'], *score_players} - known_players.keys()
+        if unknown:
+            raise serializers.ValidationError(f'Unknown players: {", ".join(sorted(unknown))}')
+        if len(score_players) != len(set(score_players)):
+            raise serializers.ValidationError('Only one score can be given per player')
+        if not set(score_players) <= set(attrs['players']):
+            raise serializers.ValidationError('Scores can only be given for the players of the game')
+        return attrs
+
+
 class GameSerializer(serializers.Serializer):
     url = serializers.CharField(source='get_absolute_url', read_only=True)
     game_name = serializers.CharField(max_length=255)
@@ -57,6 +152,10 @@ class GameSerializer(serializers.Serializer):
 
 
 class GameRetrieveSerializer(ModelSerializer):
+    """
+    Game with the URLs of the user's statistics, or with a summary of them when the context has stats='summary':
+    their count, the URL of the paginated statistics list and the latest `stats_limit` statistics.
+    """
     game_stats = serializers.SerializerMethodField('get_stat_url')
     url = serializers.CharField(source='get_absolute_url', read_only=True)
 
@@ -65,4 +164,44 @@ class GameRetrieveSerializer(ModelSerializer):
         fields = ('id', 'game_name', 'url', 'image', 'game_stats')
 
     def get_stat_url(self, game):
-        return [stat.get_absolute_url(game) for stat in filter_game_stat(game, user_id=self.context['request'].user)]
+        stats = filter_game_stat(game, user_id=self.context['request'].user)
+        # stats-detail URLs are the stats-list URL followed by the id, reversed once rather than once per statistic
+        stats_url = reverse('stats-list', kwargs={'game_slug': game.slug})
+        if self.context.get('stats') != 'summary':
+            return [f'{stats_url}{pk}/' for pk in stats.order_by('pk').values_list('pk', flat=True)]
+
+        latest = stats.order_by('-game_date', '-pk').values('pk', 'stats_name', 'game_date')
+        latest = latest[:self.context['stats_limit']]
+        return {'count': stats.count(), 'url': stats_url,
+                'latest': [{'id': stat['pk'], 'stats_name': stat['stats_name'],
+                            'game_date': stat['game_date'].isoformat(), 'url': f'{stats_url}{stat["pk"]}/'}
+                           for stat in latest]}
+
+
+class GameRetrieveQuerySerializer(serializers.Serializer):
+    stats = serializers.ChoiceField(choices=('urls', 'summary'), default='urls')
+    stats_limit = serializers.IntegerField(min_value=1, max_value=settings.API_MAX_PAGE_SIZE, default=10)
+
+
+class GameSuggestQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(trim_whitespace=False)
+    limit = serializers.IntegerField(min_value=1, max_value=settings.API_MAX_PAGE_SIZE, default=10)
+
+
+class TrendsQuerySerializer(serializers.Serializer):
+    period = serializers.ChoiceField(choices=('week', 'month', 'year'), default='month')
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate_date_to(self, value):
+        if value > latest_date_to():
+            raise serializers.ValidationError('date_to is too far in the future')
+        return value
+
+    def validate(self, attrs):
+        if 'date_from' in attrs and 'date_to' in attrs and attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError('date_from must not be after date_to')
+        if 'date_from' in attrs and count_periods(attrs['period'], attrs['date_from'], attrs.get(
+                'date_to', timezone.localdate())) > settings.TRENDS_MAX_BUCKETS:
+            raise serializers.ValidationError(f'at most {settings.TRENDS_MAX_BUCKETS} periods can be requested')
+        return attrs
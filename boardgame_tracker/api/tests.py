@@ -1,14 +1,28 @@
 import json
 import datetime
+from unittest import mock
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Sum
+from django.http import JsonResponse
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from asgiref.sync import async_to_sync
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase
 
 from api.serializers import PlayerSerializer, GameSerializer, StatsSerializer
-from bg_tracker.models import Player, Game, Statistic, Score
+from bg_tracker.models import Player, Game, Statistic, Score, GameStatsRollup, BggCatalog
+from services.export import iter_play_history
+from services.overall_stat import StatsFromModels
+from services.rollups import find_rollup_drift, rebuild_rollups
+from services.suggest import SuggestionIndex, invalidate_suggestions, suggestion_index
 
 User = get_user_model()
 
@@ -26,7 +40,7 @@ class PlayerAPITestCase(APITestCase):
         response = self.client.get(reverse('players'))
         serializer_data = PlayerSerializer(Player.objects.filter(user_friend=self.user), many=True).data
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(serializer_data, response.data)
+        self.assertEqual(serializer_data, response.data['results'])
 
     def test_post(self):
         data = {'username': 'john'}
@@ -58,7 +72,27 @@ class GameAPITestCase(APITestCase):
         response = self.client.get(reverse('game-list'))
         serializer_data = GameSerializer(user_games, many=True).data
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(serializer_data, response.data)
+        self.assertEqual(serializer_data, response.data['results'])
+
+    def test_list_pagination(self):
+        url = reverse('game-list')
+        response = self.client.get(url, {'page_size': 3})
+        self.assertEqual([game['game_name'] for game in response.data['results']],
+                         ['a feast for odin', 'terraforming mars', 'too many bones'])
+        self.assertIsNone(response.data['previous'])
+
+        # a game added after the first page was served doesn't shift the next one
+        Game.objects.create(game_name='azul', image='azul.com').user_id.add(self.user)
+        response = self.client.get(response.data['next'])
+        self.assertEqual([game['game_name'] for game in response.data['results']], ['catan', 'azul'])
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNone(response.data['previous'])
+
+        response = self.client.get(url, {'cursor': 'garbage'})
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
 
     def test_create(self):
         url = reverse('game-list')
@@ -84,6 +118,22 @@ class GameAPITestCase(APITestCase):
         self.assertEqual(self.user.game_set.count(), 6)
         self.assertEqual(Game.objects.count(), 6)
 
+        # a case variant of an existing game reuses it
+        response = self.client.post(url, data=json.dumps({'game_name': 'ARKHAM HORROR', 'image': 'https://ah.com'}),
+                                    content_type='application/json')
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.assertEqual(Game.objects.count(), 6)
+
+    def test_create_from_catalog(self):
+        cache.clear()
+        BggCatalog.objects.create(bgg_id=15987, name='Arkham Horror', query='arkham horror', min_players=1,
+                                  max_players=8, playing_time=240, image='https://cf.geekdo-images.com/15987.jpg')
+        response = self.client.post(reverse('game-list'),
+                                    data={'game_name': 'Arkham Horror', 'image': 'https://ah.com'})
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        game = self.user.game_set.get(game_name='Arkham Horror')
+        self.assertEqual((game.bgg_id, game.max_players, game.image), (15987, 8, 'https://ah.com'))
+
     def test_destroy(self):
         url = reverse('game-detail', kwargs={'slug': 'catan'})
         response = self.client.delete(url)
@@ -103,6 +153,39 @@ class GameAPITestCase(APITestCase):
         self.assertEqual(status.HTTP_200_OK, response.status_code)
         self.assertEqual(response.data, expected_data)
 
+    def test_retrieve_stat_urls(self):
+        game = Game.objects.get(slug='catan')
+        bob = Player.objects.create(username='bob', user_friend=self.user)
+        stats = Statistic.objects.bulk_create([
+            Statistic(user_id=self.user, game=game, stats_name=f'game {day}', winner=bob,
+                      game_date=datetime.date(2022, 6, day)) for day in range(1, 4)])
+        url = reverse('game-detail', kwargs={'slug': 'catan'})
+        response = self.client.get(url)
+        self.assertEqual(response.data['game_stats'], [stat.get_absolute_url(game) for stat in stats])
+
+        Statistic.objects.bulk_create([Statistic(user_id=self.user, game=game, stats_name='more', winner=bob)
+                                       for _ in range(20)])
+        cache.clear()
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['game_stats']), 23)
+
+    def test_retrieve_stats_summary(self):
+        game = Game.objects.get(slug='catan')
+        bob = Player.objects.create(username='bob', user_friend=self.user)
+        stats = Statistic.objects.bulk_create([
+            Statistic(user_id=self.user, game=game, stats_name=f'game {day}', winner=bob,
+                      game_date=datetime.date(2022, 6, day)) for day in range(1, 4)])
+        url = reverse('game-detail', kwargs={'slug': 'catan'})
+        response = self.client.get(url, {'stats': 'summary', 'stats_limit': 2})
+        self.assertEqual(response.data['game_stats'], {
+            'count': 3, 'url': reverse('stats-list', kwargs={'game_slug': 'catan'}),
+            'latest': [{'id': stat.pk, 'stats_name': stat.stats_name, 'game_date': stat.game_date.isoformat(),
+                        'url': stat.get_absolute_url(game)} for stat in stats[:0:-1]]})
+
+        response = self.client.get(url, {'stats': 'all'})
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
 
 class StatsAPIViewTestCase(APITestCase):
 
@@ -146,12 +229,130 @@ class StatsAPIViewTestCase(APITestCase):
         self.assertEqual(Statistic.objects.count(), 3)
         self.assertEqual(Statistic.objects.last().user_id, self.user)
 
+    def test_create_and_destroy_update_rollups(self):
+        rebuild_rollups()
+        url = reverse('stats-list', kwargs={'game_slug': 'catan'})
+        data = {
+            'stats_name': 'First stat',
+            'game_date': f'{datetime.date(2022, 6, 4)}',
+            'duration': f'{datetime.time(1, 2, 30)}',
+            'winner': {'username': 'bob'},
+            'players': [{'username': 'bob'}, {'username': 'john'}]
+        }
+        self.client.post(url, data=json.dumps(data), content_type='application/json')
+        rollup = GameStatsRollup.objects.get(user=self.user, player__username='bob')
+        self.assertEqual((rollup.count_played_game, rollup.count_win, rollup.played_minutes), (1, 2, 62))
+        self.assertEqual(find_rollup_drift(), {})
+
+        self.client.delete(reverse('stats-detail', kwargs={'game_slug': 'catan', 'pk': 1}))
+        rollup.refresh_from_db()
+        self.assertEqual(rollup.count_win, 1)
+        self.assertEqual(find_rollup_drift(), {})
+
+    def _stat_with_scores(self, players):
+        return {'stats_name': 'Game night', 'game_date': '2022-06-05', 'duration': '01:00:00',
+                'winner': {'username': players[0]},
+                'players': [{'username': username} for username in players],
+                'scores': [{'player': username, 'score': score} for score, username in enumerate(players)]}
+
+    def test_create_with_scores(self):
+        rebuild_rollups()
+        url = reverse('stats-list', kwargs={'game_slug': 'catan'})
+        response = self.client.post(url, data=self._stat_with_scores(['bob', 'john']), format='json')
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.assertEqual(response.data['scores'], [{'player': 'bob', 'score': 0}, {'player': 'john', 'score': 1}])
+        self.assertEqual([player['username'] for player in response.data['players']], ['bob', 'john'])
+        stat = Statistic.objects.get(pk=response.data['id'])
+        self.assertEqual(stat.score_set.count(), 2)
+        self.assertEqual(find_rollup_drift(), {})
+
+    def test_create_queries_do_not_grow_with_players(self):
+        url = reverse('stats-list', kwargs={'game_slug': 'catan'})
+        for i in range(6):
+            Player.objects.create(username=f'player{i}', user_friend=self.user)
+        self.client.post(url, data=self._stat_with_scores(['bob', 'john']), format='json')
+
+        with CaptureQueriesContext(connection) as two_players:
+            self.client.post(url, data=self._stat_with_scores(['bob', 'john']), format='json')
+        with CaptureQueriesContext(connection) as eight_players:
+            response = self.client.post(url, data=self._stat_with_scores(
+                ['bob', 'john', *(f'player{i}' for i in range(6))]), format='json')
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.assertEqual(len(two_players), len(eight_players))
+
+    def test_create_rejects_invalid_scores(self):
+        url = reverse('stats-list', kwargs={'game_slug': 'catan'})
+        other_user_player = Player.objects.create(username='marie', user_friend=self.user_2)
+        for data, message in (
+                (self._stat_with_scores(['bob', other_user_player.username]), 'Unknown players: marie'),
+                (self._stat_with_scores(['bob']) | {'scores': [{'player': 'john', 'score': 3}]},
+                 'Scores can only be given for the players of the game'),
+                (self._stat_with_scores(['bob']) | {'scores': [{'player': 'bob', 'score': 3}] * 2},
+                 'Only one score can be given per player')):
+            response = self.client.post(url, data=data, format='json')
+            self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+            self.assertIn(message, str(response.data))
+        self.assertEqual(Statistic.objects.count(), 2)
+        self.assertFalse(Score.objects.exists())
+
     def test_list(self):
         url = reverse('stats-list', kwargs={'game_slug': 'catan'})
         response = self.client.get(url)
         serializer_data = StatsSerializer(Statistic.objects.all(), many=True).data
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(serializer_data, response.data)
+        self.assertEqual(serializer_data, response.data['results'])
+
+    def test_list_is_cached_until_a_stat_is_created(self):
+        url = reverse('stats-list', kwargs={'game_slug': 'catan'})
+        self.client.get(url)
+        with self.assertNumQueries(2):  # session + user
+            self.assertEqual(len(self.client.get(url).data['results']), 2)
+
+        self.client.post(url, data=self._stat_with_scores(['bob', 'john']), format='json')
+        self.assertEqual(len(self.client.get(url).data['results']), 3)
+        self.assertEqual(len(self.client.get(url, {'page_size': 1}).data['results']), 1)
+
+    def test_list_pagination(self):
+        url = reverse('stats-list', kwargs={'game_slug': 'catan'})
+        game = Game.objects.get(slug='catan')
+        john = Player.objects.get(username='john')
+        for day in (1, 2, 2, 3):
+            Statistic.objects.create(user_id=self.user, game=game, stats_name=f'day {day}', winner=john,
+                                     game_date=datetime.date(2021, 1, day))
+
+        names = []
+        response = self.client.get(url, {'page_size': 2})
+        while True:
+            names.extend(stat['stats_name'] for stat in response.data['results'])
+            if response.data['next'] is None:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(names, ['first game', 'day 3', 'day 2', 'day 2', 'day 1', 'second game'])
+
+    def test_list_queries(self):
+        url = reverse('stats-list', kwargs={'game_slug': 'catan'})
+        bob, john = Player.objects.all()
+        for stat in Statistic.objects.all():
+            stat.players.add(bob, john)
+            Score.objects.create(stats=stat, player=bob, score=10)
+            Score.objects.create(stats=stat, player=john, score=20)
+
+        # session + user + statistics with winners + prefetched players + prefetched scores with players
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['results'][0]['scores'], [{'player': 'bob', 'score': 10},
+                                                                 {'player': 'john', 'score': 20}])
+
+        game = Game.objects.get(slug='catan')
+        for i in range(10):
+            stat = Statistic.objects.create(user_id=self.user, game=game, stats_name=f'game {i}', winner=john)
+            stat.players.add(bob, john)
+            Score.objects.create(stats=stat, player=john, score=i)
+
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 12)
 
     def test_retrieve(self):
         url = reverse('stats-detail', kwargs={'game_slug': 'catan', 'pk': 1})
@@ -221,3 +422,598 @@ class ScoreAPITestcase(APITestCase):
         self.assertEqual(status.HTTP_201_CREATED, response_2.status_code)
         self.assertEqual(Score.objects.count(), 2)
         self.assertEqual(Score.objects.filter(stats=self.stat).count(), 2)
+
+        rollup = GameStatsRollup.objects.get(user=self.user, player=1)
+        self.assertEqual((rollup.count_score, rollup.sum_score, rollup.min_score, rollup.max_score), (1, 30, 30, 30))
+
+    def test_ownership_is_checked_with_the_fetch(self):
+        # session, user, statistic and game, player, savepoint, insert, two rollup writes, release
+        url = reverse('score', kwargs={'game_slug': 'catan', 'pk': self.stat.pk})
+        with self.assertNumQueries(9):
+            response = self.client.post(url, {'stats_id': self.stat.pk, 'player': 2, 'score': 44}, format='json')
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.assertEqual(response.data, {'player': 'john', 'score': 44})
+
+        # session, user, statistic, players, scores
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('stats-detail', kwargs={'game_slug': 'catan', 'pk': self.stat.pk}))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+    def test_create_for_another_statistic(self):
+        other_user = User.objects.create(username='joe', email='joe@ex.com')
+        joe = Player.objects.create(username='joe', user_friend=other_user)
+        other_stat = Statistic.objects.create(user_id=other_user, game=self.stat.game, stats_name='other', winner=joe)
+        url = reverse('score', kwargs={'game_slug': 'catan', 'pk': other_stat.pk})
+        response = self.client.post(url, {'stats_id': other_stat.pk, 'player': joe.pk, 'score': 1}, format='json')
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
+        # the statistic of the body must be the one the permission was checked for
+        url = reverse('score', kwargs={'game_slug': 'catan', 'pk': self.stat.pk})
+        response = self.client.post(url, {'stats_id': other_stat.pk, 'player': joe.pk, 'score': 1}, format='json')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertFalse(Score.objects.exists())
+
+
+class OverallGameStatAPITestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='bob', email='bob@ex.com')
+        self.client.force_login(self.user)
+
+        game = Game.objects.create(game_name='catan', image=f'catan.com')
+        game.user_id.add(self.user)
+
+        bob = Player.objects.create(username='bob', user_friend=self.user)
+        john = Player.objects.create(username='john', user_friend=self.user)
+
+        for winner, duration, scores in ((bob, datetime.time(1, 30), (40, 20)),
+                                         (john, datetime.time(0, 45), (10, 35)),
+                                         (bob, datetime.time(2, 0), (55, 30))):
+            stat = Statistic.objects.create(user_id=self.user, game_id=game.id, stats_name='game',
+                                            duration=duration, winner=winner,
+                                            game_date=datetime.date(2022, 6, 4))
+            stat.players.add(bob, john)
+            Score.objects.create(stats=stat, player=bob, score=scores[0])
+            Score.objects.create(stats=stat, player=john, score=scores[1])
+
+    def test_get(self):
+        expected_data = {'count_win': 2, 'percent_win': 66.67, 'count_played_game': 3, 'count_lose': 1,
+                         'percent_lose': 33.33, 'sum_played_time': '04:15', 'best_score': 55, 'min_score': 10}
+        response = self.client.get(reverse('overall_stat', kwargs={'game_slug': 'catan'}))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(expected_data, response.data)
+
+    def test_get_queries(self):
+        # player and rollup lookups + one aggregate over statistics + one aggregate over scores
+        with self.assertNumQueries(4):
+            StatsFromModels(game_slug='catan', user=self.user).get_overall_stat()
+
+    def test_get_from_rollup(self):
+        expected_data = StatsFromModels(game_slug='catan', user=self.user).get_overall_stat()
+        rebuild_rollups()
+        # player and rollup lookups only
+        with self.assertNumQueries(2):
+            data = StatsFromModels(game_slug='catan', user=self.user).get_overall_stat()
+        self.assertEqual(expected_data, data)
+
+    def test_get_without_plays(self):
+        Game.objects.create(game_name='azul', image='azul.com').user_id.add(self.user)
+        response = self.client.get(reverse('overall_stat', kwargs={'game_slug': 'azul'}))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(response.data['count_played_game'], 0)
+        self.assertEqual(response.data['sum_played_time'], '00:00')
+        self.assertIsNone(response.data['best_score'])
+
+
+class BulkStatsAPITestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='bob', email='bob@ex.com')
+        self.client.force_login(self.user)
+        self.game = Game.objects.create(game_name='catan', image='catan.com')
+        self.game.user_id.add(self.user)
+        Player.objects.create(username='bob', user_friend=self.user)
+        Player.objects.create(username='john', user_friend=self.user)
+        self.url = reverse('stats-bulk', kwargs={'game_slug': 'catan'})
+
+    def plays(self, count):
+        return [{'stats_name': f'game {i}', 'game_date': '2022-06-04', 'duration': '01:00:00',
+                 'winner': 'bob' if i % 2 else 'john', 'players': ['bob', 'john'],
+                 'scores': {'bob': i, 'john': 10}} for i in range(count)]
+
+    def test_create(self):
+        response = self.client.post(self.url, data=json.dumps(self.plays(20)), content_type='application/json')
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.assertEqual(response.data, {'created': 20})
+        self.assertEqual(Statistic.objects.filter(user_id=self.user, game=self.game).count(), 20)
+        self.assertEqual(Statistic.players.through.objects.count(), 40)
+        self.assertEqual(Score.objects.filter(player__username='bob').aggregate(Sum('score'))['score__sum'], 190)
+        self.assertEqual(find_rollup_drift(), {})
+
+    def test_queries_do_not_grow_with_batch(self):
+        self.client.post(self.url, data=json.dumps(self.plays(1)), content_type='application/json')
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(self.url, data=json.dumps(self.plays(5)), content_type='application/json')
+        # kept below SQLite's 999 parameters per query, above it bulk_create splits its inserts
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(self.url, data=json.dumps(self.plays(100)), content_type='application/json')
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_unknown_player(self):
+        plays = self.plays(2)
+        plays[1]['players'].append('marie')
+        response = self.client.post(self.url, data=json.dumps(plays), content_type='application/json')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertIn('Unknown players: marie', str(response.data[1]))
+        self.assertEqual(Statistic.objects.count(), 0)
+
+
+class ExportAPITestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='bob', email='bob@ex.com')
+        self.client.force_login(self.user)
+        catan = Game.objects.create(game_name='catan', image='catan.com')
+        azul = Game.objects.create(game_name='azul', image='azul.com')
+        bob = Player.objects.create(username='bob', user_friend=self.user)
+        john = Player.objects.create(username='john', user_friend=self.user)
+        for game, name in ((catan, 'first game'), (azul, 'second game')):
+            stat = Statistic.objects.create(user_id=self.user, game=game, stats_name=name, winner=bob,
+                                            duration=datetime.time(1, 30), game_date=datetime.date(2022, 6, 4))
+            stat.players.add(bob, john)
+            Score.objects.create(stats=stat, player=bob, score=30)
+            Score.objects.create(stats=stat, player=john, score=20)
+
+        other_user = User.objects.create(username='joe', email='joe@ex.com')
+        Statistic.objects.create(user_id=other_user, game=catan, stats_name='not mine',
+                                 winner=Player.objects.create(username='joe', user_friend=other_user))
+
+    def test_ndjson(self):
+        response = self.client.get(reverse('export', kwargs={'export_format': 'ndjson'}))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        plays = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([play['stats_name'] for play in plays], ['first game', 'second game'])
+        self.assertEqual(plays[0], {'id': 1, 'game': 'catan', 'stats_name': 'first game', 'game_date': '2022-06-04',
+                                    'duration': '01:30:00', 'comments': None, 'winner': 'bob',
+                                    'players': ['bob', 'john'],
+                                    'scores': [{'player': 'bob', 'score': 30}, {'player': 'john', 'score': 20}]})
+
+    def test_csv(self):
+        response = self.client.get(reverse('export', kwargs={'export_format': 'csv'}), {'game': 'azul'})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines, ['id,game,stats_name,game_date,duration,comments,winner,players,scores',
+                                 '2,azul,second game,2022-06-04,01:30:00,,bob,"[""bob"", ""john""]",'
+                                 '"[{""player"": ""bob"", ""score"": 30}, {""player"": ""john"", ""score"": 20}]"'])
+
+    def test_queries_per_chunk(self):
+        with self.assertNumQueries(3):
+            list(iter_play_history(self.user))
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse('export', kwargs={'export_format': 'xml'}))
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+
+class ConditionalGetAPITestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='bob', email='bob@ex.com')
+        self.client.force_login(self.user)
+        self.game = Game.objects.create(game_name='catan', image='catan.com')
+        self.game.user_id.add(self.user)
+        self.bob = Player.objects.create(username='bob', user_friend=self.user)
+        stat = Statistic.objects.create(user_id=self.user, game=self.game, stats_name='first game', winner=self.bob,
+                                        game_date=datetime.date(2022, 6, 4))
+        stat.players.add(self.bob)
+
+    def test_not_modified(self):
+        # session + user, and the ownership check of the game or statistic
+        for url, queries in ((reverse('game-list'), 2), (reverse('game-detail', kwargs={'slug': 'catan'}), 3),
+                             (reverse('stats-list', kwargs={'game_slug': 'catan'}), 3),
+                             (reverse('stats-detail', kwargs={'game_slug': 'catan', 'pk': 1}), 3),
+                             (reverse('overall_stat', kwargs={'game_slug': 'catan'}), 3)):
+            response = self.client.get(url)
+            self.assertEqual(status.HTTP_200_OK, response.status_code, url)
+            self.assertTrue(response.has_header('Last-Modified'), url)
+
+            with self.assertNumQueries(queries), mock.patch.object(StatsSerializer, 'to_representation') as serialize:
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code, url)
+            serialize.assert_not_called()
+
+    def test_no_validators_for_missing_or_foreign_objects(self):
+        url = reverse('stats-detail', kwargs={'game_slug': 'catan', 'pk': 1})
+        etag = self.client.get(url)['ETag']
+        Statistic.objects.filter(pk=1).update(user_id=User.objects.create(username='joe', email='joe@ex.com'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+        self.assertFalse(response.has_header('ETag'))
+
+        url = reverse('game-detail', kwargs={'slug': 'catan'})
+        etag = self.client.get(url)['ETag']
+        self.user.game_set.clear()
+        self.assertEqual(status.HTTP_404_NOT_FOUND, self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code)
+
+    def test_etag_changes_with_the_data(self):
+        url = reverse('stats-list', kwargs={'game_slug': 'catan'})
+        etag = self.client.get(url)['ETag']
+        self.assertNotEqual(self.client.get(url, {'page_size': 1})['ETag'], etag)
+        self.assertNotEqual(self.client.get(url, HTTP_ACCEPT='text/html')['ETag'], etag)
+
+        stat = Statistic.objects.create(user_id=self.user, game=self.game, stats_name='second game',
+                                        winner=self.bob, game_date=datetime.date(2022, 6, 5))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(len(response.data['results']), 2)
+
+        Score.objects.create(stats=stat, player=self.bob, score=10)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(response.data['results'][0]['scores'], [{'player': 'bob', 'score': 10}])
+
+    def test_if_modified_since(self):
+        url = reverse('overall_stat', kwargs={'game_slug': 'catan'})
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+
+
+class TrendsAPITestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='bob', email='bob@ex.com')
+        self.client.force_login(self.user)
+        self.game = Game.objects.create(game_name='catan', image='catan.com')
+        self.game.user_id.add(self.user)
+        self.bob = Player.objects.create(username='bob', user_friend=self.user)
+        self.john = Player.objects.create(username='john', user_friend=self.user)
+        for day, winner, duration, scores in ((datetime.date(2021, 1, 4), self.bob, datetime.time(1), (40, 20)),
+                                              (datetime.date(2021, 1, 20), self.john, datetime.time(0, 30), (10, 50)),
+                                              (datetime.date(2021, 3, 1), self.bob, datetime.time(2), (31, 30))):
+            self.add_stat(day, winner, duration, scores)
+        self.url = reverse('trends', kwargs={'game_slug': 'catan'})
+
+    def add_stat(self, day, winner, duration=datetime.time(1), scores=(0, 0)):
+        stat = Statistic.objects.create(user_id=self.user, game=self.game, stats_name='game', game_date=day,
+                                        winner=winner, duration=duration)
+        stat.players.add(self.bob, self.john)
+        Score.objects.create(stats=stat, player=self.bob, score=scores[0])
+        Score.objects.create(stats=stat, player=self.john, score=scores[1])
+
+    def test_months(self):
+        response = self.client.get(self.url, {'period': 'month', 'date_from': '2021-01-15', 'date_to': '2021-03-01'})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(response.data['period'], 'month')
+        january, february, march = response.data['results']
+        self.assertEqual(january, {'period_start': datetime.date(2021, 1, 1), 'count_played_game': 2, 'count_win': 1,
+                                   'percent_win': 50.0, 'sum_played_time': '01:30', 'avg_score': 25.0,
+                                   'best_score': 40, 'min_score': 10})
+        self.assertEqual((february['count_played_game'], february['best_score']), (0, None))
+        self.assertEqual((march['period_start'], march['count_win'], march['sum_played_time']),
+                         (datetime.date(2021, 3, 1), 1, '02:00'))
+
+    def test_default_range_and_years(self):
+        response = self.client.get(self.url, {'period': 'year', 'date_to': '2022-12-31'})
+        self.assertEqual([(bucket['period_start'].year, bucket['count_played_game'])
+                          for bucket in response.data['results']], [(2021, 3), (2022, 0)])
+
+    def test_weeks(self):
+        response = self.client.get(self.url, {'period': 'week', 'date_from': '2021-01-01', 'date_to': '2021-01-10'})
+        self.assertEqual([(bucket['period_start'], bucket['count_played_game']) for bucket in response.data['results']],
+                         [(datetime.date(2020, 12, 28), 0), (datetime.date(2021, 1, 4), 1)])
+
+    def test_closed_buckets_are_cached(self):
+        params = {'period': 'month', 'date_from': '2020-01-01', 'date_to': '2021-12-31'}
+        # session + user + player + one grouped query for every bucket
+        with self.assertNumQueries(4):
+            self.client.get(self.url, params)
+        with self.assertNumQueries(3):
+            cached = self.client.get(self.url, params).data['results']
+        self.assertEqual(len(cached), 24)
+
+        # a play added to a closed month only recomputes that month
+        self.add_stat(datetime.date(2021, 1, 30), self.bob, scores=(90, 0))
+        with CaptureQueriesContext(connection) as queries:
+            results = self.client.get(self.url, params).data['results']
+        self.assertIn('"bg_tracker_statistic"."game_date" >= \'2021-01-01\'', queries[-1]['sql'])
+        self.assertNotIn('2021-03-01', queries[-1]['sql'])
+        self.assertEqual((results[12]['count_played_game'], results[12]['best_score']), (3, 90))
+        self.assertEqual(results[14], cached[14])
+
+    def test_invalid_query(self):
+        response = self.client.get(self.url, {'period': 'day'})
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        response = self.client.get(self.url, {'date_from': '2022-01-01', 'date_to': '2021-01-01'})
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        for period in ('week', 'month', 'year'):
+            response = self.client.get(self.url, {'period': period, 'date_to': '9999-12-31'})
+            self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        response = self.client.get(self.url, {'date_from': '0001-01-01', 'date_to': '2021-01-01'})
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+    @override_settings(TRENDS_MAX_BUCKETS=2)
+    def test_default_range_is_bounded(self):
+        response = self.client.get(self.url, {'period': 'month', 'date_to': '2021-12-31'})
+        self.assertEqual([bucket['period_start'] for bucket in response.data['results']],
+                         [datetime.date(2021, 11, 1), datetime.date(2021, 12, 1)])
+        response = self.client.get(self.url, {'period': 'week', 'date_from': '2021-01-01', 'date_to': '2021-01-10'})
+        self.assertEqual(len(response.data['results']), 2)
+        response = self.client.get(self.url, {'period': 'week', 'date_from': '2021-01-01', 'date_to': '2021-01-11'})
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+
+class LeaderboardAPITestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='bob', email='bob@ex.com')
+        self.client.force_login(self.user)
+        catan = Game.objects.create(game_name='catan', image='catan.com')
+        azul = Game.objects.create(game_name='azul', image='azul.com')
+        catan.user_id.add(self.user)
+        azul.user_id.add(self.user)
+        self.bob, self.john, self.ann = (Player.objects.create(username=username, user_friend=self.user)
+                                         for username in ('bob', 'john', 'ann'))
+        Player.objects.create(username='marie', user_friend=self.user)
+        self.add_stat(catan, self.bob, [self.bob, self.john, self.ann], {self.bob: 30, self.john: 20})
+        self.add_stat(catan, self.john, [self.bob, self.john], {self.bob: 10, self.john: 40})
+        self.add_stat(catan, self.bob, [self.bob, self.ann], {})
+        self.add_stat(azul, self.ann, [self.bob, self.ann], {self.ann: 70})
+
+    def add_stat(self, game, winner, players, scores):
+        stat = Statistic.objects.create(user_id=self.user, game=game, stats_name='game', winner=winner)
+        stat.players.add(*players)
+        for player, score in scores.items():
+            Score.objects.create(stats=stat, player=player, score=score)
+
+    def test_all_games(self):
+        response = self.client.get(reverse('leaderboard_stat'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        rows = {row['player']: row for row in response.data['players']}
+        self.assertEqual([row['player'] for row in response.data['players']], ['bob', 'john', 'ann', 'marie'])
+        self.assertEqual(rows['bob'], {'player_id': self.bob.id, 'player': 'bob', 'count_played_game': 4,
+                                       'count_win': 2, 'percent_win': 50.0, 'avg_score': 20.0, 'rating': None})
+        self.assertEqual(rows['ann'], {'player_id': self.ann.id, 'player': 'ann', 'count_played_game': 3,
+                                       'count_win': 1, 'percent_win': 33.33, 'avg_score': 70.0, 'rating': None})
+        self.assertEqual(rows['marie']['avg_score'], None)
+
+        head_to_head = response.data['head_to_head']
+        bob, john, ann = self.bob.id, self.john.id, self.ann.id
+        self.assertEqual(head_to_head[bob][ann], {'count_played_game': 3, 'count_win': 2, 'count_lose': 1})
+        self.assertEqual(head_to_head[ann][bob], {'count_played_game': 3, 'count_win': 1, 'count_lose': 2})
+        self.assertEqual(head_to_head[john][ann], {'count_played_game': 1, 'count_win': 0, 'count_lose': 0})
+        self.assertNotIn(rows['marie']['player_id'], head_to_head)
+
+    def test_one_game(self):
+        response = self.client.get(reverse('game_leaderboard_stat', kwargs={'game_slug': 'azul'}))
+        rows = {row['player']: row for row in response.data['players']}
+        self.assertEqual((rows['ann']['count_win'], rows['bob']['count_played_game'], rows['john']['count_win']),
+                         (1, 1, 0))
+        self.assertEqual(response.data['head_to_head'], {
+            self.ann.id: {self.bob.id: {'count_played_game': 1, 'count_win': 1, 'count_lose': 0}},
+            self.bob.id: {self.ann.id: {'count_played_game': 1, 'count_win': 0, 'count_lose': 1}}})
+
+    def test_winner_outside_the_players_and_shared_names(self):
+        catan = Game.objects.get(slug='catan')
+        other_john = Player.objects.create(username='john', user_friend=self.user)
+        self.add_stat(catan, self.ann, [self.bob, other_john], {})
+        self.add_stat(catan, other_john, [other_john, self.bob], {})
+        cache.clear()
+        head_to_head = self.client.get(reverse('game_leaderboard_stat', kwargs={'game_slug': 'catan'})) \
+            .data['head_to_head']
+        # ann won a game she didn't play, nobody lost to her there
+        self.assertEqual(head_to_head[self.ann.id][self.bob.id]['count_win'], 0)
+        self.assertEqual(head_to_head[other_john.id][self.bob.id], {'count_played_game': 2, 'count_win': 1,
+                                                                    'count_lose': 0})
+        self.assertEqual(head_to_head[self.john.id][self.bob.id], {'count_played_game': 2, 'count_win': 1,
+                                                                   'count_lose': 1})
+
+    def test_unknown_game(self):
+        response = self.client.get(reverse('game_leaderboard_stat', kwargs={'game_slug': 'unknown'}))
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    def test_queries_do_not_grow_with_players(self):
+        for i in range(20):
+            player = Player.objects.create(username=f'player{i}', user_friend=self.user)
+            self.add_stat(Game.objects.get(slug='catan'), player, [player, self.bob], {player: i})
+        cache.clear()
+        # session + user + players + wins + scores + beaten pairs + shared games
+        with self.assertNumQueries(7):
+            self.client.get(reverse('leaderboard_stat'))
+
+    def test_cache_follows_plays(self):
+        url = reverse('game_leaderboard_stat', kwargs={'game_slug': 'azul'})
+        self.client.get(reverse('leaderboard_stat'))
+        self.client.get(url)
+        self.add_stat(Game.objects.get(slug='azul'), self.bob, [self.bob, self.ann], {})
+        self.assertEqual(self.client.get(url).data['head_to_head'][self.bob.id][self.ann.id]['count_win'], 1)
+        rows = {row['player']: row for row in self.client.get(reverse('leaderboard_stat')).data['players']}
+        self.assertEqual(rows['bob']['count_win'], 3)
+
+
+@override_settings(MIDDLEWARE=['bg_tracker.middleware.RequestInstrumentationMiddleware', *settings.MIDDLEWARE],
+                   REQUEST_SLOW_MS=60 * 1000, REQUEST_DUPLICATE_QUERIES=3)
+class InstrumentationAPITestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='bob', email='bob@ex.com')
+        self.client.force_login(self.user)
+        self.game = Game.objects.create(game_name='catan', image='catan.com')
+        self.game.user_id.add(self.user)
+        self.bob = Player.objects.create(username='bob', user_friend=self.user)
+        stat = Statistic.objects.create(user_id=self.user, game=self.game, stats_name='first game', winner=self.bob)
+        stat.players.add(self.bob)
+
+    def test_server_timing(self):
+        with self.assertLogs('api', level='INFO') as logs, CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('stats-list', kwargs={'game_slug': 'catan'}))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn(f'desc="{len(queries)} queries, 0 duplicates"', timing)
+        for section in ('serializer', 'render', 'total'):
+            self.assertIn(f'{section};dur=', timing)
+
+        [record] = logs.records
+        self.assertEqual(record.levelname, 'INFO')
+        self.assertEqual(record.request_metrics['queries'], len(queries))
+        self.assertIn('view=stats-list status=200', record.getMessage())
+
+    def test_duplicate_queries(self):
+        # one query per statistic: a likely N+1
+        def game_dates(request):
+            return JsonResponse([stat.game_date.isoformat() for stat in Statistic.objects.all() for _ in
+                                 Statistic.objects.filter(pk=stat.pk)], safe=False)
+
+        Statistic.objects.bulk_create([Statistic(user_id=self.user, game=self.game, stats_name='again',
+                                                 winner=self.bob) for _ in range(3)])
+        with mock.patch('api.views.OverallGameStatAPIView.get', lambda view, request, **kwargs: game_dates(request)), \
+                self.assertLogs('api', level='WARNING') as logs:
+            response = self.client.get(reverse('overall_stat', kwargs={'game_slug': 'catan'}))
+        self.assertIn('3 duplicates', response['Server-Timing'])
+        self.assertIn('repeated=4', logs.output[0])
+
+    @override_settings(REQUEST_SLOW_MS=0)
+    def test_slow_request(self):
+        with self.assertLogs('api', level='WARNING') as logs:
+            self.client.get(reverse('game-list'))
+        self.assertIn('slow=1', logs.output[0])
+
+
+class AsyncAPITestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='bob', email='bob@ex.com')
+        self.game = Game.objects.create(game_name='catan', image='catan.com')
+        self.game.user_id.add(self.user)
+        self.bob = Player.objects.create(username='bob', user_friend=self.user)
+        stat = Statistic.objects.create(user_id=self.user, game=self.game, stats_name='first game', winner=self.bob,
+                                        game_date=datetime.date(2022, 6, 4))
+        stat.players.add(self.bob)
+        Score.objects.create(stats=stat, player=self.bob, score=12)
+        self.token = Token.objects.create(user=self.user)
+
+    def test_same_responses_as_the_sync_views(self):
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+        for sync_url, async_url in (
+                (reverse('game-list'), reverse('async_game_list')),
+                (reverse('game-detail', kwargs={'slug': 'catan'}),
+                 reverse('async_game_detail', kwargs={'slug': 'catan'})),
+                (reverse('stats-list', kwargs={'game_slug': 'catan'}),
+                 reverse('async_stats_list', kwargs={'game_slug': 'catan'})),
+                (reverse('overall_stat', kwargs={'game_slug': 'catan'}),
+                 reverse('async_overall_stat', kwargs={'game_slug': 'catan'}))):
+            cache.clear()
+            expected = self.client.get(sync_url).json()
+            cache.clear()
+            response = async_to_sync(self.async_get)(async_url)
+            self.assertEqual(status.HTTP_200_OK, response.status_code, async_url)
+            self.assertEqual(response.json(), expected, async_url)
+
+    async def async_get(self, url, data=None, **extra):
+        return await self.async_client.get(url, data, **extra)
+
+    async def test_errors(self):
+        url = reverse('async_game_detail', kwargs={'slug': 'catan'})
+        self.assertEqual((await self.async_client.get(url)).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        auth = {'AUTHORIZATION': f'Token {self.token.key}'}
+        response = await self.async_client.get(url, {'stats': 'all'}, **auth)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('stats', response.json())
+        missing = reverse('async_game_detail', kwargs={'slug': 'azul'})
+        self.assertEqual((await self.async_client.get(missing, **auth)).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual((await self.async_client.post(url, **auth)).status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    @mock.patch('services.bgg_info.fetch_bgg_info')
+    async def test_bgg_lookup(self, fetch):
+        fetch.side_effect = lambda game_name, conn=None: {'bgg_id': 13, 'image': 'catan.jpg', 'min_players': 3,
+                                                          'max_players': 4, 'playing_time': 90} \
+            if game_name.lower() == 'catan' else None
+        url = reverse('async_bgg_lookup')
+        auth = {'AUTHORIZATION': f'Token {self.token.key}'}
+        for _ in range(2):
+            response = await self.async_client.get(url, {'game_name': 'Catan'}, **auth)
+            self.assertEqual(response.json()['bgg_id'], 13)
+        fetch.assert_called_once()
+        self.assertEqual((await self.async_client.get(url, {'game_name': 'azul'}, **auth)).status_code,
+                         status.HTTP_404_NOT_FOUND)
+        self.assertEqual((await self.async_client.get(url, **auth)).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class GameSuggestAPITestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create(username='bob', email='bob@ex.com'))
+        for game in ('terraforming mars', 'Café International', 'catan', 'Mars Open: Tabletop Grand Prix'):
+            Game.objects.create(game_name=game, image=f'{game}.com')
+        BggCatalog.objects.create(bgg_id=27710, name='Catan Dice Game', query='catan dice game')
+        suggestion_index.build()
+        self.url = reverse('game_suggest')
+
+    def suggest(self, q, **params):
+        response = self.client.get(self.url, {'q': q, **params})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return response.data['results']
+
+    def test_suggest(self):
+        # names starting with the query first, then names with a later word starting with it
+        self.assertEqual(self.url, '/api/v1/games/suggest/')
+        self.assertEqual(self.suggest('MAR'), ['Mars Open: Tabletop Grand Prix', 'terraforming mars'])
+        self.assertEqual(self.suggest('Mars', limit=1), ['Mars Open: Tabletop Grand Prix'])
+        self.assertEqual(self.suggest('cafe  inter'), ['Café International'])
+        self.assertEqual(self.suggest('catan'), ['catan', 'Catan Dice Game'])
+        self.assertEqual(self.suggest('dice'), ['Catan Dice Game'])
+        self.assertEqual(self.suggest('!'), [])
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'q': 'cat', 'limit': 0}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+        # answered from memory
+        with CaptureQueriesContext(connection) as queries:
+            self.suggest('terra')
+        self.assertFalse([query for query in queries.captured_queries if 'bg_tracker' in query['sql']])
+
+    def test_game_named_suggest(self):
+        game = Game.objects.create(game_name='Suggest', image='suggest.com')
+        game.user_id.add(User.objects.get(email='bob@ex.com'))
+        response = self.client.get(reverse('game-detail', kwargs={'slug': 'suggest'}))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(response.data['game_name'], 'Suggest')
+
+    def test_game_changes_update_the_index(self):
+        Game.objects.create(game_name='Azul', image='azul.com')
+        game = Game.objects.get(slug='catan')
+        game.game_name = 'Catan: Seafarers'
+        game.save()
+        Game.objects.get(slug='terraforming-mars').delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(suggestion_index.search('azul'), ['Azul'])
+            self.assertEqual(suggestion_index.search('catan'), ['Catan Dice Game', 'Catan: Seafarers'])
+            self.assertEqual(suggestion_index.search('mars'), ['Mars Open: Tabletop Grand Prix'])
+
+        # writes without signals leave a gap in the change log, which rebuilds the index
+        Game.objects.bulk_create([Game(game_name='Marco Polo', slug='marco-polo')])
+        invalidate_suggestions()
+        self.assertEqual(self.suggest('mar'), ['Marco Polo', 'Mars Open: Tabletop Grand Prix'])
+
+    def test_other_processes_replay_the_changes(self):
+        other_process = SuggestionIndex()
+        other_process.build()
+        Game.objects.create(game_name='Azul', image='azul.com')
+        Game.objects.get(slug='catan').delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(other_process.search('azul'), ['Azul'])
+            self.assertEqual(other_process.search('catan'), ['Catan Dice Game'])
+
+        # a change missing from the log, e.g. expired, rebuilds the index
+        Game.objects.create(game_name='Brass', image='brass.com')
+        cache.delete(f'suggest:change:{suggestion_index.version}')
+        with self.assertNumQueries(2):
+            self.assertEqual(other_process.search('brass'), ['Brass'])
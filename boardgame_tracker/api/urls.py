@@ -2,7 +2,9 @@ from django.urls import path
 
 from rest_framework.routers import SimpleRouter
 
-from .views import PayerAPIView, ScoreAPIView, OverallGameStatAPIView, GameViewSet, StatsAPIView
+from . import async_views
+from .views import PayerAPIView, ScoreAPIView, OverallGameStatAPIView, GameViewSet, StatsAPIView, ExportAPIView, \
+    TrendsAPIView, LeaderboardAPIView, GameSuggestAPIView
 
 router = SimpleRouter()
 router.register(r'game', GameViewSet, basename='game')
@@ -10,7 +12,18 @@ router.register(r'game/(?P<game_slug>[^/.]+)/stats', StatsAPIView, basename='sta
 
 urlpatterns = [
     path('players/', PayerAPIView.as_view(), name='players'),
+    path('games/suggest/', GameSuggestAPIView.as_view(), name='game_suggest'),
     path('game/<slug:game_slug>/stats/<int:pk>/score/', ScoreAPIView.as_view(), name='score'),
     path('game/<slug:game_slug>/overall/', OverallGameStatAPIView.as_view(), name='overall_stat'),
+    path('game/<slug:game_slug>/trends/', TrendsAPIView.as_view(), name='trends'),
+    path('game/<slug:game_slug>/leaderboard/', LeaderboardAPIView.as_view(), name='game_leaderboard_stat'),
+    path('leaderboard/', LeaderboardAPIView.as_view(), name='leaderboard_stat'),
+    path('export/<str:export_format>/', ExportAPIView.as_view(), name='export'),
+
+    path('async/game/', async_views.game_list, name='async_game_list'),
+    path('async/game/<slug:slug>/', async_views.game_detail, name='async_game_detail'),
+    path('async/game/<slug:game_slug>/stats/', async_views.stats_list, name='async_stats_list'),
+    path('async/game/<slug:game_slug>/overall/', async_views.overall_stat, name='async_overall_stat'),
+    path('async/bgg/', async_views.bgg_lookup, name='async_bgg_lookup'),
 ] + router.urls
 
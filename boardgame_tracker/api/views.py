@@ -1,40 +1,87 @@
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 
 from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet
-from rest_framework import generics, mixins
+from rest_framework import generics, mixins, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from api.conditional import conditional
+from api.instrumentation import InstrumentedSerializerMixin
+from api.pagination import StatsCursorPagination
 from api.permissions import IsOwnerStatistic, IsOwner
-from api.serializers import GameSerializer, PlayerSerializer, StatsSerializer, GameRetrieveSerializer, ScoreSerializer
-from bg_tracker.models import Game, Player, Statistic
+from api.serializers import GameSerializer, PlayerSerializer, StatsSerializer, GameRetrieveSerializer, \
+    ScoreSerializer, StatsImportSerializer, TrendsQuerySerializer, GameRetrieveQuerySerializer, \
+    GameSuggestQuerySerializer
+from bg_tracker.models import Game, Player, Statistic, Score
+from services.bgg_info import get_cached_bgg_info
+from services.bulk_import import import_statistics
+from services.cache import ALL_GAMES, get_or_set
+from services.export import EXPORT_FORMATS, iter_play_history
+from services.leaderboards import get_leaderboard
 from services.overall_stat import StatsFromModels
+from services.rollups import delete_statistics
+from services.suggest import suggest_game_names
+from services.trends import get_trends
 from services.queries import add_user_in_game_set, game_exists_in_db, add_game_to_user, instance_get, \
-    filter_model_or_qs, remove_user_from_game_set, game_added_by_user
+    filter_model_or_qs, remove_user_from_game_set, game_added_by_user, get_players_by_username
 
 User = get_user_model()
 
 
-class StatsAPIView(mixins.CreateModelMixin,
+class StatsAPIView(InstrumentedSerializerMixin,
+                   mixins.CreateModelMixin,
                    mixins.RetrieveModelMixin,
                    mixins.DestroyModelMixin,
                    mixins.ListModelMixin,
                    GenericViewSet):
     serializer_class = StatsSerializer
     permission_classes = (IsOwner,)
+    pagination_class = StatsCursorPagination
 
     def get_queryset(self):
-        return filter_model_or_qs(Statistic, game__slug=self.kwargs.get('game_slug'), user_id=self.request.user)
+        return filter_model_or_qs(Statistic, game__slug=self.kwargs.get('game_slug'), user_id=self.request.user) \
+            .select_related('winner') \
+            .prefetch_related('players', Prefetch('score_set', queryset=Score.objects.select_related('player')))
+
+    @conditional('api-stats-list', game_slug_kwarg='game_slug')
+    def list(self, request, *args, **kwargs):
+        data = get_or_set('api-stats-list', request.user.pk,
+                          lambda: super(StatsAPIView, self).list(request, *args, **kwargs).data,
+                          game_slug=self.kwargs.get('game_slug'), variant=request.build_absolute_uri())
+        return Response(data)
+
+    @conditional('api-stats-detail', game_slug_kwarg='game_slug', statistic_kwarg='pk')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
     def perform_create(self, serializer):
-        serializer.validated_data['game'] = instance_get(Game, slug=self.kwargs.get('game_slug'))
-        serializer.validated_data['players'] = [instance_get(Player, **player) for player in
-                                                serializer.validated_data['players']]
-        serializer.validated_data['winner'] = instance_get(Player, **serializer.validated_data['winner'])
-        serializer.save()
+        # Players and scores are written by the serializer in one transaction, the statistic is then re-read with
+        # the list prefetches so the response costs a constant number of queries too.
+        stat = serializer.save(game=instance_get(Game, slug=self.kwargs.get('game_slug')))
+        serializer.instance = self.get_queryset().get(pk=stat.pk)
+
+    def perform_destroy(self, instance):
+        delete_statistics(filter_model_or_qs(Statistic, pk=instance.pk))
+
+    @action(detail=False, methods=['post'], url_path='bulk', permission_classes=(IsAuthenticated,))
+    def bulk(self, request, **kwargs):
+        game = get_object_or_404(Game, slug=self.kwargs.get('game_slug'), user_id=request.user)
+        players = get_players_by_username(request.user)
+        serializer = StatsImportSerializer(data=request.data, many=True, context={'players': players})
+        serializer.is_valid(raise_exception=True)
+        stats = import_statistics(request.user, game, serializer.validated_data, players)
+        return Response({'created': len(stats)}, status=status.HTTP_201_CREATED)
 
 
-class GameViewSet(mixins.CreateModelMixin,
+class GameViewSet(InstrumentedSerializerMixin,
+                  mixins.CreateModelMixin,
                   mixins.RetrieveModelMixin,
                   mixins.DestroyModelMixin,
                   mixins.ListModelMixin,
@@ -51,53 +98,115 @@ class GameViewSet(mixins.CreateModelMixin,
     def get_queryset(self):
         return filter_model_or_qs(Game, user_id=self.request.user)
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'retrieve':
+            query = GameRetrieveQuerySerializer(data=self.request.query_params)
+            query.is_valid(raise_exception=True)
+            context |= query.validated_data
+        return context
+
+    @conditional('api-game-list')
+    def list(self, request, *args, **kwargs):
+        data = get_or_set('api-game-list', request.user.pk,
+                          lambda: super(GameViewSet, self).list(request, *args, **kwargs).data,
+                          variant=request.build_absolute_uri())
+        return Response(data)
+
+    @conditional('api-game-detail', game_slug_kwarg='slug')
+    def retrieve(self, request, *args, **kwargs):
+        data = get_or_set('api-game-detail', request.user.pk,
+                          lambda: super(GameViewSet, self).retrieve(request, *args, **kwargs).data,
+                          game_slug=self.kwargs.get('slug'), variant=request.build_absolute_uri())
+        return Response(data)
+
     def perform_create(self, serializer):
         game_name = serializer.validated_data['game_name']
         game = game_exists_in_db(game_name)
 
-        if game is not None and game_added_by_user(game, self.request.user):
+        if game is not None and game_added_by_user(game.game_name, self.request.user):
             return Response(game)
 
         if game is not None:
             add_game_to_user(game, self.request.user)
             return Response(game)
 
-        serializer.save()
-        game = instance_get(Game, game_name=game_name)
-        add_user_in_game_set(game, user=self.request.user)
+        # BGG details known locally (catalog mirror, cache) are filled in, the image given by the user is kept
+        _, bgg_info = get_cached_bgg_info(game_name)
+        with transaction.atomic():
+            game = serializer.save(**{field: value for field, value in (bgg_info or {}).items() if field != 'image'})
+            add_user_in_game_set(game, user=self.request.user)
 
     def perform_destroy(self, instance):
         instance_user = instance_get(User, pk=self.request.user.pk)
         remove_user_from_game_set(instance_user, instance)
 
 
-class PayerAPIView(generics.ListCreateAPIView):
+class GameSuggestAPIView(APIView):
+    # Autocomplete of the add game form, from the in-process index of game and catalog names.
+
+    def get(self, request, **kwargs):
+        query = GameSuggestQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return Response({'results': suggest_game_names(query.validated_data['q'], query.validated_data['limit'])})
+
+
+class PayerAPIView(InstrumentedSerializerMixin, generics.ListCreateAPIView):
     serializer_class = PlayerSerializer
 
     def get_queryset(self):
         return filter_model_or_qs(Player, user_friend=self.request.user)
 
 
-class ScoreAPIView(generics.CreateAPIView):
+class ScoreAPIView(InstrumentedSerializerMixin, generics.CreateAPIView):
     serializer_class = ScoreSerializer
     permission_classes = (IsOwnerStatistic,)
 
+    def get_serializer_context(self):
+        return super().get_serializer_context() | {'statistic': self.request.statistic}
+
 
 class OverallGameStatAPIView(APIView):
 
+    @conditional('api-overall-stat', game_slug_kwarg='game_slug')
+    def get(self, request, **kwargs):
+        overall_game_stat = get_or_set('api-overall-stat', request.user.pk,
+                                       lambda: StatsFromModels(game_slug=self.kwargs['game_slug'],
+                                                               user=self.request.user).get_overall_stat(),
+                                       game_slug=self.kwargs['game_slug'])
+        return Response(overall_game_stat)
+
+
+class TrendsAPIView(APIView):
+
+    @conditional('api-trends', game_slug_kwarg='game_slug')
+    def get(self, request, **kwargs):
+        query = TrendsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        trends = get_trends(request.user, self.kwargs['game_slug'], **query.validated_data)
+        return Response({'period': query.validated_data['period'], 'results': trends})
+
+
+class LeaderboardAPIView(APIView):
+
+    @conditional('api-leaderboard', game_slug_kwarg='game_slug')
     def get(self, request, **kwargs):
-        overall_game_stat = StatsFromModels(game_slug=self.kwargs['game_slug'],
-                                            user=self.request.user)
-        count_win = overall_game_stat.get_count_win()
-        percent_win = overall_game_stat.get_percent_win(count_win=count_win)
-        count_lose = overall_game_stat.get_count_lose(count_win=count_win)
-        percent_lose = overall_game_stat.get_percent_lose(count_lose=count_lose)
-        best_score = overall_game_stat.get_max_score()
-        min_score = overall_game_stat.get_min_score()
-        sum_played_time = overall_game_stat.get_sum_played_times()
-        count_played_game = overall_game_stat.get_count_played_game()
-
-        return Response({'count_win': count_win['id__count'], 'percent_win': percent_win,
-                         'count_played_game': count_played_game['id__count'],
-                         'count_lose': count_lose, 'percent_lose': percent_lose, 'sum_played_time': sum_played_time,
-                         'best_score': best_score['mx'], 'min_score': min_score['mn']})
+        game_slug = self.kwargs.get('game_slug')
+        if game_slug is not None:
+            get_object_or_404(filter_model_or_qs(Game, user_id=request.user), slug=game_slug)
+        leaderboard = get_or_set('api-leaderboard', request.user.pk,
+                                 lambda: get_leaderboard(request.user, game_slug=game_slug),
+                                 game_slug=game_slug or ALL_GAMES)
+        return Response(leaderboard)
+
+
+class ExportAPIView(APIView):
+
+    def get(self, request, export_format, **kwargs):
+        if export_format not in EXPORT_FORMATS:
+            raise NotFound(f'Unknown export format: {export_format}')
+        to_lines, content_type = EXPORT_FORMATS[export_format]
+        plays = iter_play_history(request.user, game_slug=request.query_params.get('game'))
+        response = StreamingHttpResponse(to_lines(plays), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="plays.{export_format}"'
+        return response
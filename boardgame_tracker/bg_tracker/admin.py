@@ -1,8 +1,14 @@
 from django.contrib import admin
 
-from .models import Game, Player, Statistic, Score
+from .models import Game, Player, Statistic, Score, GameStatsRollup, BggLookup, BackgroundTask, \
+    PlayerRating, BggCatalog
 
 admin.site.register(Game)
 admin.site.register(Player)
 admin.site.register(Score)
 admin.site.register(Statistic)
+admin.site.register(GameStatsRollup)
+admin.site.register(BggLookup)
+admin.site.register(BackgroundTask)
+admin.site.register(PlayerRating)
+admin.site.register(BggCatalog)
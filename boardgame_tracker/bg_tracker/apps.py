@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BgTrackerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bg_tracker'
+
+    def ready(self):
+        from . import signals  # noqa: F401
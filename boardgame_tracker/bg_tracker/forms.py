@@ -1,9 +1,14 @@
 from django import forms
-from django.forms import BaseModelFormSet, modelformset_factory
+from django.db import transaction
+from django.forms import BaseFormSet, formset_factory
 
 from .models import Player, Statistic, Game, Score
 from services.queries import create_model_instance, get_players_from_stat, add_players_in_stats, \
     add_user_in_game_set, filter_model_or_qs
+from services.cache import invalidate_stats
+from services.ratings import add_statistic_to_ratings
+from services.rollups import add_statistic_to_rollups, add_scores_to_rollups
+from services.trends import invalidate_trend_buckets
 
 
 class AddPlayerForm(forms.ModelForm):
@@ -23,6 +28,7 @@ class AddGameForm(forms.Form):
         user = self.cleaned_data.pop('user_id')
         game = create_model_instance(Game, **self.cleaned_data)
         add_user_in_game_set(game, user=user)
+        return game
 
 
 class AddStatisticForm(forms.ModelForm):
@@ -45,31 +51,44 @@ class AddStatisticForm(forms.ModelForm):
     def save(self, commit=True):
         players = self.cleaned_data.pop('players')
         players_id = [player.id for player in players]
-        stats = create_model_instance(Statistic, **self.cleaned_data)
-        add_players_in_stats(stats, *players_id)
+        with transaction.atomic():
+            stats = create_model_instance(Statistic, **self.cleaned_data)
+            add_players_in_stats(stats, *players_id)
+            add_statistic_to_rollups(stats, players_id)
+            add_statistic_to_ratings(stats, players_id)
         return stats
 
 
-class ScoreForm(forms.ModelForm):
-    class Meta:
-        model = Score
-        fields = ['player', 'score']
+class ScoreForm(forms.Form):
+    player = forms.TypedChoiceField()
+    score = forms.IntegerField()
 
-    def __init__(self, *args, **kwargs):
-        self._last_stat = kwargs.pop('last_stat')
+    def __init__(self, *args, players, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['player'].queryset = get_players_from_stat(self._last_stat)
+        # Choices come from the players prefetched with the statistic, so validating a form runs no query.
+        players_by_id = {player.id: player for player in players}
+        self.fields['player'].choices = [('', '---------')] + [(player.id, player) for player in players]
+        self.fields['player'].coerce = lambda player_id: players_by_id[int(player_id)]
 
-    def save(self, commit=True):
-        score = create_model_instance(Score, **self.cleaned_data)
-        return score
 
+class ScoreFormSet(BaseFormSet):
+    """One score form per player of the statistic, saved with a single bulk insert."""
 
-class ScoreFormSet(BaseModelFormSet):
-    def __init__(self, *args, extra, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.extra = extra
-        self.queryset = Score.objects.none()
+    def __init__(self, *args, stat, **kwargs):
+        self.stat = stat
+        players = list(get_players_from_stat(stat))
+        super().__init__(*args, form_kwargs={'players': players}, **kwargs)
+        self.extra = len(players)
+
+    def save(self):
+        with transaction.atomic():
+            scores = Score.objects.bulk_create([Score(stats=self.stat, **form.cleaned_data)
+                                                for form in self.forms if form.cleaned_data])
+            add_scores_to_rollups(self.stat, *scores)
+            # bulk inserts send no signals
+            invalidate_stats(self.stat.user_id_id, self.stat.game.slug)
+            invalidate_trend_buckets(self.stat.user_id_id, self.stat.game.slug, self.stat.game_date)
+        return scores
 
 
-ScoreSet = modelformset_factory(Score, ScoreForm, fields=('player', 'score'), formset=ScoreFormSet)
+ScoreSet = formset_factory(ScoreForm, formset=ScoreFormSet)
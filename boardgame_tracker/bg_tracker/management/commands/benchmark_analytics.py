@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.http import Http404
+
+from services.analytics.benchmark import benchmark_player, benchmark_synthetic
+from services.overall_stat import get_user_player
+from services.queries import instance_get
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compare the NumPy analytics with the pure Python baseline on synthetic data, or on the plays of a user.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                            help='Sizes of the synthetic datasets.')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per measure, the best one is reported.')
+        parser.add_argument('--user', help='Email of a user to benchmark on its own plays instead.')
+        parser.add_argument('--game', help='Slug of the game the --user plays are limited to.')
+
+    def report(self, result):
+        self.stdout.write(f'{result["rows"]:>9} rows: numpy {result["numpy"] * 1000:9.2f} ms, '
+                          f'python {result["python"] * 1000:9.2f} ms, '
+                          f'x{result["python"] / result["numpy"]:.1f}')
+
+    def handle(self, *args, **options):
+        if not options['user']:
+            for rows in options['rows']:
+                self.report(benchmark_synthetic(rows, repeat=options['repeat']))
+            return
+
+        try:
+            user = instance_get(User, email=options['user'])
+            player = get_user_player(user)
+        except (User.DoesNotExist, Http404):
+            raise CommandError(f'User {options["user"]} or its own player does not exist')
+        self.report(benchmark_player(player, user, game_slug=options['game'], repeat=options['repeat']))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from services.benchmarks import CONCURRENCY_SCENARIOS, benchmark_concurrency, get_busiest_game, get_busiest_user
+
+
+class Command(BaseCommand):
+    help = 'Compare the throughput of the synchronous API views under WSGI with their async versions under ASGI.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Email of the user to benchmark as, the user with most plays by default.')
+        parser.add_argument('--game', help='Slug of the game to benchmark, the most played one by default.')
+        parser.add_argument('--scenario', action='append', choices=CONCURRENCY_SCENARIOS, dest='scenarios')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario and handler.')
+        parser.add_argument('--concurrency', type=int, default=20, help='Requests in flight in the ASGI event loop.')
+        parser.add_argument('--threads', type=int, default=1, help='Threads of the WSGI worker.')
+        parser.add_argument('--warm', action='store_true', help='Serve the responses from the response cache.')
+
+    def handle(self, *args, **options):
+        if min(options['requests'], options['concurrency'], options['threads']) < 1:
+            raise CommandError('--requests, --concurrency and --threads must be positive')
+        user = get_busiest_user(options['user'])
+        if user is None:
+            raise CommandError(f'User {options["user"]} does not exist' if options['user']
+                               else 'There is no user, run generate_data')
+        game_slug = options['game'] or get_busiest_game(user)
+        if game_slug is None:
+            raise CommandError(f'{user.email} has no game')
+
+        try:
+            results = benchmark_concurrency(user, game_slug, scenarios=options['scenarios'],
+                                            requests=options['requests'], concurrency=options['concurrency'],
+                                            threads=options['threads'], warm=options['warm'])
+        except ValueError as error:
+            raise CommandError(error)
+
+        self.stdout.write(f'{user.email}, game {game_slug}, {"warm" if options["warm"] else "cold"} cache, '
+                          f'{options["threads"]} WSGI thread(s), {options["concurrency"]} concurrent ASGI requests')
+        for name, handlers in results.items():
+            for handler, metrics in handlers.items():
+                self.stdout.write(f'{name:<14} {handler}  {metrics["rps"]:8.1f} req/s  '
+                                  f'p50 {metrics["p50_ms"]:8.2f} ms  p95 {metrics["p95_ms"]:8.2f} ms')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from services.cache import get_cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Show the hit/miss counters of the response cache. ' \
+           'Counters live in the cache itself, so a locmem cache only shows the current process.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing them.')
+
+    def handle(self, *args, **options):
+        for name, counters in get_cache_stats().items():
+            total = counters['hits'] + counters['misses']
+            ratio = f'{counters["hits"] / total:.1%}' if total else '-'
+            self.stdout.write(f'{name}: {counters["hits"]} hits, {counters["misses"]} misses, hit ratio {ratio}')
+        if options['reset']:
+            reset_cache_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset'))
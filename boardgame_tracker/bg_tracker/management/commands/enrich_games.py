@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from bg_tracker.models import Game
+from services.bgg_info import enqueue_games_enrichment, enrich_games
+
+
+class Command(BaseCommand):
+    help = 'Fetch the image and details of games from BoardGameGeek in one batched lookup.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('slugs', nargs='*', help='Games to enrich, every game without a BGG id by default.')
+        parser.add_argument('--background', action='store_true', help='Queue a background task instead.')
+
+    def handle(self, *args, **options):
+        games = Game.objects.filter(slug__in=options['slugs']) if options['slugs'] \
+            else Game.objects.filter(bgg_id__isnull=True)
+        games = list(games.only('id', 'slug'))
+        unknown = set(options['slugs']) - {game.slug for game in games}
+        if unknown:
+            raise CommandError(f'Unknown games: {", ".join(sorted(unknown))}')
+
+        if options['background']:
+            enqueue_games_enrichment(games)
+            self.stdout.write(self.style.SUCCESS(f'Queued the enrichment of {len(games)} game(s)'))
+            return
+        found = enrich_games([game.id for game in games])
+        self.stdout.write(self.style.SUCCESS(f'Enriched {len(found)} of {len(games)} game(s)'))
@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from services.export import EXPORT_FORMATS, iter_play_history
+from services.queries import instance_get
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Stream a user's full play history as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help='Email of the user to export.')
+        parser.add_argument('--format', choices=EXPORT_FORMATS.keys(), default='csv')
+        parser.add_argument('--game', help='Slug of a single game to export.')
+        parser.add_argument('--output', help='File to write to, stdout by default.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try:
+            user = instance_get(User, email=options['user'])
+        except User.DoesNotExist as e:
+            raise CommandError(e)
+
+        to_lines, _ = EXPORT_FORMATS[options['format']]
+        plays = iter_play_history(user, game_slug=options['game'], chunk_size=options['chunk_size'])
+        if options['output'] is None:
+            for line in to_lines(plays):
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as file:
+            file.writelines(to_lines(plays))
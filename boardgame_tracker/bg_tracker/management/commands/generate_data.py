@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from services.synthetic_data import GENERATE_BATCH_SIZE, SYNTHETIC_PASSWORD, generate_dataset
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic users, games, players, plays and scores to measure performance at scale.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--games', type=int, default=50, help='Games per user.')
+        parser.add_argument('--players', type=int, default=8, help='Players per user, the user included.')
+        parser.add_argument('--plays', type=int, default=1000, help='Plays per user.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=GENERATE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if min(options['users'], options['games'], options['plays'], options['batch_size']) < 1 \
+                or options['players'] < 2:
+            raise CommandError('Every count must be positive and a user needs at least 2 players')
+        generate_dataset(options['users'], options['games'], options['players'], options['plays'],
+                         seed=options['seed'], batch_size=options['batch_size'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {options["users"] * options["plays"]} plays of {options["users"]} users, '
+            f'password "{SYNTHETIC_PASSWORD}"'))
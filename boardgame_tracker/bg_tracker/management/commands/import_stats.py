@@ -0,0 +1,70 @@
+import csv
+import json
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api.serializers import StatsImportSerializer
+from bg_tracker.models import Game
+from services.bulk_import import import_statistics
+from services.queries import instance_get, get_players_by_username
+
+User = get_user_model()
+
+
+def read_csv(file):
+    # Players and scores are JSON columns as written by the CSV export. Older files separate the players by ';' and
+    # give the scores as 'username:score;username:score'.
+    for row in csv.DictReader(file):
+        play = {key: value for key, value in row.items() if value not in (None, '')}
+        players, scores = row.get('players') or '', row.get('scores') or ''
+        if players.lstrip().startswith('['):
+            play['players'] = json.loads(players)
+        else:
+            play['players'] = [name.strip() for name in players.split(';') if name.strip()]
+        if scores.lstrip().startswith('['):
+            play['scores'] = json.loads(scores)
+        else:
+            play['scores'] = dict(score.rsplit(':', 1) for score in scores.split(';') if score.strip())
+        yield play
+
+
+class Command(BaseCommand):
+    help = 'Import a play history from a CSV, JSON or NDJSON file with bulk inserts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=Path)
+        parser.add_argument('--user', required=True, help='Email of the user the plays belong to.')
+        parser.add_argument('--game', required=True, help='Slug of the game.')
+        parser.add_argument('--format', choices=('csv', 'json', 'ndjson'), help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            user = instance_get(User, email=options['user'])
+            game = instance_get(Game, slug=options['game'])
+        except (User.DoesNotExist, Game.DoesNotExist) as e:
+            raise CommandError(e)
+
+        file_format = options['format'] or options['path'].suffix.lstrip('.').lower()
+        with options['path'].open(newline='', encoding='utf-8') as file:
+            if file_format == 'csv':
+                plays = list(read_csv(file))
+            elif file_format == 'json':
+                plays = json.load(file)
+            elif file_format == 'ndjson':
+                plays = [json.loads(line) for line in file if line.strip()]
+            else:
+                raise CommandError(f'Unknown format: {file_format}')
+
+        players = get_players_by_username(user)
+        serializer = StatsImportSerializer(data=plays, many=True, context={'players': players})
+        if not serializer.is_valid():
+            if isinstance(serializer.errors, dict):
+                raise CommandError(f'Invalid plays: {serializer.errors}')
+            errors = [f'row {number}: {error}' for number, error in enumerate(serializer.errors, start=1) if error]
+            raise CommandError('Invalid plays:\n' + '\n'.join(errors))
+
+        stats = import_statistics(user, game, serializer.validated_data, players, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Imported {len(stats)} play(s)'))
@@ -0,0 +1,29 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from services.bgg_catalog import CATALOG_BATCH_SIZE, load_catalog, read_catalog_csv, read_catalog_xml
+
+
+class Command(BaseCommand):
+    help = 'Load a BoardGameGeek data dump (CSV or XML API export) into the local catalog, in streaming batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=Path)
+        parser.add_argument('--format', choices=('csv', 'xml'), help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=CATALOG_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or options['path'].suffix.lstrip('.').lower()
+        if file_format not in ('csv', 'xml'):
+            raise CommandError(f'Unknown format: {file_format}')
+        try:
+            if file_format == 'csv':
+                with options['path'].open(newline='', encoding='utf-8-sig') as file:
+                    created, updated = load_catalog(read_catalog_csv(file), batch_size=options['batch_size'])
+            else:
+                with options['path'].open('rb') as file:
+                    created, updated = load_catalog(read_catalog_xml(file), batch_size=options['batch_size'])
+        except OSError as e:
+            raise CommandError(e)
+        self.stdout.write(self.style.SUCCESS(f'Loaded {created} new and {updated} updated catalog game(s)'))
@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from bg_tracker.models import Game
+from services.queries import instance_get
+from services.ratings import REBUILD_CHUNK_SIZE, rebuild_ratings
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Replay every play in date order to rebuild the player ratings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Email of the user whose ratings are rebuilt. All users by default.')
+        parser.add_argument('--game', help='Slug of the game whose ratings are rebuilt. All games by default.')
+        parser.add_argument('--chunk-size', type=int, default=REBUILD_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        user_id = game_id = None
+        try:
+            if options['user']:
+                user_id = instance_get(User, email=options['user']).id
+            if options['game']:
+                game_id = instance_get(Game, slug=options['game']).id
+        except (User.DoesNotExist, Game.DoesNotExist) as e:
+            raise CommandError(e)
+
+        count = rebuild_ratings(user_id=user_id, game_id=game_id, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} rating(s)'))
@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from services.queries import instance_get
+from services.rollups import find_rollup_drift, rebuild_rollups
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-user/per-game stats rollups from the statistics, or check them for drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Email of the user to rebuild or check. All users by default.')
+        parser.add_argument('--check', action='store_true',
+                            help='Only compare the rollups with the live tables, fail if they drifted.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = instance_get(User, email=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f'User {options["user"]} does not exist')
+
+        if options['check']:
+            drift = find_rollup_drift(user=user)
+            for (user_id, game_id, player_id), (stored, expected) in sorted(drift.items()):
+                self.stdout.write(f'user={user_id} game={game_id} player={player_id}: '
+                                  f'stored {stored}, expected {expected}')
+            if drift:
+                raise CommandError(f'{len(drift)} rollup row(s) drifted, run without --check to rebuild them')
+            self.stdout.write(self.style.SUCCESS('Rollups are up to date'))
+            return
+
+        count = rebuild_rollups(user=user, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} rollup row(s)'))
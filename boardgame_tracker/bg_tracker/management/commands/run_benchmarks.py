@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from services.benchmarks import (BENCHMARK_TOLERANCE, SCENARIOS, compare, get_busiest_game, get_busiest_user,
+                                 load_baseline, run_benchmarks, save_baseline)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the hot views and API endpoints through the test client: queries, p50/p95 latency, peak memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Email of the user to benchmark as, the user with most plays by default.')
+        parser.add_argument('--game', help='Slug of the game to benchmark, the most played one by default.')
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS, dest='scenarios')
+        parser.add_argument('--repeat', type=int, default=20, help='Requests per scenario.')
+        parser.add_argument('--warm', action='store_true', help='Measure responses served from the response cache.')
+        parser.add_argument('--save-baseline', metavar='PATH', help='Store the results as a JSON baseline.')
+        parser.add_argument('--compare', metavar='PATH', help='Fail on regressions against a JSON baseline.')
+        parser.add_argument('--tolerance', type=float, default=BENCHMARK_TOLERANCE,
+                            help='Allowed latency and memory growth against the baseline, as a ratio.')
+
+    def handle(self, *args, **options):
+        user = get_busiest_user(options['user'])
+        if user is None:
+            raise CommandError(f'User {options["user"]} does not exist' if options['user']
+                               else 'There is no user, run generate_data')
+        game_slug = options['game'] or get_busiest_game(user)
+        if game_slug is None:
+            raise CommandError(f'{user.email} has no game')
+
+        try:
+            results = run_benchmarks(user, game_slug, scenarios=options['scenarios'], repeat=options['repeat'],
+                                     warm=options['warm'])
+        except ValueError as error:
+            raise CommandError(error)
+
+        self.stdout.write(f'{user.email}, game {game_slug}, {"warm" if options["warm"] else "cold"} cache')
+        for name, metrics in results.items():
+            self.stdout.write(f'{name:<18} {metrics["queries"]:>4} queries  p50 {metrics["p50_ms"]:8.2f} ms  '
+                              f'p95 {metrics["p95_ms"]:8.2f} ms  peak {metrics["peak_kb"]:9.1f} KiB')
+
+        if options['save_baseline']:
+            save_baseline(results, options['save_baseline'])
+            self.stdout.write(self.style.SUCCESS(f'Baseline saved to {options["save_baseline"]}'))
+        if options['compare']:
+            try:
+                baseline = load_baseline(options['compare'])
+            except (OSError, ValueError) as error:
+                raise CommandError(f'Can\'t read the baseline: {error}')
+            regressions = compare(results, baseline, tolerance=options['tolerance'])
+            if regressions:
+                raise CommandError('Regressions against the baseline:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regression against the baseline'))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from services.tasks import requeue_stale_tasks, run_pending_tasks
+
+
+class Command(BaseCommand):
+    help = 'Run the queued background tasks (BGG enrichment etc.).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the tasks that are due and exit.')
+        parser.add_argument('--sleep', type=float, default=2, help='Seconds to wait when the queue is empty.')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            requeue_stale_tasks()
+            processed = run_pending_tasks()
+            if processed:
+                self.stdout.write(f'Processed {processed} task(s)')
+            if options['once']:
+                return
+            time.sleep(options['sleep'])
@@ -0,0 +1,55 @@
+import logging
+import time
+
+from django.conf import settings
+
+from services.instrumentation import add_section_time, instrument
+
+logger = logging.getLogger(__name__)
+api_logger = logging.getLogger('api.instrumentation')
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Count the queries, duplicate queries and database time of every request and time its rendering.
+
+    Adds a Server-Timing header and logs one key=value line per request to the api or bg_tracker logger, at
+    WARNING level for slow requests (REQUEST_SLOW_MS) and likely N+1 queries (REQUEST_DUPLICATE_QUERIES), at INFO
+    level otherwise. Enabled with REQUEST_INSTRUMENTATION, first in MIDDLEWARE so the other middlewares are measured
+    too. Streaming responses are measured until the view returns, not until the last chunk is sent.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with instrument() as metrics:
+            response = self.get_response(request)
+        response['Server-Timing'] = metrics.server_timing()
+        self.log(request, response, metrics)
+        return response
+
+    def process_template_response(self, request, response):
+        # Templates and DRF renderers run once every process_template_response hook returned.
+        start = time.perf_counter()
+        response.add_post_render_callback(lambda rendered: add_section_time('render', time.perf_counter() - start))
+        return response
+
+    def log(self, request, response, metrics):
+        match = request.resolver_match
+        module = match.func.__module__ if match else ''
+        fields = {'method': request.method, 'path': request.path, 'view': match.view_name if match else None,
+                  'status': response.status_code} | metrics.as_dict()
+
+        slow = fields['total_ms'] >= settings.REQUEST_SLOW_MS
+        sql, repeats = metrics.most_duplicated()
+        n_plus_one = repeats >= settings.REQUEST_DUPLICATE_QUERIES
+        if slow:
+            fields['slow'] = 1
+        if n_plus_one:
+            fields['repeated'] = repeats
+            fields['repeated_sql'] = f'"{sql[:200]}"'
+
+        line = 'request ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        (api_logger if module.startswith('api.') else logger).log(
+            logging.WARNING if slow or n_plus_one else logging.INFO, line, extra={'request_metrics': fields})
@@ -0,0 +1,49 @@
+# Generated by Django 4.0.5 on 2026-10-18 16:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from services.rollups import compute_rollups
+
+
+def backfill_rollups(apps, schema_editor):
+    # Plays recorded before the rollups existed, later plays are added to these rows incrementally.
+    Statistic = apps.get_model('bg_tracker', 'Statistic')
+    GameStatsRollup = apps.get_model('bg_tracker', 'GameStatsRollup')
+    rollups = compute_rollups(Statistic.objects.all())
+    GameStatsRollup.objects.bulk_create(
+        [GameStatsRollup(user_id=user_id, game_id=game_id, player_id=player_id, **values)
+         for (user_id, game_id, player_id), values in rollups.items()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('bg_tracker', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameStatsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count_played_game', models.PositiveIntegerField(default=0)),
+                ('count_win', models.PositiveIntegerField(default=0)),
+                ('played_minutes', models.PositiveIntegerField(default=0)),
+                ('count_score', models.PositiveIntegerField(default=0)),
+                ('sum_score', models.BigIntegerField(default=0)),
+                ('min_score', models.IntegerField(blank=True, null=True)),
+                ('max_score', models.IntegerField(blank=True, null=True)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats_rollups', to='bg_tracker.game')),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats_rollups', to='bg_tracker.player')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='gamestatsrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'game', 'player'), name='unique_stats_rollup'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.0.5 on 2026-10-18 16:51
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def deduplicate_slugs(apps, schema_editor):
+    # Names like "Catan" and "catan" slugify the same, suffix the later ones before adding the unique index.
+    Game = apps.get_model('bg_tracker', 'Game')
+    duplicates = Game.objects.values('slug').annotate(count=Count('id')).filter(count__gt=1)
+    for duplicate in duplicates:
+        for number, game in enumerate(Game.objects.filter(slug=duplicate['slug']).order_by('id')[1:], start=2):
+            game.slug = f'{duplicate["slug"]}-{number}'
+            game.save(update_fields=['slug'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bg_tracker', '0002_gamestatsrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='game',
+            name='slug',
+            field=models.SlugField(max_length=255, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['user_friend', 'username'], name='player_friend_username_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='score',
+            index=models.Index(fields=['stats', 'player'], name='score_stats_player_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='statistic',
+            index=models.Index(fields=['game', 'user_id', 'game_date'], name='statistic_game_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='statistic',
+            index=models.Index(fields=['winner', 'game'], name='statistic_winner_game_idx'),
+        ),
+    ]
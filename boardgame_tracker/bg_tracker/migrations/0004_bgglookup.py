@@ -0,0 +1,29 @@
+# Generated by Django 4.0.5 on 2026-10-18 16:53
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bg_tracker', '0003_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BggLookup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(max_length=255, unique=True)),
+                ('found', models.BooleanField(default=False)),
+                ('bgg_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('image', models.URLField(blank=True)),
+                ('min_players', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('max_players', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('playing_time', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('fetched_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.0.5 on 2026-10-18 17:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bg_tracker', '0005_background_tasks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerRating',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rating', models.FloatField()),
+                ('matches', models.PositiveIntegerField(default=0)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ratings', to='bg_tracker.game')),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ratings', to='bg_tracker.player')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='playerrating',
+            constraint=models.UniqueConstraint(fields=('game', 'player'), name='unique_player_rating'),
+        ),
+    ]
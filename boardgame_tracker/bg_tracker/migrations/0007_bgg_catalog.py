@@ -0,0 +1,60 @@
+# Generated by Django 4.0.5 on 2026-10-18 17:24
+
+from django.db import migrations, models
+
+# External content FTS5 index over the catalog names, kept in sync by triggers. SQLite only, other databases fall
+# back to prefix matches on the normalized name.
+CREATE_FTS = [
+    "CREATE VIRTUAL TABLE bg_tracker_bggcatalog_fts USING fts5("
+    "name, content='bg_tracker_bggcatalog', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER bg_tracker_bggcatalog_fts_insert AFTER INSERT ON bg_tracker_bggcatalog BEGIN "
+    "INSERT INTO bg_tracker_bggcatalog_fts(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER bg_tracker_bggcatalog_fts_delete AFTER DELETE ON bg_tracker_bggcatalog BEGIN "
+    "INSERT INTO bg_tracker_bggcatalog_fts(bg_tracker_bggcatalog_fts, rowid, name) "
+    "VALUES ('delete', old.id, old.name); "
+    "END",
+    "CREATE TRIGGER bg_tracker_bggcatalog_fts_update AFTER UPDATE OF name ON bg_tracker_bggcatalog BEGIN "
+    "INSERT INTO bg_tracker_bggcatalog_fts(bg_tracker_bggcatalog_fts, rowid, name) "
+    "VALUES ('delete', old.id, old.name); "
+    "INSERT INTO bg_tracker_bggcatalog_fts(rowid, name) VALUES (new.id, new.name); END",
+]
+DROP_FTS = [
+    'DROP TRIGGER IF EXISTS bg_tracker_bggcatalog_fts_update',
+    'DROP TRIGGER IF EXISTS bg_tracker_bggcatalog_fts_delete',
+    'DROP TRIGGER IF EXISTS bg_tracker_bggcatalog_fts_insert',
+    'DROP TABLE IF EXISTS bg_tracker_bggcatalog_fts',
+]
+
+
+def _run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            for statement in statements:
+                schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bg_tracker', '0006_player_ratings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BggCatalog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bgg_id', models.PositiveIntegerField(unique=True)),
+                ('name', models.CharField(max_length=255)),
+                ('query', models.CharField(db_index=True, max_length=255)),
+                ('year_published', models.SmallIntegerField(blank=True, null=True)),
+                ('rank', models.PositiveIntegerField(blank=True, null=True)),
+                ('image', models.URLField(blank=True)),
+                ('min_players', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('max_players', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('playing_time', models.PositiveSmallIntegerField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(_run_on_sqlite(CREATE_FTS), _run_on_sqlite(DROP_FTS)),
+    ]
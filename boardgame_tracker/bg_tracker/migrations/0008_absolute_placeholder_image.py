@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.db import migrations
+
+RELATIVE_PLACEHOLDER_IMAGE = 'static/bg_tracker/img/game_placeholder.svg'
+
+
+def fix_placeholder_images(apps, schema_editor):
+    # Games created with the placeholder before it was an absolute path.
+    Game = apps.get_model('bg_tracker', 'Game')
+    Game.objects.filter(image=RELATIVE_PLACEHOLDER_IMAGE).update(image=settings.BGG_PLACEHOLDER_IMAGE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bg_tracker', '0007_bgg_catalog'),
+    ]
+
+    operations = [
+        migrations.RunPython(fix_placeholder_images, migrations.RunPython.noop),
+    ]
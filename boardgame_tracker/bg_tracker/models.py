@@ -12,8 +12,12 @@ User = get_user_model()
 class Game(models.Model):
     game_name = models.CharField(max_length=255, unique=True)
     image = models.URLField()
-    slug = models.SlugField(max_length=255)
+    slug = models.SlugField(max_length=255, unique=True)
     user_id = models.ManyToManyField(User)
+    bgg_id = models.PositiveIntegerField(blank=True, null=True)
+    min_players = models.PositiveSmallIntegerField(blank=True, null=True)
+    max_players = models.PositiveSmallIntegerField(blank=True, null=True)
+    playing_time = models.PositiveSmallIntegerField(blank=True, null=True)
 
     def save(self, *args, **kwargs):
         self.slug = slugify(self.game_name)
@@ -31,6 +35,11 @@ class Player(models.Model):
     user_friend = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_friends')
     game_played = models.ManyToManyField(Game, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_friend', 'username'], name='player_friend_username_idx'),
+        ]
+
     def __str__(self):
         return self.username
 
@@ -45,6 +54,12 @@ class Statistic(models.Model):
     winner = models.ForeignKey(Player, on_delete=models.PROTECT, related_name='winner')
     players = models.ManyToManyField(Player)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['game', 'user_id', 'game_date'], name='statistic_game_user_date_idx'),
+            models.Index(fields=['winner', 'game'], name='statistic_winner_game_idx'),
+        ]
+
     def __str__(self):
         return f"{self.game_date}-{self.game}: winner - {self.winner}"
 
@@ -57,5 +72,110 @@ class Score(models.Model):
     stats = models.ForeignKey(Statistic, on_delete=models.CASCADE)
     score = models.IntegerField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['stats', 'player'], name='score_stats_player_idx'),
+        ]
+
     def __str__(self):
         return f"*{self.player}* in [{self.stats.stats_name}] with score: {self.score}"
+
+
+class GameStatsRollup(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stats_rollups')
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='stats_rollups')
+    player = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='stats_rollups')
+    count_played_game = models.PositiveIntegerField(default=0)
+    count_win = models.PositiveIntegerField(default=0)
+    played_minutes = models.PositiveIntegerField(default=0)
+    count_score = models.PositiveIntegerField(default=0)
+    sum_score = models.BigIntegerField(default=0)
+    min_score = models.IntegerField(blank=True, null=True)
+    max_score = models.IntegerField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'game', 'player'], name='unique_stats_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.game} - {self.player}: played {self.count_played_game}, won {self.count_win}"
+
+
+class PlayerRating(models.Model):
+    """Elo rating of a player for a game, updated with every recorded play."""
+    player = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='ratings')
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='ratings')
+    rating = models.FloatField()
+    matches = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['game', 'player'], name='unique_player_rating'),
+        ]
+
+    def __str__(self):
+        return f"{self.game} - {self.player}: {self.rating:.0f}"
+
+
+class BggLookup(models.Model):
+    """Cached result of a BoardGameGeek lookup by game name, including "not found" results."""
+    query = models.CharField(max_length=255, unique=True)
+    found = models.BooleanField(default=False)
+    bgg_id = models.PositiveIntegerField(blank=True, null=True)
+    image = models.URLField(blank=True)
+    min_players = models.PositiveSmallIntegerField(blank=True, null=True)
+    max_players = models.PositiveSmallIntegerField(blank=True, null=True)
+    playing_time = models.PositiveSmallIntegerField(blank=True, null=True)
+    fetched_at = models.DateTimeField(default=timezone.now)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.query}: {self.bgg_id if self.found else 'not found'}"
+
+
+class BggCatalog(models.Model):
+    """
+    A game of the local BoardGameGeek catalog mirror, loaded from a BGG data dump.
+
+    query is the normalized name used for exact matches. On SQLite, names are also indexed by the
+    bg_tracker_bggcatalog_fts FTS5 table, kept up to date by triggers.
+    """
+    bgg_id = models.PositiveIntegerField(unique=True)
+    name = models.CharField(max_length=255)
+    query = models.CharField(max_length=255, db_index=True)
+    year_published = models.SmallIntegerField(blank=True, null=True)
+    rank = models.PositiveIntegerField(blank=True, null=True)
+    image = models.URLField(blank=True)
+    min_players = models.PositiveSmallIntegerField(blank=True, null=True)
+    max_players = models.PositiveSmallIntegerField(blank=True, null=True)
+    playing_time = models.PositiveSmallIntegerField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.bgg_id})"
+
+
+class BackgroundTask(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    func = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='task_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.func}({self.payload}): {self.status}"
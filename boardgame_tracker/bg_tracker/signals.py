@@ -0,0 +1,91 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from services.cache import invalidate_game, invalidate_stats, invalidate_user
+from services.suggest import suggestion_index
+from services.trends import invalidate_trend_buckets
+from .models import Game, Player, Score, Statistic
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    # Also gives a new user fresh versions when an old user's id is reused.
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Game)
+@receiver(pre_delete, sender=Game)
+def game_changed(sender, instance, **kwargs):
+    invalidate_game(instance)
+
+
+@receiver(pre_save, sender=Game)
+def game_renaming(sender, instance, **kwargs):
+    if instance.pk is not None:
+        instance._previous_game_name = Game.objects.filter(pk=instance.pk) \
+            .values_list('game_name', flat=True).first()
+
+
+@receiver(post_save, sender=Game)
+def game_name_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_game_name', None)
+    if created or previous != instance.game_name:
+        if previous is not None:
+            suggestion_index.remove(previous)
+        suggestion_index.add(instance.game_name)
+
+
+@receiver(post_delete, sender=Game)
+def game_name_deleted(sender, instance, **kwargs):
+    suggestion_index.remove(instance.game_name)
+
+
+@receiver(m2m_changed, sender=Game.user_id.through)
+def game_users_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        invalidate_user(instance.pk)
+    elif action == 'pre_clear':
+        invalidate_game(instance)
+    else:
+        invalidate_user(*pk_set)
+
+
+@receiver(post_save, sender=Player)
+@receiver(post_delete, sender=Player)
+def player_changed(sender, instance, **kwargs):
+    invalidate_user(instance.user_friend_id)
+
+
+@receiver(pre_save, sender=Statistic)
+def statistic_moving(sender, instance, **kwargs):
+    # An edited play may move to another week/month/year, both its old and new trend buckets are stale.
+    if instance.pk is not None:
+        instance._previous_game_date = Statistic.objects.filter(pk=instance.pk) \
+            .values_list('game_date', flat=True).first()
+
+
+@receiver(post_save, sender=Statistic)
+@receiver(post_delete, sender=Statistic)
+def statistic_changed(sender, instance, **kwargs):
+    game_slug = instance.game.slug
+    invalidate_stats(instance.user_id_id, game_slug)
+    dates = [instance.game_date, getattr(instance, '_previous_game_date', None)]
+    invalidate_trend_buckets(instance.user_id_id, game_slug, *filter(None, dates))
+
+
+@receiver(m2m_changed, sender=Statistic.players.through)
+def statistic_players_changed(sender, instance, action, reverse, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and not reverse:
+        statistic_changed(sender, instance)
+
+
+# Scores are only deleted together with their statistic, a post_delete receiver would also stop Django from
+# fast-deleting them in that cascade.
+@receiver(post_save, sender=Score)
+def score_changed(sender, instance, **kwargs):
+    statistic_changed(sender, instance.stats)
@@ -1,15 +1,65 @@
 import datetime
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
+from urllib.parse import parse_qs, unquote, urlsplit
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.messages import get_messages
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.db.models import Q, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
-from .models import Game, Player, Statistic, Score
+from .models import Game, Player, Statistic, Score, GameStatsRollup, BggLookup, BackgroundTask, PlayerRating, \
+    BggCatalog
+from services.analytics import baseline as analytics_baseline, benchmark as analytics_benchmark, \
+    metrics as analytics_metrics, get_player_analytics
+from services.bgg_catalog import search_catalog
+from services.bgg_info import RateLimiter, enrich_game, get_bgg_info, lookup_bgg_info, lookup_bgg_infos
+from services.bulk_import import import_statistics
+from services.cache import get_cache_stats
+from services.ratings import add_statistic_to_ratings, rate_match, rebuild_ratings
+from services.rollups import delete_statistics
+from services.tasks import enqueue_task, run_pending_tasks
+from services.overall_stat import StatsFromModels
 
 User = get_user_model()
 
 
+class StubBGG:
+    """Stand-in for libbgg's BGG client, answers from a fixed catalog and records every call."""
+    games = {'war of the ring: second edition': 115746, 'catan': 13, 'azul': 230802}
+
+    def __init__(self, url_base=None):
+        self.calls = []
+
+    def search(self, search_str, exact=False):
+        self.calls.append(('search', search_str))
+        if search_str not in self.games:
+            return {'boardgames': {'termsofuse': 'https://boardgamegeek.com/xmlapi/termsofuse'}}
+        return {'boardgames': {'boardgame': {'objectid': str(self.games[search_str])}}}
+
+    def get_game(self, game_ids):
+        self.calls.append(('get_game', game_ids))
+        games = [{'objectid': str(game_id), 'image': {'TEXT': f'https://cf.geekdo-images.com/{game_id}.jpg'},
+                  'minplayers': {'TEXT': '2'}, 'maxplayers': {'TEXT': '4'}, 'playingtime': {'TEXT': '60'}}
+                 for game_id in game_ids]
+        return {'boardgames': {'boardgame': games[0] if len(games) == 1 else games}}
+
+
 class BgTrackerTests(TestCase):
 
     def setUp(self):
@@ -44,7 +94,7 @@ class BgTrackerTests(TestCase):
         resp = self.client.get(reverse('game_page', kwargs={'game_slug': 'catan'}))
         self.assertEqual(resp.status_code, 200)
         self.assertEqual(resp.context['game'], game)
-        self.assertEqual(resp.context['game_stat'].count(), 2)
+        self.assertEqual(len(resp.context['game_stat']), 2)
 
     def test_add_player(self):
         resp = self.client.post(reverse('add_player'), {'username': 'john'})
@@ -58,7 +108,20 @@ class BgTrackerTests(TestCase):
         self.assertEqual(resp.status_code, 200)
         self.assertEqual(players, list(resp.context['players']))
 
+    @override_settings(PAGINATE_BY=2)
+    def test_players_list_pagination(self):
+        players = [Player.objects.create(username=name, user_friend=self.user) for name in ['john', 'helga', 'marie']]
+        resp = self.client.get(reverse('players_list'))
+        self.assertEqual(players[:2], resp.context['players'])
+        resp = self.client.get(reverse('players_list'), {'cursor': resp.context['page'].next_cursor})
+        self.assertEqual(players[2:], resp.context['players'])
+        self.assertIsNone(resp.context['page'].next_cursor)
+        resp = self.client.get(reverse('players_list'), {'cursor': 'garbage'})
+        self.assertEqual(resp.status_code, 404)
+
+    @mock.patch('services.bgg_info.BGG', StubBGG)
     def test_add_game(self):
+        cache.clear()
         Game.objects.create(game_name='eldritch horror', image='eldritch_horror.com')
         # if game exists for user
         resp = self.client.post(reverse('add_game'), {'game_name': 'terraforming mars'}, follow=True)
@@ -68,12 +131,32 @@ class BgTrackerTests(TestCase):
         resp = self.client.post(reverse('add_game'), {'game_name': 'eldritch horror'}, follow=True)
         self.assertTemplateUsed(resp, 'bg_tracker/games_list.html')
 
-        # if new game
+        # names differing only by case or spacing are the same game
+        resp = self.client.post(reverse('add_game'), {'game_name': 'Eldritch  Horror'}, follow=True)
+        self.assertTemplateUsed(resp, 'bg_tracker/games_list.html')
+        self.assertEqual(Game.objects.filter(slug='eldritch-horror').count(), 1)
+
+        # if new game, created right away and enriched by the background task
         resp = self.client.post(reverse('add_game'), {'game_name': 'War of the Ring: Second Edition '}, follow=True)
         self.assertTemplateUsed(resp, 'bg_tracker/games_list.html')
+        game = Game.objects.get(game_name='War of the Ring: Second Edition')
+        self.assertEqual(game.image, '/static/bg_tracker/img/game_placeholder.svg')
+        self.assertEqual(run_pending_tasks(), 1)
+        game.refresh_from_db()
+        self.assertEqual((game.bgg_id, game.image), (115746, 'https://cf.geekdo-images.com/115746.jpg'))
+        self.assertEqual((game.min_players, game.max_players, game.playing_time), (2, 4, 60))
 
-        # if game_name incorrect
-        resp = self.client.post(reverse('add_game'), {'game_name': 'asdasqw'}, follow=True)
+        # if game_name incorrect, the task fails without retries
+        self.client.post(reverse('add_game'), {'game_name': 'asdasqw'}, follow=True)
+        run_pending_tasks()
+        self.assertEqual(BackgroundTask.objects.get(payload__game_id=Game.objects.get(game_name='asdasqw').id).status,
+                         BackgroundTask.FAILED)
+
+        # if game_name is already known to be incorrect
+        resp = self.client.post(reverse('add_game'), {'game_name': 'asdasqw2'}, follow=True)
+        self.assertTemplateUsed(resp, 'bg_tracker/games_list.html')
+        lookup_bgg_info('asdasqw3')
+        resp = self.client.post(reverse('add_game'), {'game_name': 'asdasqw3'}, follow=True)
         messages = [m.message for m in get_messages(resp.wsgi_request)]
         self.assertTemplateUsed(resp, 'bg_tracker/add_game.html')
         self.assertIn('The name of the game is incorrect or the game does not exist', messages)
@@ -133,6 +216,46 @@ class BgTrackerTests(TestCase):
         self.assertEqual(scores[0].score, 13)
         self.assertEqual(scores[1].score, 21)
 
+    def test_add_score_uses_statistic_from_url(self):
+        bob = Player.objects.create(username='bob', user_friend=self.user)
+        game = Game.objects.get(game_name='catan')
+        stat = Statistic.objects.create(user_id=self.user, game=game, stats_name='first game', winner=bob)
+        stat.players.add(bob)
+        other_user = User.objects.create(username='joe', email='joe@ex.com')
+        other_player = Player.objects.create(username='joe', user_friend=other_user)
+        later_stat = Statistic.objects.create(user_id=other_user, game=game, stats_name='other', winner=other_player)
+        later_stat.players.add(other_player)
+
+        data = {'form-TOTAL_FORMS': '1', 'form-INITIAL_FORMS': '0', 'form-0-player': bob.id, 'form-0-score': '7'}
+        self.client.post(reverse('add_score', kwargs={'game_slug': 'catan', 'stat_id': stat.id}), data)
+        self.assertEqual(list(stat.score_set.values_list('player', 'score')), [(bob.id, 7)])
+        self.assertFalse(later_stat.score_set.exists())
+
+        url = reverse('add_score', kwargs={'game_slug': 'catan', 'stat_id': later_stat.id})
+        self.assertEqual(self.client.get(url).status_code, 404)
+        data['form-0-player'] = other_player.id
+        self.assertEqual(self.client.post(url, data).status_code, 404)
+        self.assertFalse(later_stat.score_set.exists())
+
+    def test_add_score_queries_do_not_grow_with_players(self):
+        game = Game.objects.get(game_name='catan')
+        players = [Player.objects.create(username=f'player{i}', user_friend=self.user) for i in range(6)]
+        query_counts = []
+        for count in (2, 6):
+            stat = Statistic.objects.create(user_id=self.user, game=game, stats_name='game', winner=players[0])
+            stat.players.add(*players[:count])
+            url = reverse('add_score', kwargs={'game_slug': 'catan', 'stat_id': stat.id})
+            data = {'form-TOTAL_FORMS': str(count), 'form-INITIAL_FORMS': '0'}
+            for i, player in enumerate(players[:count]):
+                data |= {f'form-{i}-player': player.id, f'form-{i}-score': i}
+            with CaptureQueriesContext(connection) as get_queries:
+                self.client.get(url)
+            with CaptureQueriesContext(connection) as post_queries:
+                self.client.post(url, data)
+            self.assertEqual(stat.score_set.count(), count)
+            query_counts.append((len(get_queries), len(post_queries)))
+        self.assertEqual(query_counts[0], query_counts[1])
+
     def test_game_stat_page(self):
         game = Game.objects.get(game_name='catan')
         bob = Player.objects.create(username='bob', user_friend=self.user)
@@ -162,3 +285,710 @@ class BgTrackerTests(TestCase):
         resp = self.client.get(reverse('overall_game_stats', kwargs={'game_slug': 'catan'}))
         self.assertEqual(resp.status_code, 200)
         self.assertTemplateUsed(resp, 'bg_tracker/overall_game_stat.html')
+
+    def test_leaderboard(self):
+        game = Game.objects.get(game_name='catan')
+        bob = Player.objects.create(username='bob', user_friend=self.user)
+        john = Player.objects.create(username='john', user_friend=self.user)
+        stat = Statistic.objects.create(user_id=self.user, game=game, stats_name='first game', winner=john)
+        stat.players.add(bob, john)
+
+        resp = self.client.get(reverse('game_leaderboard', kwargs={'game_slug': 'catan'}))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTemplateUsed(resp, 'bg_tracker/leaderboard.html')
+        self.assertEqual([row['player'] for row in resp.context['players']], ['john', 'bob'])
+        self.assertEqual(resp.context['head_to_head'][0], ('john', [None, {'count_played_game': 1, 'count_win': 1,
+                                                                          'count_lose': 0}]))
+        self.assertContains(resp, '1-0')
+
+        self.assertEqual(self.client.get(reverse('leaderboard')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('game_leaderboard', kwargs={'game_slug': 'azul'})).status_code, 404)
+
+
+class StatsRollupTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='bob', email='bob@ex.com')
+        self.client.force_login(self.user)
+        self.game = Game.objects.create(game_name='catan', image='catan.com')
+        self.game.user_id.add(self.user)
+        self.bob = Player.objects.create(username='bob', user_friend=self.user)
+        self.john = Player.objects.create(username='john', user_friend=self.user)
+
+    def add_stat(self, winner):
+        self.client.post(reverse('add_stats', kwargs={'game_slug': 'catan'}),
+                         {'stats_name': 'game', 'duration': '01:10:00', 'winner': winner.id,
+                          'players': [self.bob.id, self.john.id], 'game_date': '2022-06-04'})
+        stat = Statistic.objects.last()
+        data = {'form-TOTAL_FORMS': '2', 'form-INITIAL_FORMS': '0',
+                'form-0-player': self.bob.id, 'form-0-score': '13',
+                'form-1-player': self.john.id, 'form-1-score': '21'}
+        self.client.post(reverse('add_score', kwargs={'game_slug': 'catan', 'stat_id': stat.id}), data)
+        return stat
+
+    def test_html_flow_updates_rollups(self):
+        self.add_stat(self.bob)
+        stat = self.add_stat(self.john)
+
+        rollup = GameStatsRollup.objects.get(user=self.user, game=self.game, player=self.bob)
+        self.assertEqual(rollup.count_played_game, 2)
+        self.assertEqual(rollup.count_win, 1)
+        self.assertEqual(rollup.played_minutes, 140)
+        self.assertEqual((rollup.count_score, rollup.sum_score, rollup.min_score, rollup.max_score), (2, 26, 13, 13))
+
+        self.client.post(reverse('game_stat', kwargs={'game_slug': 'catan', 'stat_id': stat.id}), {'stat_id': stat.id})
+        rollup.refresh_from_db()
+        self.assertEqual((rollup.count_played_game, rollup.count_win, rollup.count_score), (1, 1, 1))
+
+    def test_rebuild_command(self):
+        self.add_stat(self.bob)
+        GameStatsRollup.objects.filter(player=self.bob).update(count_win=10)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_stats_rollups', '--check', stdout=StringIO())
+
+        call_command('rebuild_stats_rollups', stdout=StringIO())
+        self.assertEqual(GameStatsRollup.objects.get(player=self.bob).count_win, 1)
+        out = StringIO()
+        call_command('rebuild_stats_rollups', '--check', stdout=out)
+        self.assertIn('Rollups are up to date', out.getvalue())
+
+
+class ResponseCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='bob', email='bob@ex.com')
+        self.other_user = User.objects.create(username='joe', email='joe@ex.com')
+        self.client.force_login(self.user)
+        self.game = Game.objects.create(game_name='catan', image='catan.com')
+        self.game.user_id.add(self.user, self.other_user)
+        self.bob = Player.objects.create(username='bob', user_friend=self.user)
+        self.joe = Player.objects.create(username='joe', user_friend=self.other_user)
+
+    def add_stat(self, user, player, name='game'):
+        stat = Statistic.objects.create(user_id=user, game=self.game, stats_name=name, winner=player)
+        stat.players.add(player)
+        return stat
+
+    def test_game_page_is_cached_until_a_stat_changes(self):
+        url = reverse('game_page', kwargs={'game_slug': 'catan'})
+        self.add_stat(self.user, self.bob, 'first')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as cached:
+            resp = self.client.get(url)
+        self.assertEqual([stat['stats_name'] for stat in resp.context['game_stat']], ['first'])
+        self.assertEqual(get_cache_stats(['game-page'])['game-page'], {'hits': 1, 'misses': 1})
+        self.assertFalse(any('bg_tracker_statistic' in query['sql'] for query in cached.captured_queries))
+
+        # another user's plays of the same game leave the page cached
+        self.add_stat(self.other_user, self.joe)
+        self.client.get(url)
+        self.assertEqual(get_cache_stats(['game-page'])['game-page'], {'hits': 2, 'misses': 1})
+
+        stat = self.add_stat(self.user, self.bob, 'second')
+        resp = self.client.get(url)
+        self.assertEqual(len(resp.context['game_stat']), 2)
+        self.assertEqual(get_cache_stats(['game-page'])['game-page'], {'hits': 2, 'misses': 2})
+
+        delete_statistics(Statistic.objects.filter(pk=stat.pk))
+        self.assertEqual(len(self.client.get(url).context['game_stat']), 1)
+
+    def test_overall_stat_follows_scores_and_players(self):
+        url = reverse('overall_game_stats', kwargs={'game_slug': 'catan'})
+        stat = self.add_stat(self.user, self.bob)
+        self.assertIsNone(self.client.get(url).context['best_score'])
+        Score.objects.create(stats=stat, player=self.bob, score=12)
+        self.assertEqual(self.client.get(url).context['best_score'], 12)
+
+        data = {'form-TOTAL_FORMS': '1', 'form-INITIAL_FORMS': '0', 'form-0-player': self.bob.id, 'form-0-score': '40'}
+        self.client.post(reverse('add_score', kwargs={'game_slug': 'catan', 'stat_id': stat.id}), data)
+        self.assertEqual(self.client.get(url).context['best_score'], 40)
+
+        self.client.get(url)
+        self.assertEqual(get_cache_stats(['overall-stat'])['overall-stat'], {'hits': 1, 'misses': 3})
+        self.bob.username = 'rob'
+        self.bob.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_game_changes_invalidate_every_owner(self):
+        url = reverse('game_list')
+        self.assertEqual(self.client.get(url).context['games'], [{'image': 'catan.com', 'slug': 'catan'}])
+        with mock.patch('services.bgg_info.BGG', StubBGG):
+            enrich_game(self.game.id)
+        self.assertEqual(self.client.get(url).context['games'][0]['image'], 'https://cf.geekdo-images.com/13.jpg')
+
+        self.game.user_id.remove(self.user)
+        self.assertEqual(self.client.get(url).context['games'], [])
+
+    def test_bulk_import_invalidates_stats(self):
+        url = reverse('game_page', kwargs={'game_slug': 'catan'})
+        self.assertEqual(len(self.client.get(url).context['game_stat']), 0)
+        import_statistics(self.user, self.game, [{'stats_name': 'imported', 'game_date': datetime.date(2022, 6, 4),
+                                                  'duration': datetime.time(1), 'winner': 'bob',
+                                                  'players': ['bob']}], {'bob': self.bob})
+        self.assertEqual(len(self.client.get(url).context['game_stat']), 1)
+
+    def test_cache_stats_command(self):
+        self.client.get(reverse('game_list'))
+        self.client.get(reverse('game_list'))
+        out = StringIO()
+        call_command('cache_stats', '--reset', stdout=out)
+        self.assertIn('game-list: 1 hits, 1 misses, hit ratio 50.0%', out.getvalue())
+        self.assertEqual(get_cache_stats(['game-list'])['game-list'], {'hits': 0, 'misses': 0})
+
+
+class RequestInstrumentationTests(TestCase):
+
+    @override_settings(MIDDLEWARE=['bg_tracker.middleware.RequestInstrumentationMiddleware', *settings.MIDDLEWARE])
+    def test_game_page(self):
+        user = User.objects.create(username='bob', email='bob@ex.com')
+        self.client.force_login(user)
+        Game.objects.create(game_name='catan', image='catan.com').user_id.add(user)
+        with self.assertLogs('bg_tracker', level='INFO') as logs:
+            response = self.client.get(reverse('game_page', kwargs={'game_slug': 'catan'}))
+        self.assertIn('render;dur=', response['Server-Timing'])
+        self.assertIn('view=game_page status=200', logs.output[0])
+        self.assertEqual(logs.records[0].name, 'bg_tracker.middleware')
+
+    def test_off_by_default(self):
+        self.assertNotIn('bg_tracker.middleware.RequestInstrumentationMiddleware', settings.MIDDLEWARE)
+        self.assertFalse(self.client.get(reverse('home')).has_header('Server-Timing'))
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class QueryPlanTests(TestCase):
+    """Every hot filter must be answered by an index search, never by a full table scan."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='bob', email='bob@ex.com')
+        self.game = Game.objects.create(game_name='catan', image='catan.com')
+        self.player = Player.objects.create(username='bob', user_friend=self.user)
+        self.stat = Statistic.objects.create(user_id=self.user, game=self.game, stats_name='game', winner=self.player)
+        self.stat.players.add(self.player)
+        Score.objects.create(stats=self.stat, player=self.player, score=10)
+
+    def assertUsesIndex(self, plan):
+        self.assertIsNone(re.search(r'\bSCAN bg_tracker_\w+\b(?! USING)', plan), plan)
+        self.assertRegex(plan, r'SEARCH bg_tracker_\w+ USING (COVERING )?INDEX')
+
+    def assertQuerySetUsesIndex(self, queryset):
+        self.assertUsesIndex(queryset.explain())
+
+    def test_statistic_by_game_slug_and_user(self):
+        queryset = Statistic.objects.filter(game__slug='catan', user_id=self.user)
+        self.assertQuerySetUsesIndex(queryset)
+        self.assertIn('statistic_game_user_date_idx', queryset.explain())
+        self.assertNotIn('TEMP B-TREE', queryset.order_by('-game_date', '-pk').explain())
+
+    def test_statistic_by_winner(self):
+        self.assertQuerySetUsesIndex(Statistic.objects.filter(winner=self.player))
+
+    def test_score_by_stats_and_player(self):
+        queryset = Score.objects.filter(stats=self.stat, player=self.player)
+        self.assertQuerySetUsesIndex(queryset)
+        self.assertIn('score_stats_player_idx', queryset.explain())
+
+    def test_player_by_user_friend(self):
+        self.assertQuerySetUsesIndex(Player.objects.filter(user_friend=self.user))
+        self.assertQuerySetUsesIndex(Player.objects.filter(Q(username__contains='bob') & Q(user_friend=self.user.pk)))
+
+    def test_game_by_slug(self):
+        self.assertQuerySetUsesIndex(Game.objects.filter(slug='catan'))
+
+    def test_overall_stat_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            StatsFromModels(game_slug='catan', user=self.user).get_overall_stat()
+        self.assertEqual(len(context.captured_queries), 4)
+        for query in context.captured_queries:
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {query["sql"]}')
+                self.assertUsesIndex('\n'.join(row[-1] for row in cursor.fetchall()))
+
+
+@mock.patch('services.bgg_info.BGG')
+class BggCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.bgg = StubBGG()
+
+    def test_repeat_lookups_are_cached(self, bgg_class):
+        bgg_class.return_value = self.bgg
+        self.assertEqual(get_bgg_info('Catan'), 'https://cf.geekdo-images.com/13.jpg')
+        self.assertEqual(get_bgg_info('catan '), 'https://cf.geekdo-images.com/13.jpg')
+        self.assertEqual(len(self.bgg.calls), 2)
+
+        # the table survives a cleared (restarted) Django cache
+        cache.clear()
+        info = lookup_bgg_info('CATAN')
+        self.assertEqual(info, {'bgg_id': 13, 'image': 'https://cf.geekdo-images.com/13.jpg',
+                                'min_players': 2, 'max_players': 4, 'playing_time': 60})
+        self.assertEqual(len(self.bgg.calls), 2)
+
+    def test_not_found_is_cached(self, bgg_class):
+        bgg_class.return_value = self.bgg
+        for _ in range(2):
+            with self.assertRaises(KeyError):
+                get_bgg_info('asdasqw')
+        self.assertEqual(self.bgg.calls, [('search', 'asdasqw')])
+        self.assertFalse(BggLookup.objects.get(query='asdasqw').found)
+
+    @override_settings(BGG_CACHE_TTL=60)
+    def test_expired_entries_are_fetched_again(self, bgg_class):
+        bgg_class.return_value = self.bgg
+        lookup_bgg_info('catan')
+        BggLookup.objects.update(fetched_at=timezone.now() - datetime.timedelta(minutes=5))
+        cache.clear()
+        lookup_bgg_info('catan')
+        self.assertEqual(len(self.bgg.calls), 4)
+
+    @override_settings(BGG_CACHE_MAX_ENTRIES=2)
+    def test_least_recently_used_entries_are_evicted(self, bgg_class):
+        bgg_class.return_value = self.bgg
+        lookup_bgg_info('catan')
+        lookup_bgg_info('azul')
+        BggLookup.objects.filter(query='azul').update(last_used_at=timezone.now() - datetime.timedelta(days=1))
+        lookup_bgg_info('war of the ring: second edition')
+        self.assertEqual(set(BggLookup.objects.values_list('query', flat=True)),
+                         {'catan', 'war of the ring: second edition'})
+
+    @override_settings(BGG_CACHE_MAX_ENTRIES=2)
+    def test_cache_hits_count_as_uses(self, bgg_class):
+        bgg_class.return_value = self.bgg
+        lookup_bgg_info('catan')
+        lookup_bgg_info('azul')
+        day_ago = timezone.now() - datetime.timedelta(days=1)
+        BggLookup.objects.update(last_used_at=day_ago)
+        BggLookup.objects.filter(query='catan').update(last_used_at=day_ago - datetime.timedelta(hours=1))
+        # answered by Django's cache, the table row is still touched, once per LAST_USED_RESOLUTION
+        with self.assertNumQueries(2):
+            lookup_bgg_info('catan')
+        with self.assertNumQueries(1):
+            lookup_bgg_info('catan')
+        lookup_bgg_info('war of the ring: second edition')
+        self.assertEqual(set(BggLookup.objects.values_list('query', flat=True)),
+                         {'catan', 'war of the ring: second edition'})
+
+
+class BggCatalogTests(TestCase):
+    CSV = ('id,name,yearpublished,rank,minplayers,maxplayers,playingtime\n'
+           '13,Catan,1995,500,3,4,90\n'
+           '27710,Catan Dice Game,2007,2900,1,4,15\n'
+           '278,Catan Card Game,1996,0,2,2,90\n'
+           '230802,Azul,2017,60,2,4,45\n'
+           ',No id,2000,1,2,4,30\n')
+    XML = ('<boardgames><boardgame objectid="13"><name>Die Siedler von Catan</name>'
+           '<name primary="true">Catan</name><yearpublished>1995</yearpublished><minplayers>3</minplayers>'
+           '<maxplayers>6</maxplayers><playingtime>120</playingtime><image>https://cf.geekdo-images.com/13.jpg'
+           '</image></boardgame></boardgames>')
+
+    def load(self, content, suffix):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as file:
+            file.write(content)
+        self.addCleanup(os.remove, file.name)
+        out = StringIO()
+        call_command('load_bgg_catalog', file.name, batch_size=2, stdout=out)
+        return out.getvalue()
+
+    def setUp(self):
+        cache.clear()
+        self.assertIn('Loaded 4 new and 0 updated', self.load(self.CSV, '.csv'))
+
+    def test_load(self):
+        catan = BggCatalog.objects.get(bgg_id=13)
+        self.assertEqual((catan.query, catan.rank, catan.playing_time), ('catan', 500, 90))
+        self.assertIsNone(BggCatalog.objects.get(bgg_id=278).rank)
+
+        # reloading updates the existing games
+        self.assertIn('Loaded 0 new and 1 updated', self.load(self.XML, '.xml'))
+        catan.refresh_from_db()
+        self.assertEqual((catan.max_players, catan.image), (6, 'https://cf.geekdo-images.com/13.jpg'))
+        self.assertEqual(BggCatalog.objects.count(), 4)
+
+        with self.assertRaisesMessage(CommandError, 'Unknown format: txt'):
+            call_command('load_bgg_catalog', 'catalog.txt')
+
+    def test_search(self):
+        self.assertEqual([game.bgg_id for game in search_catalog('cat')], [13, 27710, 278])
+        self.assertEqual([game.bgg_id for game in search_catalog('Catan card')], [278])
+        # the exact match comes first, words can be in any order
+        self.assertEqual([game.bgg_id for game in search_catalog('dice catan')], [27710])
+        self.assertEqual([game.bgg_id for game in search_catalog('catan', limit=1)], [13])
+        self.assertEqual(search_catalog('"*'), [])
+
+        # the index follows the table
+        BggCatalog.objects.filter(bgg_id=230802).update(name='Azul: Summer Pavilion', query='azul: summer pavilion')
+        self.assertEqual([game.name for game in search_catalog('summer')], ['Azul: Summer Pavilion'])
+        BggCatalog.objects.filter(bgg_id=27710).delete()
+        self.assertEqual([game.bgg_id for game in search_catalog('catan')], [13, 278])
+
+    @mock.patch('services.bgg_info.BGG')
+    def test_add_game_from_catalog(self, bgg_class):
+        user = User.objects.create_user(username='bob', email='bob@ex.com', password='bob')
+        self.client.force_login(user)
+        self.client.post(reverse('add_game'), {'game_name': 'Azul'})
+        game = Game.objects.get(game_name='Azul')
+        self.assertEqual((game.bgg_id, game.min_players, game.playing_time), (230802, 2, 45))
+        self.assertFalse(BackgroundTask.objects.exists())
+        bgg_class.assert_not_called()
+
+
+class StubBGGHandler(BaseHTTPRequestHandler):
+    """BGG XML API v1 served from StubBGG's catalog, every requested path is recorded on the server."""
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = unquote(url.path)
+        self.server.paths.append(path)
+        if path == '/xmlapi/search':
+            bgg_id = StubBGG.games.get(parse_qs(url.query)['search'][0])
+            games = f'<boardgame objectid="{bgg_id}"/>' if bgg_id else ''
+        else:
+            games = ''.join(f'<boardgame objectid="{bgg_id}"><image>https://cf.geekdo-images.com/{bgg_id}.jpg</image>'
+                            f'<minplayers>2</minplayers><maxplayers>4</maxplayers><playingtime>60</playingtime>'
+                            f'</boardgame>' for bgg_id in path.rsplit('/', 1)[1].split(','))
+        body = f'<boardgames termsofuse="https://boardgamegeek.com/xmlapi/termsofuse">{games}</boardgames>'.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class BggBatchLookupTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubBGGHandler)
+        self.server.paths = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        settings_override = override_settings(BGG_URL_BASE=f'http://127.0.0.1:{self.server.server_port}',
+                                              BGG_REQUESTS_PER_SECOND=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_batched_lookup(self):
+        lookup_bgg_info('azul')
+        self.server.paths.clear()
+
+        infos = lookup_bgg_infos(['Catan', 'War of the Ring: Second Edition', 'azul', 'asdasqw'])
+        self.assertEqual({name: info and info['bgg_id'] for name, info in infos.items()},
+                         {'Catan': 13, 'War of the Ring: Second Edition': 115746, 'azul': 230802, 'asdasqw': None})
+        # one search per uncached name, the details of both games found in a single call
+        self.assertEqual(sorted(self.server.paths), ['/xmlapi/boardgame/13,115746', '/xmlapi/search',
+                                                     '/xmlapi/search', '/xmlapi/search'])
+        self.assertEqual(lookup_bgg_infos(['catan', 'asdasqw']), {'catan': infos['Catan'], 'asdasqw': None})
+        self.assertEqual(len(self.server.paths), 4)
+
+    def test_rate_limit(self):
+        limiter = RateLimiter(20)
+        start = time.monotonic()
+        for _ in range(4):
+            limiter.wait()
+        self.assertGreaterEqual(time.monotonic() - start, 3 / 20)
+
+    def test_enrich_games(self):
+        user = User.objects.create(username='bob', email='bob@ex.com')
+        names = ['catan', 'azul', 'asdasqw']
+        games = [Game.objects.create(game_name=name, image=settings.BGG_PLACEHOLDER_IMAGE) for name in names]
+        for game in games:
+            game.user_id.add(user)
+
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('enrich_games', stdout=out)
+        self.assertIn('Enriched 2 of 3 game(s)', out.getvalue())
+        self.assertEqual(sum('UPDATE "bg_tracker_game"' in query['sql'] for query in queries.captured_queries), 1)
+        self.assertEqual(dict(Game.objects.values_list('game_name', 'bgg_id')),
+                         {'catan': 13, 'azul': 230802, 'asdasqw': None})
+        self.assertEqual(Game.objects.get(game_name='azul').image, 'https://cf.geekdo-images.com/230802.jpg')
+
+        with self.assertRaisesMessage(CommandError, 'Unknown games: eldritch-horror'):
+            call_command('enrich_games', 'catan', 'eldritch-horror')
+
+
+def failing_task(fail_times):
+    task = BackgroundTask.objects.get(status=BackgroundTask.RUNNING)
+    if task.attempts <= fail_times:
+        raise ConnectionError('BGG is down')
+
+
+class PlayerRatingTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='bob', email='bob@ex.com')
+        self.client.force_login(self.user)
+        self.game = Game.objects.create(game_name='catan', image='catan.com')
+        self.game.user_id.add(self.user)
+        self.bob, self.john, self.ann = (Player.objects.create(username=username, user_friend=self.user)
+                                         for username in ('bob', 'john', 'ann'))
+
+    def add_stat(self, winner, players, game_date='2022-06-04'):
+        self.client.post(reverse('add_stats', kwargs={'game_slug': 'catan'}),
+                         {'stats_name': 'game', 'duration': '01:00:00', 'winner': winner.id,
+                          'players': [player.id for player in players], 'game_date': game_date})
+        return Statistic.objects.last()
+
+    def ratings(self):
+        return {rating.player.username: (round(rating.rating, 6), rating.matches)
+                for rating in PlayerRating.objects.select_related('player')}
+
+    def test_rate_match(self):
+        ratings = {1: [1500, 0], 2: [1500, 0], 3: [1600, 3]}
+        rate_match(ratings, 1, [1, 2, 3], k_factor=32)
+        self.assertAlmostEqual(sum(rating for rating, _ in ratings.values()), 4600)
+        self.assertAlmostEqual(ratings[2][0], 1500 - 16 * 0.5)
+        self.assertEqual([matches for _, matches in ratings.values()], [1, 1, 4])
+
+    def test_incremental_update_matches_rebuild(self):
+        self.add_stat(self.bob, [self.bob, self.john, self.ann], '2022-06-01')
+        self.add_stat(self.john, [self.bob, self.john], '2022-06-02')
+        self.add_stat(self.ann, [self.ann, self.john], '2022-06-03')
+        incremental = self.ratings()
+        self.assertEqual(incremental['john'][1], 3)
+        self.assertGreater(incremental['ann'][0], settings.RATING_INITIAL)
+
+        PlayerRating.objects.update(rating=0, matches=0)
+        out = StringIO()
+        call_command('rebuild_ratings', '--user', 'bob@ex.com', '--game', 'catan', '--chunk-size', '2', stdout=out)
+        self.assertIn('Rebuilt 3 rating(s)', out.getvalue())
+        self.assertEqual(self.ratings(), incremental)
+
+    def test_update_queries_do_not_grow_with_players(self):
+        stat = Statistic.objects.create(user_id=self.user, game=self.game, stats_name='game', winner=self.bob)
+        with CaptureQueriesContext(connection) as two_players:
+            add_statistic_to_ratings(stat, [self.bob.id, self.john.id])
+        with CaptureQueriesContext(connection) as three_players:
+            add_statistic_to_ratings(stat, [self.bob.id, self.john.id, self.ann.id])
+        self.assertEqual(len(two_players), len(three_players))
+
+    def test_rebuild_orders_by_game_date(self):
+        self.add_stat(self.john, [self.bob, self.john], '2022-06-02')
+        self.add_stat(self.bob, [self.bob, self.john], '2022-06-01')
+        # recorded in the wrong order, the rebuild replays the plays by date
+        rebuild_ratings()
+        by_date = self.ratings()
+        self.assertGreater(by_date['john'][0], by_date['bob'][0])
+
+    def test_delete_enqueues_rebuild(self):
+        self.add_stat(self.bob, [self.bob, self.john])
+        stat = self.add_stat(self.john, [self.john, self.ann])
+        self.client.post(reverse('game_stat', kwargs={'game_slug': 'catan', 'stat_id': stat.id}), {'stat_id': stat.id})
+        self.assertEqual(self.ratings()['ann'][1], 1)
+
+        self.assertEqual(run_pending_tasks(), 1)
+        self.assertEqual(self.ratings(), {'bob': (settings.RATING_INITIAL + 16, 1),
+                                          'john': (settings.RATING_INITIAL - 16, 1)})
+
+    def test_rating_on_game_leaderboard(self):
+        self.add_stat(self.bob, [self.bob, self.john])
+        resp = self.client.get(reverse('game_leaderboard', kwargs={'game_slug': 'catan'}))
+        self.assertEqual(resp.context['players'][0]['rating'], settings.RATING_INITIAL + 16)
+
+
+class AnalyticsTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='bob', email='bob@ex.com')
+        self.game = Game.objects.create(game_name='catan', image='catan.com')
+        self.bob = Player.objects.create(username='bob', user_friend=self.user)
+        self.john = Player.objects.create(username='john', user_friend=self.user)
+        # bob: win, win, lose, win, win, win, lose
+        for day, (winner, score) in enumerate(((self.bob, 10), (self.bob, 20), (self.john, 5), (self.bob, 40),
+                                               (self.bob, 30), (self.bob, 25), (self.john, 15)), start=1):
+            stat = Statistic.objects.create(user_id=self.user, game=self.game, stats_name='game', winner=winner,
+                                            game_date=datetime.date(2022, 6, day))
+            stat.players.add(self.bob, self.john)
+            Score.objects.create(stats=stat, player=self.bob, score=score)
+
+    def test_player_analytics(self):
+        result = get_player_analytics(self.user, game_slug='catan', window=3)
+        self.assertEqual((result['count_played_game'], result['count_win'], result['count_score']), (7, 5, 7))
+        self.assertEqual((result['longest_win_streak'], result['longest_lose_streak'], result['current_streak']),
+                         (3, 1, -1))
+        self.assertEqual(result['percentiles'][50], 20.0)
+        self.assertAlmostEqual(result['mean_score'], 145 / 7)
+        self.assertEqual(sum(result['histogram']['counts']), 7)
+        self.assertEqual([round(rate, 2) for rate in result['rolling_win_rate']], [0.67, 0.67, 0.67, 1.0, 0.67])
+
+    def test_numpy_matches_baseline(self):
+        for rows in (0, 1, 9, 10, 1000):
+            scores, wins = analytics_benchmark.synthetic_columns(rows, seed=rows)
+            vectorized = analytics_metrics.compute_metrics(scores, wins)
+            reference = analytics_baseline.compute_metrics(scores.tolist(), wins.tolist())
+            for key in ('count_score', 'count_played_game', 'count_win', 'longest_win_streak', 'longest_lose_streak',
+                        'current_streak'):
+                self.assertEqual(vectorized[key], reference[key], (rows, key))
+            for key in ('mean_score', 'std_score'):
+                self.assertAlmostEqual(vectorized[key] or 0, reference[key] or 0, msg=(rows, key))
+            self.assertEqual(vectorized['histogram']['counts'], reference['histogram']['counts'])
+            for percent, value in vectorized['percentiles'].items():
+                self.assertAlmostEqual(value or 0, reference['percentiles'][percent] or 0)
+            self.assertEqual(len(vectorized['rolling_win_rate']), len(reference['rolling_win_rate']))
+            for vectorized_rate, reference_rate in zip(vectorized['rolling_win_rate'], reference['rolling_win_rate']):
+                self.assertAlmostEqual(vectorized_rate, reference_rate)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_analytics', '--rows', '1000', '--repeat', '1', stdout=out)
+        self.assertIn('1000 rows: numpy', out.getvalue())
+        call_command('benchmark_analytics', '--user', 'bob@ex.com', '--repeat', '1', stdout=out)
+        self.assertIn('        7 rows: numpy', out.getvalue())
+
+
+class BackgroundTaskTests(TestCase):
+
+    @override_settings(TASK_MAX_ATTEMPTS=3, TASK_RETRY_BACKOFF=10)
+    def test_retries_with_backoff(self):
+        task = enqueue_task('bg_tracker.tests.failing_task', fail_times=1)
+        self.assertEqual(run_pending_tasks(), 1)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (BackgroundTask.PENDING, 1))
+        self.assertIn('BGG is down', task.last_error)
+        self.assertGreater(task.run_after, timezone.now() + datetime.timedelta(seconds=5))
+
+        # not due yet
+        self.assertEqual(run_pending_tasks(), 0)
+        BackgroundTask.objects.update(run_after=timezone.now())
+        run_pending_tasks()
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (BackgroundTask.DONE, 2))
+
+    @override_settings(TASK_MAX_ATTEMPTS=2, TASK_RETRY_BACKOFF=0)
+    def test_fails_after_max_attempts(self):
+        task = enqueue_task('bg_tracker.tests.failing_task', fail_times=5)
+        run_pending_tasks()
+        run_pending_tasks()
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (BackgroundTask.FAILED, 2))
+
+    def test_run_tasks_command(self):
+        enqueue_task('bg_tracker.tests.failing_task', fail_times=0)
+        out = StringIO()
+        call_command('run_tasks', '--once', stdout=out)
+        self.assertIn('Processed 1 task(s)', out.getvalue())
+
+
+class ImportStatsCommandTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='bob', email='bob@ex.com')
+        Game.objects.create(game_name='catan', image='catan.com')
+        Player.objects.create(username='bob', user_friend=self.user)
+        Player.objects.create(username='john', user_friend=self.user)
+
+    def test_import_csv(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as file:
+            file.write('stats_name,game_date,duration,comments,winner,players,scores\n'
+                       'first,2022-06-04,01:30:00,fine,bob,bob;john,bob:30;john:20\n'
+                       'second,2022-06-05,00:45:00,,john,bob;john,\n')
+        self.addCleanup(os.remove, file.name)
+        out = StringIO()
+        call_command('import_stats', file.name, user='bob@ex.com', game='catan', stdout=out)
+        self.assertIn('Imported 2 play(s)', out.getvalue())
+        first = Statistic.objects.get(stats_name='first')
+        self.assertEqual(first.duration, datetime.time(1, 30))
+        self.assertEqual(sorted(first.score_set.values_list('player__username', 'score')), [('bob', 30), ('john', 20)])
+        self.assertEqual(Statistic.objects.get(stats_name='second').winner.username, 'john')
+
+    def test_export_import_round_trip(self):
+        bob, john = Player.objects.all()
+        # separators of the older CSV layout in a username
+        ann = Player.objects.create(username='ann;lee:2', user_friend=self.user)
+        stat = Statistic.objects.create(user_id=self.user, game=Game.objects.get(slug='catan'), stats_name='first',
+                                        winner=john, duration=datetime.time(0, 45))
+        stat.players.add(bob, john, ann)
+        Score.objects.create(stats=stat, player=john, score=12)
+        Score.objects.create(stats=stat, player=ann, score=7)
+        Game.objects.create(game_name='azul', image='azul.com')
+
+        for export_format in ('csv', 'ndjson'):
+            with tempfile.NamedTemporaryFile(suffix=f'.{export_format}', delete=False) as file:
+                pass
+            self.addCleanup(os.remove, file.name)
+            call_command('export_stats', user='bob@ex.com', game='catan', format=export_format, output=file.name)
+            call_command('import_stats', file.name, user='bob@ex.com', game='azul', stdout=StringIO())
+
+        imported = Statistic.objects.filter(game__slug='azul')
+        self.assertEqual(imported.count(), 2)
+        for play in imported:
+            self.assertEqual((play.stats_name, play.winner, play.duration), ('first', john, datetime.time(0, 45)))
+            self.assertEqual(list(play.players.all()), [bob, john, ann])
+            self.assertEqual(sorted(play.score_set.values_list('player__username', 'score')),
+                             [('ann;lee:2', 7), ('john', 12)])
+
+    def test_import_invalid_json(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as file:
+            json.dump([{'stats_name': 'first', 'game_date': '2022-06-04', 'winner': 'marie', 'players': ['bob']}],
+                      file)
+        self.addCleanup(os.remove, file.name)
+        with self.assertRaisesMessage(CommandError, 'Unknown players: marie'):
+            call_command('import_stats', file.name, user='bob@ex.com', game='catan')
+
+
+class BenchmarkTests(TestCase):
+    def test_generate_data(self):
+        out = StringIO()
+        call_command('generate_data', '--users', '2', '--games', '3', '--players', '4', '--plays', '25',
+                     '--batch-size', '10', stdout=out)
+        self.assertIn('Generated 50 plays of 2 users', out.getvalue())
+        user = User.objects.get(email='synthetic-0@example.com')
+        self.assertTrue(user.check_password('synthetic'))
+        self.assertEqual(user.game_set.count(), 3)
+        self.assertEqual(Player.objects.filter(user_friend=user).count(), 4)
+        self.assertTrue(Player.objects.filter(user_friend=user, username=user.username).exists())
+
+        stats = Statistic.objects.filter(user_id=user)
+        self.assertEqual(stats.count(), 25)
+        for stat in stats.prefetch_related('players', 'score_set'):
+            players = {player.id for player in stat.players.all()}
+            self.assertTrue(2 <= len(players) <= 4)
+            self.assertIn(stat.winner_id, players)
+            self.assertEqual({score.player_id for score in stat.score_set.all()}, players)
+        self.assertEqual(GameStatsRollup.objects.filter(user=user).aggregate(plays=Sum('count_win'))['plays'], 25)
+        self.assertTrue(PlayerRating.objects.filter(player__user_friend=user).exists())
+
+        # numbering goes on after the existing synthetic users
+        call_command('generate_data', '--users', '1', '--games', '1', '--plays', '1', stdout=StringIO())
+        self.assertTrue(User.objects.filter(email='synthetic-2@example.com').exists())
+
+    def test_run_benchmarks(self):
+        call_command('generate_data', '--users', '1', '--games', '2', '--players', '3', '--plays', '20',
+                     stdout=StringIO())
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as file:
+            pass
+        self.addCleanup(os.remove, file.name)
+
+        out = StringIO()
+        call_command('run_benchmarks', '--repeat', '2', '--save-baseline', file.name, stdout=out)
+        for scenario in ('overall-stat-api', 'stats-list-api', 'game-detail-api', 'game-page'):
+            self.assertIn(scenario, out.getvalue())
+        with open(file.name) as baseline:
+            results = json.load(baseline)
+        self.assertEqual(set(results['game-page']), {'queries', 'p50_ms', 'p95_ms', 'peak_kb'})
+
+        results['stats-list-api']['queries'] -= 1
+        with open(file.name, 'w') as baseline:
+            json.dump(results, baseline)
+        with self.assertRaisesMessage(CommandError, 'stats-list-api: queries'):
+            call_command('run_benchmarks', '--repeat', '1', '--scenario', 'stats-list-api', '--compare', file.name,
+                         '--tolerance', '100', stdout=StringIO())
+
+
+class ConcurrencyBenchmarkTests(TransactionTestCase):
+    # the benchmark requests from several threads, which must see committed data
+
+    def test_benchmark_asgi(self):
+        call_command('generate_data', '--users', '1', '--games', '1', '--players', '3', '--plays', '5',
+                     stdout=StringIO())
+        out = StringIO()
+        call_command('benchmark_asgi', '--requests', '4', '--concurrency', '2', '--threads', '2',
+                     '--scenario', 'overall-stat', stdout=out)
+        self.assertRegex(out.getvalue(), r'overall-stat +wsgi .* req/s')
+        self.assertRegex(out.getvalue(), r'overall-stat +asgi .* req/s')
@@ -1,22 +1,37 @@
 import logging
 
-from django.shortcuts import render, redirect
+from django.conf import settings
+from django.shortcuts import get_object_or_404, render, redirect
 from django.views.generic import ListView, View, CreateView, DetailView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse_lazy
 from django.contrib import messages
+from django.db import transaction
+from django.http import Http404
 
 from .forms import AddPlayerForm, AddGameForm, AddStatisticForm, ScoreSet
 from .models import Game, Score, Statistic, Player
 
-from services.bgg_info import get_bgg_info
-from services.queries import get_game_stat, instance_get, get_last_instance_id, get_last, get_count_players_in_stat, \
-    delete_instance, game_added_by_user, game_exists_in_db, add_game_to_user, filter_model_or_qs
+from services.bgg_info import get_cached_bgg_info, enqueue_game_enrichment
+from services.cache import ALL_GAMES, get_or_set
+from services.leaderboards import get_leaderboard, head_to_head_table
+from services.queries import get_game_stat, instance_get, game_added_by_user, game_exists_in_db, add_game_to_user, \
+    filter_model_or_qs
 from services.overall_stat import StatsFromModels
+from services.pagination import KeysetPaginator, InvalidCursor
+from services.rollups import delete_statistics
 
 logger = logging.getLogger(__name__)
 
 
+def keyset_page(request, queryset, ordering):
+    paginator = KeysetPaginator(queryset, ordering, settings.PAGINATE_BY)
+    try:
+        return paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        raise Http404('Invalid cursor')
+
+
 class HomePage(View):
     def get(self, request):
         return render(request, 'bg_tracker/index.html')
@@ -28,7 +43,8 @@ class GameList(LoginRequiredMixin, ListView):
     context_object_name = 'games'
 
     def get_queryset(self):
-        return filter_model_or_qs(Game, user_id=self.request.user).values('image', 'slug')
+        games = filter_model_or_qs(Game, user_id=self.request.user).values('image', 'slug')
+        return get_or_set('game-list', self.request.user.pk, lambda: list(games))
 
 
 class GamePage(LoginRequiredMixin, DetailView):
@@ -43,7 +59,10 @@ class GamePage(LoginRequiredMixin, DetailView):
         context = super().get_context_data()
         game_stat = filter_model_or_qs(get_game_stat(self.object), user_id=self.request.user).values('pk', 'game_date',
                                                                                                      'stats_name')
-        my_context = {'game': self.object, 'game_stat': game_stat}
+        page = get_or_set('game-page', self.request.user.pk,
+                          lambda: keyset_page(self.request, game_stat, ordering=('-game_date', '-pk')),
+                          game_slug=self.object.slug, variant=self.request.GET.urlencode())
+        my_context = {'game': self.object, 'game_stat': page.object_list, 'page': page}
         return context | my_context
 
 
@@ -68,6 +87,10 @@ class PlayersList(LoginRequiredMixin, ListView):
     def get_queryset(self):
         return filter_model_or_qs(Player, user_friend=self.request.user)
 
+    def get_context_data(self, *, object_list=None, **kwargs):
+        page = keyset_page(self.request, self.object_list, ordering=('pk',))
+        return super().get_context_data(object_list=page.object_list, page=page, **kwargs)
+
 
 class AddGame(LoginRequiredMixin, View):
 
@@ -87,21 +110,24 @@ class AddGame(LoginRequiredMixin, View):
             if game is not None:
                 add_game_to_user(game, self.request.user)
                 return redirect('game_list')
-            try:
-                game_img = get_bgg_info(game_name)
-            except KeyError as e:
-                logger.warning(f'{type(e)}, {e}; game_name: {game_name}')
+
+            # Resolved locally (catalog mirror, cache), BGG is only asked in the background for unknown names.
+            hit, bgg_info = get_cached_bgg_info(game_name)
+            if hit and bgg_info is None:
+                logger.warning(f'game not found on BGG (cached); game_name: {game_name}')
                 messages.error(self.request, 'The name of the game is incorrect or the game does not exist')
                 return redirect('add_game')
-            except Exception as e:
-                logger.warning(f'{type(e)}, {e}; game_name: {game_name}')
-                messages.error(self.request, 'An error has occurred on the BoardGameGeek side')
-                return redirect('add_game')
-            else:
-                form.cleaned_data['user_id'] = self.request.user
-                form.cleaned_data['image'] = game_img
-                form.save()
-                return redirect('game_list')
+
+            form.cleaned_data['user_id'] = self.request.user
+            form.cleaned_data['image'] = settings.BGG_PLACEHOLDER_IMAGE
+            if bgg_info is not None:
+                form.cleaned_data |= bgg_info
+                form.cleaned_data['image'] = bgg_info['image'] or settings.BGG_PLACEHOLDER_IMAGE
+            with transaction.atomic():
+                game = form.save()
+                if not hit:
+                    enqueue_game_enrichment(game)
+            return redirect('game_list')
 
 
 class AddStats(LoginRequiredMixin, CreateView):
@@ -120,28 +146,24 @@ class AddStats(LoginRequiredMixin, CreateView):
         return super().form_valid(form)
 
     def get_success_url(self):
-        return reverse_lazy('add_score', kwargs={'game_slug': self.kwargs.get('game_slug'),
-                                                 'stat_id': get_last_instance_id(Statistic)})
+        return reverse_lazy('add_score', kwargs={'game_slug': self.kwargs.get('game_slug'), 'stat_id': self.object.id})
 
 
 class AddScore(LoginRequiredMixin, View):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._last_stat = get_last(Statistic)
-        self._last_stat_player_count = get_count_players_in_stat(self._last_stat)
+
+    def get_statistic(self):
+        # Ownership is part of the lookup: another user's statistic is a 404, never a place to attach scores to.
+        statistics = filter_model_or_qs(Statistic, user_id=self.request.user,
+                                        game__slug=self.kwargs.get('game_slug')).prefetch_related('players')
+        return get_object_or_404(statistics, pk=self.kwargs.get('stat_id'))
 
     def get(self, request, **kwargs):
-        score_form = ScoreSet(form_kwargs={'last_stat': self._last_stat},
-                              extra=self._last_stat_player_count)
+        score_form = ScoreSet(stat=self.get_statistic())
         return render(request, 'bg_tracker/add_score.html', {'form': score_form})
 
     def post(self, request, **kwargs):
-        score_form = ScoreSet(request.POST, form_kwargs={'last_stat': self._last_stat},
-                              extra=self._last_stat_player_count)
+        score_form = ScoreSet(request.POST, stat=self.get_statistic())
         if score_form.is_valid():
-            last_stat_id = get_last_instance_id(Statistic)
-            for score in score_form.cleaned_data:
-                score.update({'stats_id': last_stat_id})
             score_form.save()
         return redirect('game_page', game_slug=self.kwargs.get('game_slug'))
 
@@ -159,7 +181,7 @@ class GameStatPage(LoginRequiredMixin, DetailView):
 
     def post(self, *args, **kwargs):
         stat_id_ = self.request.POST.get('stat_id')
-        delete_instance(Statistic, id=stat_id_)
+        delete_statistics(filter_model_or_qs(Statistic, id=stat_id_))
         return redirect('game_page', game_slug=self.kwargs.get('game_slug'))
 
 
@@ -173,19 +195,21 @@ class OverallGameStats(LoginRequiredMixin, DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data()
-        overall_game_stat = StatsFromModels(game_slug=self.kwargs['game_slug'],
-                                            user=self.request.user)
-        count_win = overall_game_stat.get_count_win()
-        percent_win = overall_game_stat.get_percent_win(count_win=count_win)
-        count_lose = overall_game_stat.get_count_lose(count_win=count_win)
-        percent_lose = overall_game_stat.get_percent_lose(count_lose=count_lose)
-        best_score = overall_game_stat.get_max_score()
-        min_score = overall_game_stat.get_min_score()
-        sum_played_time = overall_game_stat.get_sum_played_times()
-        count_played_game = overall_game_stat.get_count_played_game()
-
-        my_context = {'count_win': count_win, 'percent_win': percent_win, 'count_played_game': count_played_game,
-                      'count_lose': count_lose, 'percent_lose': percent_lose, 'sum_played_time': sum_played_time,
-                      'best_score': best_score, 'min_score': min_score}
+        my_context = get_or_set('overall-stat', self.request.user.pk,
+                                lambda: StatsFromModels(game_slug=self.kwargs['game_slug'],
+                                                        user=self.request.user).get_overall_stat(),
+                                game_slug=self.kwargs['game_slug'])
 
         return context | my_context
+
+
+class LeaderboardPage(LoginRequiredMixin, View):
+
+    def get(self, request, game_slug=None):
+        game = get_object_or_404(filter_model_or_qs(Game, user_id=request.user), slug=game_slug) if game_slug else None
+        leaderboard = get_or_set('leaderboard', request.user.pk,
+                                 lambda: get_leaderboard(request.user, game_slug=game_slug),
+                                 game_slug=game_slug or ALL_GAMES)
+        return render(request, 'bg_tracker/leaderboard.html',
+                      {'game': game, 'players': leaderboard['players'],
+                       'head_to_head': head_to_head_table(leaderboard)})
@@ -167,6 +167,10 @@ LOGGING = {
             'handlers': ['file'],
             'level': 'WARNING',
         },
+        'services': {
+            'handlers': ['file'],
+            'level': 'WARNING',
+        },
     },
 
 }
@@ -186,6 +190,67 @@ REST_FRAMEWORK = {
 
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated'
-    ]
+    ],
+
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.KeysetCursorPagination',
+    'PAGE_SIZE': int(os.getenv('API_PAGE_SIZE') or 50),
 
 }
+
+# BoardGameGeek lookups cache
+BGG_CACHE_TTL = int(os.getenv('BGG_CACHE_TTL') or 60 * 60 * 24 * 30)
+BGG_CACHE_NOT_FOUND_TTL = int(os.getenv('BGG_CACHE_NOT_FOUND_TTL') or 60 * 60 * 24)
+BGG_CACHE_MAX_ENTRIES = int(os.getenv('BGG_CACHE_MAX_ENTRIES') or 10000)
+# stored in Game.image and used as <img src> on every page, so it must not be relative
+BGG_PLACEHOLDER_IMAGE = '/' + STATIC_URL.lstrip('/') + 'bg_tracker/img/game_placeholder.svg'
+BGG_URL_BASE = os.getenv('BGG_URL_BASE') or 'http://www.boardgamegeek.com'
+# batched lookups: concurrent searches, calls per second shared by them, game ids per details call
+BGG_MAX_WORKERS = int(os.getenv('BGG_MAX_WORKERS') or 4)
+BGG_REQUESTS_PER_SECOND = float(os.getenv('BGG_REQUESTS_PER_SECOND') or 2)
+BGG_BATCH_SIZE = int(os.getenv('BGG_BATCH_SIZE') or 20)
+
+# background tasks
+TASK_MAX_ATTEMPTS = int(os.getenv('TASK_MAX_ATTEMPTS') or 5)
+TASK_RETRY_BACKOFF = int(os.getenv('TASK_RETRY_BACKOFF') or 30)
+TASK_RETRY_BACKOFF_MAX = int(os.getenv('TASK_RETRY_BACKOFF_MAX') or 60 * 60)
+TASK_RUNNING_TIMEOUT = int(os.getenv('TASK_RUNNING_TIMEOUT') or 15 * 60)
+
+# pagination
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE') or 500)
+PAGINATE_BY = int(os.getenv('PAGINATE_BY') or 30)
+# trends: most week, month or year buckets of one response
+TRENDS_MAX_BUCKETS = int(os.getenv('TRENDS_MAX_BUCKETS') or 520)
+
+# cache: 'file' by default, or 'db' (run `python manage.py createcachetable` first), both shared by the workers of a
+# node so they see each other's version bumps. locmem is per process, the test runner below switches to it.
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_LOCATION') or os.path.join(BASE_DIR, 'cache'),
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': os.getenv('CACHE_LOCATION') or 'bg_tracker_cache',
+    },
+}
+CACHES = {
+    'default': CACHE_BACKENDS[os.getenv('CACHE_BACKEND') or 'file'],
+}
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL') or 60 * 10)
+# runs the tests with a fresh locmem cache, so cached responses can't leak between runs
+TEST_RUNNER = 'boardgame_tracker.test_runner.LocmemCacheTestRunner'
+
+# player ratings (Elo)
+RATING_INITIAL = float(os.getenv('RATING_INITIAL') or 1500)
+RATING_K_FACTOR = float(os.getenv('RATING_K_FACTOR') or 32)
+
+# per-request query and timing instrumentation (Server-Timing header and log lines)
+REQUEST_INSTRUMENTATION = bool(os.getenv('REQUEST_INSTRUMENTATION'))
+REQUEST_SLOW_MS = int(os.getenv('REQUEST_SLOW_MS') or 500)
+REQUEST_DUPLICATE_QUERIES = int(os.getenv('REQUEST_DUPLICATE_QUERIES') or 10)
+if REQUEST_INSTRUMENTATION:
+    MIDDLEWARE.insert(0, 'bg_tracker.middleware.RequestInstrumentationMiddleware')
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class LocmemCacheTestRunner(DiscoverRunner):
+    """Django's test runner with every cache replaced by a per-process locmem cache for the whole run."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._locmem_caches = override_settings(CACHES={alias: settings.CACHE_BACKENDS['locmem']
+                                                        for alias in settings.CACHES})
+        self._locmem_caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._locmem_caches.disable()
+        super().teardown_test_environment(**kwargs)
@@ -5,3 +5,26 @@ export EMAIL_PORT=''
 export EMAIL_USE_TLS=''
 export EMAIL_HOST_USER=''
 export EMAIL_HOST_PASSWORD=''
+export API_PAGE_SIZE=''
+export API_MAX_PAGE_SIZE=''
+export PAGINATE_BY=''
+export TRENDS_MAX_BUCKETS=''
+export BGG_CACHE_TTL=''
+export BGG_CACHE_NOT_FOUND_TTL=''
+export BGG_CACHE_MAX_ENTRIES=''
+export BGG_URL_BASE=''
+export BGG_MAX_WORKERS=''
+export BGG_REQUESTS_PER_SECOND=''
+export BGG_BATCH_SIZE=''
+export TASK_MAX_ATTEMPTS=''
+export TASK_RETRY_BACKOFF=''
+export TASK_RETRY_BACKOFF_MAX=''
+export TASK_RUNNING_TIMEOUT=''
+export CACHE_BACKEND=''
+export CACHE_LOCATION=''
+export RESPONSE_CACHE_TTL=''
+export RATING_INITIAL=''
+export RATING_K_FACTOR=''
+export REQUEST_INSTRUMENTATION=''
+export REQUEST_SLOW_MS=''
+export REQUEST_DUPLICATE_QUERIES=''
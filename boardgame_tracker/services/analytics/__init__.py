@@ -0,0 +1,12 @@
+from services.analytics.loaders import load_player_arrays
+from services.analytics.metrics import ROLLING_WINDOW, compute_metrics
+from services.overall_stat import get_user_player
+
+
+def get_player_analytics(user, game_slug=None, window=ROLLING_WINDOW):
+    """
+    Score distribution, percentiles, standard deviation, streaks and rolling win rate of the user's own player, for
+    one game or all games, computed with NumPy over columns loaded by values_list.
+    """
+    player = get_user_player(user)
+    return compute_metrics(*load_player_arrays(player, user, game_slug), window=window)
@@ -0,0 +1,62 @@
+"""Pure Python versions of the metrics, the reference the NumPy implementation is tested and benchmarked against."""
+import math
+from collections import deque
+
+from services.analytics.metrics import HISTOGRAM_BINS, PERCENTILES, ROLLING_WINDOW
+
+
+def _percentile(ordered, percent):
+    position = (len(ordered) - 1) * percent / 100
+    low, high = math.floor(position), math.ceil(position)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def _histogram(scores, bins):
+    low, high = min(scores), max(scores)
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    width = (high - low) / bins
+    counts = [0] * bins
+    for score in scores:
+        counts[min(int((score - low) / width), bins - 1)] += 1
+    return {'edges': [low + width * i for i in range(bins + 1)], 'counts': counts}
+
+
+def score_summary(scores, percentiles=PERCENTILES, bins=HISTOGRAM_BINS):
+    if not scores:
+        return {'count_score': 0, 'mean_score': None, 'std_score': None,
+                'percentiles': dict.fromkeys(percentiles), 'histogram': {'edges': [], 'counts': []}}
+    mean = sum(scores) / len(scores)
+    ordered = sorted(scores)
+    return {'count_score': len(scores), 'mean_score': mean,
+            'std_score': math.sqrt(sum((score - mean) ** 2 for score in scores) / len(scores)),
+            'percentiles': {percent: _percentile(ordered, percent) for percent in percentiles},
+            'histogram': _histogram(scores, bins)}
+
+
+def streaks(wins):
+    longest = {True: 0, False: 0}
+    current, previous = 0, None
+    for won in wins:
+        current = current + 1 if won == previous else 1
+        previous = won
+        longest[won] = max(longest[won], current)
+    return {'longest_win_streak': longest[True], 'longest_lose_streak': longest[False],
+            'current_streak': current if previous else -current}
+
+
+def rolling_win_rate(wins, window=ROLLING_WINDOW):
+    rates, last, total = [], deque(), 0
+    for won in wins:
+        last.append(won)
+        total += won
+        if len(last) > window:
+            total -= last.popleft()
+        if len(last) == window:
+            rates.append(total / window)
+    return rates
+
+
+def compute_metrics(scores, wins, window=ROLLING_WINDOW):
+    return {**score_summary(scores), 'count_played_game': len(wins), 'count_win': sum(wins),
+            **streaks(wins), 'rolling_win_rate': rolling_win_rate(wins, window)}
@@ -0,0 +1,39 @@
+import time
+
+import numpy as np
+
+from services.analytics import baseline, metrics
+from services.analytics.loaders import load_player_arrays, load_player_lists
+
+
+def synthetic_columns(rows, seed=0, win_rate=0.3):
+    # Reproducible scores and results of `rows` plays.
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 200, size=rows), rng.random(rows) < win_rate
+
+
+def best_time(func, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def benchmark_synthetic(rows, repeat=3, seed=0):
+    # Seconds taken by the NumPy metrics and by the pure Python baseline on the same data.
+    scores, wins = synthetic_columns(rows, seed=seed)
+    score_list, win_list = scores.tolist(), wins.tolist()
+    return {'rows': rows,
+            'numpy': best_time(lambda: metrics.compute_metrics(scores, wins), repeat),
+            'python': best_time(lambda: baseline.compute_metrics(score_list, win_list), repeat)}
+
+
+def benchmark_player(player, user, game_slug=None, repeat=3):
+    # Same comparison on the plays of a player, including the time to read them from the database.
+    _, wins = load_player_arrays(player, user, game_slug)
+    return {'rows': int(wins.size),
+            'numpy': best_time(lambda: metrics.compute_metrics(*load_player_arrays(player, user, game_slug)), repeat),
+            'python': best_time(lambda: baseline.compute_metrics(*load_player_lists(player, user, game_slug)),
+                                repeat)}
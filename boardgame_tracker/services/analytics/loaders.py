@@ -0,0 +1,30 @@
+import numpy as np
+
+from bg_tracker.models import Score, Statistic
+
+
+def _columns(player, user, game_slug=None):
+    statistics = Statistic.objects.filter(user_id=user, players=player)
+    scores = Score.objects.filter(player=player, stats__user_id=user)
+    if game_slug is not None:
+        statistics = statistics.filter(game__slug=game_slug)
+        scores = scores.filter(stats__game__slug=game_slug)
+    winners = statistics.order_by('game_date', 'id').values_list('winner_id', flat=True)
+    return scores.values_list('score', flat=True), winners
+
+
+def load_player_arrays(player, user, game_slug=None):
+    """
+    Scores of the player as an int64 array and its chronological results as a boolean array.
+
+    Rows are streamed by .iterator() straight into np.fromiter, no intermediate list or model instances are built.
+    """
+    scores, winners = _columns(player, user, game_slug)
+    return (np.fromiter(scores.iterator(), dtype=np.int64),
+            np.fromiter(winners.iterator(), dtype=np.int64) == player.id)
+
+
+def load_player_lists(player, user, game_slug=None):
+    # Same columns as Python lists, for the pure Python baseline.
+    scores, winners = _columns(player, user, game_slug)
+    return list(scores), [winner_id == player.id for winner_id in winners]
@@ -0,0 +1,48 @@
+import numpy as np
+
+PERCENTILES = (25, 50, 75, 90)
+HISTOGRAM_BINS = 10
+ROLLING_WINDOW = 10
+
+
+def score_summary(scores, percentiles=PERCENTILES, bins=HISTOGRAM_BINS):
+    # Mean, population standard deviation, percentiles (linear interpolation) and histogram of a score array.
+    if not scores.size:
+        return {'count_score': 0, 'mean_score': None, 'std_score': None,
+                'percentiles': dict.fromkeys(percentiles), 'histogram': {'edges': [], 'counts': []}}
+    counts, edges = np.histogram(scores, bins=bins)
+    return {'count_score': int(scores.size), 'mean_score': float(scores.mean()), 'std_score': float(scores.std()),
+            'percentiles': dict(zip(percentiles, np.percentile(scores, percentiles).tolist())),
+            'histogram': {'edges': edges.tolist(), 'counts': counts.tolist()}}
+
+
+def _runs(flags):
+    # Lengths of the runs of True in a boolean array, from the rising and falling edges of the padded array.
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], flags.view(np.int8), [0]))))
+    return edges[1::2] - edges[::2]
+
+
+def streaks(wins):
+    """
+    Longest win and lose streaks of a chronological boolean array of results, and the current streak: positive
+    while winning, negative while losing.
+    """
+    if not wins.size:
+        return {'longest_win_streak': 0, 'longest_lose_streak': 0, 'current_streak': 0}
+    win_runs, lose_runs = _runs(wins), _runs(~wins)
+    current = win_runs[-1] if wins[-1] else -lose_runs[-1]
+    return {'longest_win_streak': int(win_runs.max(initial=0)), 'longest_lose_streak': int(lose_runs.max(initial=0)),
+            'current_streak': int(current)}
+
+
+def rolling_win_rate(wins, window=ROLLING_WINDOW):
+    # Win rate of every run of `window` consecutive plays, empty when there are fewer plays.
+    if wins.size < window:
+        return np.empty(0)
+    wins_so_far = np.concatenate(([0], np.cumsum(wins, dtype=np.int64)))
+    return (wins_so_far[window:] - wins_so_far[:-window]) / window
+
+
+def compute_metrics(scores, wins, window=ROLLING_WINDOW):
+    return {**score_summary(scores), 'count_played_game': int(wins.size), 'count_win': int(wins.sum()),
+            **streaks(wins), 'rolling_win_rate': rolling_win_rate(wins, window).tolist()}
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import math
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import ThreadSensitiveContext
+
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.db.models import Count
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from bg_tracker.models import Game
+from services.cache import invalidate_user
+
+User = get_user_model()
+
+SCENARIOS = {
+    'overall-stat-api': lambda slug: reverse('overall_stat', kwargs={'game_slug': slug}),
+    'stats-list-api': lambda slug: reverse('stats-list', kwargs={'game_slug': slug}),
+    'game-detail-api': lambda slug: reverse('game-detail', kwargs={'slug': slug}),
+    'game-page': lambda slug: reverse('game_page', kwargs={'game_slug': slug}),
+}
+# (synchronous view, async view, game slug kwarg) of the endpoints served by both
+CONCURRENCY_SCENARIOS = {
+    'game-list': ('game-list', 'async_game_list', None),
+    'game-detail': ('game-detail', 'async_game_detail', 'slug'),
+    'stats-list': ('stats-list', 'async_stats_list', 'game_slug'),
+    'overall-stat': ('overall_stat', 'async_overall_stat', 'game_slug'),
+}
+METRICS = ('queries', 'p50_ms', 'p95_ms', 'peak_kb')
+BENCHMARK_TOLERANCE = 0.2
+
+
+def percentile(values, percent):
+    # Nearest-rank percentile, exact for the few samples a benchmark takes.
+    values = sorted(values)
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+def get_busiest_user(email=None):
+    # The user with the given email, or the one who recorded the most plays. None if there is none.
+    users = User.objects.filter(email=email) if email else User.objects.all()
+    return users.annotate(plays=Count('user_owner')).order_by('-plays', 'id').first()
+
+
+def get_busiest_game(user):
+    # Slug of the game the user recorded the most plays of, None without any game.
+    return Game.objects.filter(user_id=user).annotate(plays=Count('game_stat', distinct=True)) \
+        .order_by('-plays', 'id').values_list('slug', flat=True).first()
+
+
+def _check(url, response):
+    if response.status_code != 200:
+        raise ValueError(f'GET {url} answered {response.status_code}')
+
+
+def _request(client, url, user, warm):
+    if not warm:
+        # every response of the user is rebuilt, not served from the response cache
+        invalidate_user(user.pk)
+    response = client.get(url)
+    _check(url, response)
+    return response
+
+
+def measure(client, url, user, repeat=20, warm=False):
+    """
+    Request url `repeat` times, returns the queries of the last request, the p50 and p95 latency and the peak memory
+    allocated by one request.
+
+    Memory is traced in a separate request: tracemalloc slows Python code down and would skew the timings.
+    """
+    if warm:
+        _request(client, url, user, warm)
+    timings = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            _request(client, url, user, warm)
+            timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        _request(client, url, user, warm)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'queries': len(queries), 'p50_ms': round(percentile(timings, 50) * 1000, 2),
+            'p95_ms': round(percentile(timings, 95) * 1000, 2), 'peak_kb': round(peak / 1024, 1)}
+
+
+def run_benchmarks(user, game_slug, scenarios=None, repeat=20, warm=False, client=None):
+    # {scenario: metrics} for the hot views and endpoints, requested as the given user.
+    client = client or Client()
+    client.force_login(user)
+    # the test client sends "testserver" as host
+    with override_settings(ALLOWED_HOSTS=['testserver']):
+        return {name: measure(client, SCENARIOS[name](game_slug), user, repeat=repeat, warm=warm)
+                for name in scenarios or SCENARIOS}
+
+
+def compare(results, baseline, tolerance=BENCHMARK_TOLERANCE):
+    """
+    Regressions of results against a baseline, as messages.
+
+    Query counts are deterministic and may not grow at all, timings and memory may grow by `tolerance` (a ratio).
+    Scenarios missing from the baseline are skipped.
+    """
+    regressions = []
+    for name, metrics in results.items():
+        if name not in baseline:
+            continue
+        for metric in METRICS:
+            allowed = baseline[name][metric] * (1 if metric == 'queries' else 1 + tolerance)
+            if metrics[metric] > allowed:
+                regressions.append(f'{name}: {metric} {metrics[metric]} > {baseline[name][metric]}')
+    return regressions
+
+
+def save_baseline(results, path):
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def _throughput(timings, elapsed):
+    return {'requests': len(timings), 'rps': round(len(timings) / elapsed, 1),
+            'p50_ms': round(percentile(timings, 50) * 1000, 2), 'p95_ms': round(percentile(timings, 95) * 1000, 2)}
+
+
+def _authorization(user):
+    # Token authentication writes nothing per request, a session login from every thread would lock SQLite.
+    token, _ = Token.objects.get_or_create(user=user)
+    return f'Token {token.key}'
+
+
+def run_wsgi(user, url, requests, threads):
+    # A WSGI worker with `threads` threads, each one sending its share of the requests one after the other.
+    headers = {'HTTP_AUTHORIZATION': _authorization(user)}
+
+    def work(count):
+        client = Client()
+        timings = []
+        try:
+            for _ in range(count):
+                start = time.perf_counter()
+                _check(url, client.get(url, **headers))
+                timings.append(time.perf_counter() - start)
+        finally:
+            connections.close_all()
+        return timings
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        shares = pool.map(work, [requests // threads + (index < requests % threads) for index in range(threads)])
+        timings = [timing for share in shares for timing in share]
+    return _throughput(timings, time.perf_counter() - start)
+
+
+def run_asgi(user, url, requests, concurrency):
+    # One ASGI event loop with up to `concurrency` requests in flight. Like ASGIHandler, every request gets its own
+    # thread sensitive context, so the sync_to_async calls of concurrent requests run in their own threads.
+    client = AsyncClient()
+    # the async client takes header names as they are sent, not as WSGI environ keys
+    headers = {'AUTHORIZATION': _authorization(user)}
+
+    async def send(semaphore, timings):
+        async with semaphore, ThreadSensitiveContext():
+            start = time.perf_counter()
+            _check(url, await client.get(url, **headers))
+            timings.append(time.perf_counter() - start)
+
+    async def run():
+        semaphore, timings = asyncio.Semaphore(concurrency), []
+        await asyncio.gather(*(send(semaphore, timings) for _ in range(requests)))
+        return timings
+
+    start = time.perf_counter()
+    timings = asyncio.run(run())
+    return _throughput(timings, time.perf_counter() - start)
+
+
+def benchmark_concurrency(user, game_slug, scenarios=None, requests=200, concurrency=20, threads=1, warm=False):
+    """
+    Throughput of the synchronous views served by WSGI and of their async versions served by ASGI, under concurrent
+    load through the test clients: {scenario: {'wsgi': {...}, 'asgi': {...}}}.
+
+    Both handlers run in this process, which compares them rather than a deployment. Cold runs don't keep
+    responses in the response cache.
+    """
+    results = {}
+    with override_settings(ALLOWED_HOSTS=['testserver'], **({} if warm else {'RESPONSE_CACHE_TTL': 0})):
+        for name in scenarios or CONCURRENCY_SCENARIOS:
+            sync_view, async_view, slug_kwarg = CONCURRENCY_SCENARIOS[name]
+            kwargs = {slug_kwarg: game_slug} if slug_kwarg else {}
+            results[name] = {'wsgi': run_wsgi(user, reverse(sync_view, kwargs=kwargs), requests, threads),
+                             'asgi': run_asgi(user, reverse(async_view, kwargs=kwargs), requests, concurrency)}
+    return results
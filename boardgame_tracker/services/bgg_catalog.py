@@ -0,0 +1,129 @@
+import csv
+import re
+from itertools import islice
+from xml.etree.ElementTree import iterparse
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from bg_tracker.models import BggCatalog
+from services.suggest import invalidate_suggestions
+
+CATALOG_BATCH_SIZE = 2000
+CATALOG_FTS_TABLE = 'bg_tracker_bggcatalog_fts'
+CATALOG_FIELDS = ('name', 'query', 'year_published', 'rank', 'image', 'min_players', 'max_players', 'playing_time')
+# CSV columns of the BGG dumps read for each field, the first one present is used
+CSV_COLUMNS = {
+    'bgg_id': ('bgg_id', 'id', 'objectid'),
+    'name': ('name', 'primary'),
+    'year_published': ('yearpublished', 'year_published'),
+    'rank': ('rank', 'boardgame_rank'),
+    'image': ('image', 'thumbnail'),
+    'min_players': ('minplayers', 'min_players'),
+    'max_players': ('maxplayers', 'max_players'),
+    'playing_time': ('playingtime', 'playing_time'),
+}
+XML_TAGS = {'yearpublished': 'year_published', 'image': 'image', 'minplayers': 'min_players',
+            'maxplayers': 'max_players', 'playingtime': 'playing_time'}
+INTEGER_FIELDS = ('bgg_id', 'year_published', 'rank', 'min_players', 'max_players', 'playing_time')
+
+
+def normalize_game_name(game_name):
+    return game_name.strip().lower()
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _entry(values):
+    # Catalog fields of a dump row, None for rows without an id or a name. Unranked games have rank 0 in the dumps.
+    values = {field: (value or '').strip() for field, value in values.items()}
+    values |= {field: _int_or_none(values.get(field)) for field in INTEGER_FIELDS}
+    if not values['bgg_id'] or not values['name']:
+        return None
+    values['rank'] = values['rank'] or None
+    values['image'] = values.get('image', '')
+    return values
+
+
+def read_catalog_csv(file):
+    reader = csv.DictReader(file)
+    columns = {field: next((column for column in names if column in (reader.fieldnames or ())), None)
+               for field, names in CSV_COLUMNS.items()}
+    for row in reader:
+        entry = _entry({field: row[column] for field, column in columns.items() if column})
+        if entry is not None:
+            yield entry
+
+
+def read_catalog_xml(file):
+    # <boardgame objectid=".."> elements of the XML API, parsed one at a time and then freed.
+    for _, element in iterparse(file):
+        if element.tag != 'boardgame':
+            continue
+        names = element.findall('name')
+        primary = next((name for name in names if name.get('primary') == 'true'), names[0] if names else None)
+        values = {'bgg_id': element.get('objectid'), 'name': primary.text if primary is not None else None}
+        values |= {field: element.findtext(tag) for tag, field in XML_TAGS.items()}
+        element.clear()
+        entry = _entry(values)
+        if entry is not None:
+            yield entry
+
+
+def load_catalog(entries, batch_size=CATALOG_BATCH_SIZE):
+    """
+    Insert or update catalog entries in batches, returns (created, updated).
+
+    entries can be a generator: only one batch is held in memory, each batch is written in its own transaction.
+    """
+    created = updated = 0
+    entries = iter(entries)
+    while batch := list(islice(entries, batch_size)):
+        games = {entry['bgg_id']: BggCatalog(**entry, query=normalize_game_name(entry['name'])) for entry in batch}
+        existing = dict(BggCatalog.objects.filter(bgg_id__in=games).values_list('bgg_id', 'id'))
+        for bgg_id, pk in existing.items():
+            games[bgg_id].pk = pk
+        with transaction.atomic():
+            BggCatalog.objects.bulk_create([game for game in games.values() if game.pk is None])
+            BggCatalog.objects.bulk_update([game for game in games.values() if game.pk is not None], CATALOG_FIELDS)
+        created += len(games) - len(existing)
+        updated += len(existing)
+    invalidate_suggestions()
+    return created, updated
+
+
+def find_catalog_game(game_name):
+    # Exact, case-insensitive match on the name, the best ranked one for names shared by several games.
+    return BggCatalog.objects.filter(query=normalize_game_name(game_name)) \
+        .order_by(F('rank').asc(nulls_last=True), 'bgg_id').first()
+
+
+def _fts_query(words):
+    # every word must start a word of the name, in any order
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_catalog(text, limit=10):
+    """
+    Catalog games whose name words start with the words of text, for autocomplete.
+
+    The exact match comes first, then games by BGG rank. Uses the FTS5 index on SQLite and prefix matches on the
+    whole name elsewhere.
+    """
+    query = normalize_game_name(text)
+    words = re.findall(r'\w+', query)
+    if not words:
+        return []
+    if connection.vendor != 'sqlite':
+        return list(BggCatalog.objects.filter(query__startswith=query)
+                    .order_by(F('rank').asc(nulls_last=True), 'name')[:limit])
+    return list(BggCatalog.objects.raw(
+        f'SELECT catalog.* FROM {CATALOG_FTS_TABLE} JOIN bg_tracker_bggcatalog catalog '
+        f'ON catalog.id = {CATALOG_FTS_TABLE}.rowid WHERE {CATALOG_FTS_TABLE} MATCH %s '
+        f'ORDER BY catalog.query = %s DESC, catalog.rank IS NULL, catalog.rank, {CATALOG_FTS_TABLE}.rank LIMIT %s',
+        [_fts_query(words), query, limit]))
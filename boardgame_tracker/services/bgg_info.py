@@ -1,10 +1,269 @@
+import datetime
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
 from libbgg.apiv1 import BGG
 
+from bg_tracker.models import BggLookup, Game
+from services.bgg_catalog import find_catalog_game, normalize_game_name
+from services.cache import invalidate_game, invalidate_user
+from services.tasks import PermanentTaskError, enqueue_task
+
+BGG_INFO_FIELDS = ('bgg_id', 'image', 'min_players', 'max_players', 'playing_time')
+LAST_USED_RESOLUTION = 60 * 60
+
+
+def _cache_key(query):
+    return f'bgg:{hashlib.sha1(query.encode()).hexdigest()}'
+
+
+def _text(node, key):
+    value = node.get(key)
+    return value.get('TEXT') if isinstance(value, dict) else value
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_bgg_game(boardgame):
+    return {'bgg_id': int(boardgame['objectid']),
+            'image': _text(boardgame, 'image') or '',
+            'min_players': _int_or_none(_text(boardgame, 'minplayers')),
+            'max_players': _int_or_none(_text(boardgame, 'maxplayers')),
+            'playing_time': _int_or_none(_text(boardgame, 'playingtime'))}
+
+
+class RateLimiter:
+    """Space out the calls of every thread sharing the limiter to at most `rate` per second."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self._lock = threading.Lock()
+        self._next_call = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            call_at = max(now, self._next_call)
+            self._next_call = call_at + self.interval
+        time.sleep(call_at - now)
+
+
+def _connect():
+    return BGG(url_base=settings.BGG_URL_BASE)
+
+
+def _as_list(found):
+    # The XML API gives a single element as a dict and repeated ones as a list.
+    return found if isinstance(found, list) else [found]
+
+
+def search_bgg_id(game_name, conn=None, limiter=None):
+    # BGG id of the exact match of a name, None if the game doesn't exist.
+    conn = conn or _connect()
+    if limiter is not None:
+        limiter.wait()
+    search = conn.search(game_name.lower(), exact=True)
+    try:
+        found = search['boardgames']['boardgame']
+    except KeyError:
+        return None
+    return int(_as_list(found)[0]['objectid'])
+
+
+def fetch_bgg_games(bgg_ids, conn=None, limiter=None, batch_size=None):
+    # {bgg_id: info} of many games, fetched with the "multiple ids" call of the XML API, batch_size ids per call.
+    conn = conn or _connect()
+    bgg_ids = list(dict.fromkeys(bgg_ids))
+    batch_size = batch_size or settings.BGG_BATCH_SIZE
+    infos = {}
+    for start in range(0, len(bgg_ids), batch_size):
+        if limiter is not None:
+            limiter.wait()
+        games = conn.get_game(bgg_ids[start:start + batch_size])['boardgames'].get('boardgame', [])
+        for game in _as_list(games):
+            info = parse_bgg_game(game)
+            infos[info['bgg_id']] = info
+    return infos
+
+
+def fetch_bgg_info(game_name, conn=None):
+    # Search for a game by its name in the BGG database and extract game info, None if the game doesn't exist.
+    conn = conn or _connect()
+    bgg_id = search_bgg_id(game_name, conn=conn)
+    if bgg_id is None:
+        return None
+    return fetch_bgg_games([bgg_id], conn=conn).get(bgg_id)
+
+
+def _ttl(info):
+    return settings.BGG_CACHE_TTL if info is not None else settings.BGG_CACHE_NOT_FOUND_TTL
+
+
+def _evict_least_recently_used():
+    expired = timezone.now() - datetime.timedelta(seconds=settings.BGG_CACHE_TTL)
+    BggLookup.objects.filter(last_used_at__lt=expired).delete()
+    extra = BggLookup.objects.count() - settings.BGG_CACHE_MAX_ENTRIES
+    if extra > 0:
+        stale_ids = list(BggLookup.objects.order_by('last_used_at').values_list('id', flat=True)[:extra])
+        BggLookup.objects.filter(id__in=stale_ids).delete()
+
+
+def _touch(query, now=None):
+    # last_used_at drives the eviction, it's written at most once per LAST_USED_RESOLUTION and name.
+    if cache.add(f'{_cache_key(query)}:used', True, LAST_USED_RESOLUTION):
+        BggLookup.objects.filter(query=query).update(last_used_at=now or timezone.now())
+
+
+def store_bgg_infos(infos):
+    # Store {game_name: info or None} lookups in the cache and the BggLookup table.
+    now = timezone.now()
+    for game_name, info in infos.items():
+        query = normalize_game_name(game_name)
+        values = dict.fromkeys(BGG_INFO_FIELDS) | (info or {}) | {'found': info is not None, 'fetched_at': now,
+                                                                 'last_used_at': now}
+        values['image'] = values['image'] or ''
+        BggLookup.objects.update_or_create(query=query, defaults=values)
+        cache.set(_cache_key(query), info or {}, _ttl(info))
+    _evict_least_recently_used()
+
+
+def store_bgg_info(game_name, info):
+    store_bgg_infos({game_name: info})
+
+
+def get_cached_bgg_info(game_name):
+    """
+    Return (hit, info) for a name without calling BGG.
+
+    Info is None for a cached "not found" result. Names are resolved against the local catalog mirror first, then
+    looked up in Django's cache and in the BggLookup table which survives restarts.
+    """
+    game = find_catalog_game(game_name)
+    if game is not None:
+        return True, {field: getattr(game, field) for field in BGG_INFO_FIELDS}
+
+    query = normalize_game_name(game_name)
+    info = cache.get(_cache_key(query))
+    if info is not None:
+        _touch(query)
+        return True, info or None
+
+    lookup = BggLookup.objects.filter(query=query).first()
+    if lookup is None:
+        return False, None
+    now = timezone.now()
+    info = {field: getattr(lookup, field) for field in BGG_INFO_FIELDS} if lookup.found else None
+    remaining = (lookup.fetched_at + datetime.timedelta(seconds=_ttl(info)) - now).total_seconds()
+    if remaining <= 0:
+        return False, None
+
+    _touch(query, now)
+    cache.set(_cache_key(query), info or {}, remaining)
+    return True, info
+
+
+def lookup_bgg_info(game_name, conn=None):
+    hit, info = get_cached_bgg_info(game_name)
+    if not hit:
+        info = fetch_bgg_info(game_name, conn=conn)
+        store_bgg_info(game_name, info)
+    return info
+
+
+def lookup_bgg_infos(game_names, max_workers=None, rate=None):
+    """
+    Batched lookup_bgg_info, returns {game_name: info or None}.
+
+    The names missing from the cache are searched concurrently by at most BGG_MAX_WORKERS threads, all of them
+    spaced out to BGG_REQUESTS_PER_SECOND calls, then the details of every game found are fetched together with
+    the "multiple ids" call.
+    """
+    infos, missing = {}, []
+    for game_name in dict.fromkeys(game_names):
+        hit, info = get_cached_bgg_info(game_name)
+        if hit:
+            infos[game_name] = info
+        else:
+            missing.append(game_name)
+    if not missing:
+        return infos
+
+    limiter = RateLimiter(settings.BGG_REQUESTS_PER_SECOND if rate is None else rate)
+    with ThreadPoolExecutor(max_workers or settings.BGG_MAX_WORKERS) as pool:
+        bgg_ids = dict(zip(missing, pool.map(lambda game_name: search_bgg_id(game_name, limiter=limiter), missing)))
+    details = fetch_bgg_games([bgg_id for bgg_id in bgg_ids.values() if bgg_id is not None], limiter=limiter)
+
+    fetched = {game_name: details.get(bgg_id) for game_name, bgg_id in bgg_ids.items()}
+    store_bgg_infos(fetched)
+    return infos | fetched
+
+
+async def alookup_bgg_info(game_name, conn=None):
+    # lookup_bgg_info for async views: the BGG call runs outside the request's thread, which stays free meanwhile.
+    hit, info = await sync_to_async(get_cached_bgg_info)(game_name)
+    if not hit:
+        info = await sync_to_async(fetch_bgg_info, thread_sensitive=False)(game_name, conn=conn)
+        await sync_to_async(store_bgg_info)(game_name, info)
+    return info
+
 
 def get_bgg_info(game_name):
-    # Search for a game by its name in the BGG database and extract game image.
-    conn = BGG()
-    game_name = conn.search(game_name.lower(), exact=True)
-    game_id = game_name['boardgames']['boardgame']['objectid']
-    game_img = conn.get_game(game_id)['boardgames']['boardgame']['image']['TEXT']
-    return game_img
+    # Game image from BGG, repeat lookups are served from the cache. KeyError if the game doesn't exist.
+    info = lookup_bgg_info(game_name)
+    if info is None:
+        raise KeyError(game_name)
+    return info['image']
+
+
+def enqueue_game_enrichment(game):
+    return enqueue_task('services.bgg_info.enrich_game', game_id=game.id)
+
+
+def enqueue_games_enrichment(games):
+    return enqueue_task('services.bgg_info.enrich_games', game_ids=[game.id for game in games])
+
+
+def enrich_games(game_ids):
+    """
+    Background task: fill in the image and details of many games with one batched lookup, written back with a
+    single bulk_update. Returns the games found on BGG.
+    """
+    games = list(Game.objects.filter(id__in=game_ids))
+    infos = lookup_bgg_infos([game.game_name for game in games])
+    found = []
+    for game in games:
+        info = infos.get(game.game_name)
+        if info is None:
+            continue
+        for field, value in info.items():
+            setattr(game, field, value)
+        game.image = game.image or settings.BGG_PLACEHOLDER_IMAGE
+        found.append(game)
+    Game.objects.bulk_update(found, BGG_INFO_FIELDS)
+    invalidate_user(*Game.user_id.through.objects.filter(game_id__in=[game.id for game in found])
+                    .values_list('user_id', flat=True).distinct())
+    return found
+
+
+def enrich_game(game_id):
+    # Background task: fill in the image and details of a game created with the placeholder image.
+    game = Game.objects.filter(id=game_id).first()
+    if game is None:
+        return
+    info = lookup_bgg_info(game.game_name)
+    if info is None:
+        raise PermanentTaskError(f'{game.game_name} does not exist on BoardGameGeek')
+    info['image'] = info['image'] or settings.BGG_PLACEHOLDER_IMAGE
+    Game.objects.filter(id=game_id).update(**info)
+    invalidate_game(game)
@@ -0,0 +1,47 @@
+from django.db import transaction
+
+from bg_tracker.models import Score, Statistic
+from services.cache import invalidate_stats
+from services.ratings import enqueue_ratings_rebuild
+from services.rollups import refresh_rollups
+from services.trends import invalidate_trend_buckets
+
+IMPORT_BATCH_SIZE = 1000
+
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def import_statistics(user, game, plays, players, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Write validated plays with bulk inserts inside one transaction.
+
+    Each play holds the Statistic fields plus 'winner' and 'players' usernames and a list of {'player': username,
+    'score': score} scores; players maps usernames to the user's Player instances. Returns the created statistics.
+    """
+    # Instances are built with raw *_id values, related descriptors add noticeable overhead on large imports.
+    player_ids = {username: player.id for username, player in players.items()}
+    created = []
+    with transaction.atomic():
+        for batch in _batches(plays, batch_size):
+            stats = Statistic.objects.bulk_create([
+                Statistic(user_id_id=user.id, game_id=game.id, stats_name=play['stats_name'],
+                          game_date=play['game_date'], duration=play['duration'], comments=play.get('comments'),
+                          winner_id=player_ids[play['winner']])
+                for play in batch])
+            Statistic.players.through.objects.bulk_create([
+                Statistic.players.through(statistic_id=stat.id, player_id=player_ids[username])
+                for stat, play in zip(stats, batch) for username in set(play['players'])])
+            Score.objects.bulk_create([
+                Score(stats_id=stat.id, player_id=player_ids[score['player']], score=score['score'])
+                for stat, play in zip(stats, batch) for score in play.get('scores', [])])
+            created.extend(stats)
+        refresh_rollups(user.id, game.id)
+        # imported plays may predate the recorded ones, ratings are replayed in date order in the background
+        enqueue_ratings_rebuild(user.id, game.id)
+        # bulk inserts send no signals
+        invalidate_stats(user.id, game.slug)
+        invalidate_trend_buckets(user.id, game.slug, *(play['game_date'] for play in plays))
+    return created
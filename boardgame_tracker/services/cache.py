@@ -0,0 +1,145 @@
+import datetime
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+CACHED_RESPONSES = ('game-list', 'game-page', 'overall-stat', 'leaderboard', 'api-game-list', 'api-game-detail',
+                    'api-stats-list', 'api-overall-stat', 'api-leaderboard')
+HIT, MISS = 'hits', 'misses'
+# game slug of the values covering every game of a user
+ALL_GAMES = '*'
+_MISSING = object()
+
+
+def _cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _user_scope(user_id):
+    return f'resp:version:user:{user_id}'
+
+
+def _stats_scope(user_id, game_slug):
+    return f'resp:version:stats:{user_id}:{game_slug}'
+
+
+def _counter_key(name, outcome):
+    return f'resp:counter:{name}:{outcome}'
+
+
+def _scopes(user_id, game_slug=None):
+    # Everything cached for a user depends on its players and game set, game pages also on the game's statistics.
+    scopes = [_user_scope(user_id)]
+    if game_slug is not None:
+        scopes.append(_stats_scope(user_id, game_slug))
+    return scopes
+
+
+def _set_versions(scopes):
+    if scopes:
+        _cache().set_many(dict.fromkeys(scopes, time.time_ns()), timeout=None)
+
+
+def get_scope_versions(scopes):
+    """
+    Return the current versions of the given scopes, in order.
+
+    A version is the time in nanoseconds of the last write in the scope. Versions missing from the cache (never
+    written or evicted) start now, which simply makes every older entry unreachable.
+    """
+    cache = _cache()
+    versions = cache.get_many(scopes)
+    missing = [scope for scope in scopes if scope not in versions]
+    if missing:
+        now = time.time_ns()
+        for scope in missing:
+            cache.add(scope, now, timeout=None)
+        versions |= cache.get_many(missing)
+    return [versions.get(scope, 0) for scope in scopes]
+
+
+def get_versions(user_id, game_slug=None):
+    # Versions of the scopes a cached value of the user (and game) depends on.
+    return get_scope_versions(_scopes(user_id, game_slug))
+
+
+def bump_scopes(scopes):
+    # Bumped right away for the current connection and again on commit, so a value cached from data read before
+    # the commit can't outlive the write.
+    _set_versions(scopes)
+    transaction.on_commit(lambda: _set_versions(scopes))
+
+
+def invalidate_user(*user_ids):
+    bump_scopes([_user_scope(user_id) for user_id in user_ids])
+
+
+def invalidate_stats(user_id, game_slug):
+    bump_scopes([_stats_scope(user_id, game_slug), _stats_scope(user_id, ALL_GAMES)])
+
+
+def invalidate_game(game):
+    # A game row is shown to every user who added it.
+    invalidate_user(*game.user_id.values_list('id', flat=True))
+
+
+def _count(name, outcome):
+    cache = _cache()
+    key = _counter_key(name, outcome)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # evicted between add and incr
+        cache.set(key, 1, timeout=None)
+
+
+def make_key(name, user_id, game_slug=None, variant=''):
+    versions = '.'.join(map(str, get_versions(user_id, game_slug)))
+    variant = hashlib.md5(variant.encode()).hexdigest() if variant else ''
+    return f'resp:{name}:{user_id}:{game_slug or ""}:{versions}:{variant}'
+
+
+def get_etag(name, user_id, game_slug=None, variant=''):
+    # Changes whenever the cached value of the same key would, without building the value.
+    return hashlib.md5(make_key(name, user_id, game_slug, variant).encode()).hexdigest()
+
+
+def get_last_modified(user_id, game_slug=None):
+    return datetime.datetime.fromtimestamp(max(get_versions(user_id, game_slug)) / 10 ** 9, tz=timezone.utc)
+
+
+def get_or_set(name, user_id, build, game_slug=None, variant=''):
+    """
+    Return the cached value of build() for the user (and game).
+
+    The key embeds the versions of the scopes the value depends on, so writes never delete entries: they bump a
+    version and stale entries expire on their own. variant tells apart values of the same page, e.g. query strings.
+    """
+    cache = _cache()
+    key = make_key(name, user_id, game_slug, variant)
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        _count(name, HIT)
+        return value
+    _count(name, MISS)
+    value = build()
+    cache.set(key, value, settings.RESPONSE_CACHE_TTL)
+    return value
+
+
+def get_cache_stats(names=None):
+    # Hit and miss counters, {name: {'hits': n, 'misses': n}}.
+    names = names or CACHED_RESPONSES
+    counters = _cache().get_many([_counter_key(name, outcome) for name in names for outcome in (HIT, MISS)])
+    return {name: {outcome: counters.get(_counter_key(name, outcome), 0) for outcome in (HIT, MISS)}
+            for name in names}
+
+
+def reset_cache_stats(names=None):
+    _cache().delete_many([_counter_key(name, outcome) for name in names or CACHED_RESPONSES for outcome in (HIT, MISS)])
+
@@ -0,0 +1,81 @@
+import csv
+import json
+from collections import defaultdict
+from itertools import islice
+
+from api.serializers import StatsSerializer
+from bg_tracker.models import Score, Statistic
+
+EXPORT_CHUNK_SIZE = 2000
+CSV_COLUMNS = ('id', 'game', 'stats_name', 'game_date', 'duration', 'comments', 'winner', 'players', 'scores')
+
+
+class Echo:
+    # File-like object for csv.writer which hands every written line back instead of storing it.
+    def write(self, value):
+        return value
+
+
+def _chunks(iterator, size):
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def iter_play_history(user, game_slug=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield every play of the user as a plain dict, oldest first.
+
+    Statistics are read with .iterator() and the players and scores of each chunk with one query each, so memory
+    stays flat however long the history is. Values are formatted by the fields of a single StatsSerializer.
+    """
+    fields = StatsSerializer().fields
+    stats = Statistic.objects.filter(user_id=user)
+    if game_slug is not None:
+        stats = stats.filter(game__slug=game_slug)
+    rows = stats.order_by('id').values_list('id', 'game__slug', 'stats_name', 'game_date', 'duration', 'comments',
+                                            'winner__username').iterator(chunk_size=chunk_size)
+
+    for chunk in _chunks(rows, chunk_size):
+        # the id range of the chunk keeps the queries free of huge IN lists
+        id_range = {'gte': chunk[0][0], 'lte': chunk[-1][0]}
+        players = defaultdict(list)
+        for stat_id, username in Statistic.players.through.objects.filter(
+                statistic__in=stats, statistic_id__gte=id_range['gte'], statistic_id__lte=id_range['lte']) \
+                .order_by('id').values_list('statistic_id', 'player__username'):
+            players[stat_id].append(username)
+        scores = defaultdict(list)
+        for stat_id, username, score in Score.objects.filter(
+                stats__in=stats, stats_id__gte=id_range['gte'], stats_id__lte=id_range['lte']) \
+                .order_by('id').values_list('stats_id', 'player__username', 'score'):
+            scores[stat_id].append({'player': username, 'score': score})
+
+        for stat_id, game, stats_name, game_date, duration, comments, winner in chunk:
+            yield {'id': stat_id, 'game': game, 'stats_name': stats_name,
+                   'game_date': fields['game_date'].to_representation(game_date),
+                   'duration': fields['duration'].to_representation(duration),
+                   'comments': comments, 'winner': winner,
+                   'players': players[stat_id], 'scores': scores[stat_id]}
+
+
+def to_csv_lines(plays):
+    # Same layout as the CSV accepted by the import_stats command. Players and scores are JSON columns, quoted by
+    # the writer, so no username character can be mistaken for a separator.
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for play in plays:
+        yield writer.writerow([
+            *(play[column] for column in CSV_COLUMNS[:-2]),
+            json.dumps(play['players']),
+            json.dumps(play['scores']),
+        ])
+
+
+def to_ndjson_lines(plays):
+    for play in plays:
+        yield json.dumps(play) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': (to_csv_lines, 'text/csv'),
+    'ndjson': (to_ndjson_lines, 'application/x-ndjson'),
+}
@@ -0,0 +1,97 @@
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """
+    Queries and timings of one request.
+
+    Every query of every database connection goes through record_query(). Sections (serializer, render...) are
+    timed with timed() and add up when entered several times.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = Counter()
+        self.query_count = 0
+        self.db_time = 0.0
+        self.sections = Counter()
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.query_count += 1
+            # the SQL still holds placeholders: the same statement with other parameters counts as a duplicate
+            self.queries[sql] += 1
+
+    @property
+    def duplicate_count(self):
+        return self.query_count - len(self.queries)
+
+    def most_duplicated(self):
+        # (sql, count) of the most repeated statement, the usual trace of an N+1 query
+        return self.queries.most_common(1)[0] if self.queries else (None, 0)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        # Value of the Server-Timing header, durations in milliseconds.
+        timings = [f'db;dur={self.db_time * 1000:.1f};desc="{self.query_count} queries, '
+                   f'{self.duplicate_count} duplicates"']
+        timings += [f'{section};dur={duration * 1000:.1f}' for section, duration in self.sections.items()]
+        timings.append(f'total;dur={self.elapsed() * 1000:.1f}')
+        return ', '.join(timings)
+
+    def as_dict(self):
+        return {'queries': self.query_count, 'duplicate_queries': self.duplicate_count,
+                'db_ms': round(self.db_time * 1000, 1), 'total_ms': round(self.elapsed() * 1000, 1)} | \
+               {f'{section}_ms': round(duration * 1000, 1) for section, duration in self.sections.items()}
+
+
+def get_request_metrics():
+    # Metrics of the request being instrumented, None when instrumentation is off.
+    return _current.get()
+
+
+@contextmanager
+def instrument():
+    # Record the queries of every connection in the block into a new RequestMetrics.
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics.record_query))
+            yield metrics
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def timed(section):
+    # Add the time spent in the block to a section of the current request metrics, if any.
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.sections[section] += time.perf_counter() - start
+
+
+def add_section_time(section, seconds):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.sections[section] += seconds
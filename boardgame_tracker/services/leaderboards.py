@@ -0,0 +1,81 @@
+from collections import defaultdict
+
+from django.db.models import Avg, Count, F
+
+from bg_tracker.models import Player, Score, Statistic
+from services.queries import filter_model_or_qs
+from services.ratings import get_ratings
+
+EMPTY_HEAD_TO_HEAD = {'count_played_game': 0, 'count_win': 0, 'count_lose': 0}
+
+
+def _percent(part, total):
+    return round(part / total * 100, 2) if total else 0
+
+
+def get_leaderboard(user, game_slug=None):
+    """
+    Leaderboard of every player of the user, for one game or all games.
+
+    Returns {'players': [...], 'head_to_head': {player_id: {opponent_id: {...}}}}, keyed by id since players of a
+    user can share a name. Players are sorted by win percentage, then wins; head_to_head only holds the pairs that
+    played together, count_win being the games the player won
+    against the opponent and count_lose the games the opponent won. Ratings are only given for a single game. Every
+    figure comes from one grouped query, five queries in total (six for a game) whatever the number of players and
+    plays.
+    """
+    scope = {'user_id': user} | ({'game__slug': game_slug} if game_slug is not None else {})
+    statistic_scope = {f'statistic__{lookup}': value for lookup, value in scope.items()}
+    played = Statistic.players.through.objects.filter(**statistic_scope)
+    usernames = dict(filter_model_or_qs(Player, user_friend=user).values_list('id', 'username'))
+
+    wins = dict(filter_model_or_qs(Statistic, **scope).values_list('winner_id').annotate(count=Count('id'))
+                .order_by())
+    scores = dict(filter_model_or_qs(Score, **{f'stats__{lookup}': value for lookup, value in scope.items()})
+                  .values_list('player_id').annotate(avg=Avg('score')).order_by())
+
+    # (winner, loser) pairs: the players of a game the winner took part in and won
+    beaten = played.filter(statistic__players__id=F('statistic__winner_id')) \
+        .exclude(player_id=F('statistic__winner_id')) \
+        .values_list('statistic__winner_id', 'player_id').annotate(count=Count('id')).order_by()
+    # (player, opponent) pairs of players sharing a game, through a self join of the players table. The diagonal
+    # (player, player) counts the games of each player.
+    together = played.values_list('player_id', 'statistic__players__id').annotate(count=Count('id')).order_by()
+
+    plays = {}
+    head_to_head = defaultdict(dict)
+
+    def pair(player_id, opponent_id):
+        return head_to_head[player_id].setdefault(opponent_id, EMPTY_HEAD_TO_HEAD.copy())
+
+    for player_id, opponent_id, count in together:
+        if player_id not in usernames or opponent_id not in usernames:
+            continue
+        if player_id == opponent_id:
+            plays[player_id] = count
+        else:
+            pair(player_id, opponent_id)['count_played_game'] = count
+    for winner_id, loser_id, count in beaten:
+        if winner_id in usernames and loser_id in usernames:
+            pair(winner_id, loser_id)['count_win'] = count
+            pair(loser_id, winner_id)['count_lose'] = count
+
+    ratings = get_ratings(user, game_slug) if game_slug is not None else {}
+
+    players = [{'player_id': player_id, 'player': username, 'count_played_game': plays.get(player_id, 0),
+                'count_win': wins.get(player_id, 0),
+                'percent_win': _percent(wins.get(player_id, 0), plays.get(player_id, 0)),
+                'avg_score': round(scores[player_id], 2) if scores.get(player_id) is not None else None,
+                'rating': round(ratings[player_id], 1) if player_id in ratings else None}
+               for player_id, username in usernames.items()]
+    players.sort(key=lambda row: (-row['percent_win'], -row['count_win'], row['player'], row['player_id']))
+    return {'players': players, 'head_to_head': dict(head_to_head)}
+
+
+def head_to_head_table(leaderboard):
+    # Dense rows for templates: [(username, [cell or None for every opponent in leaderboard order])].
+    player_ids = [row['player_id'] for row in leaderboard['players']]
+    matrix = leaderboard['head_to_head']
+    return [(row['player'], [matrix.get(row['player_id'], {}).get(opponent_id)
+                             if opponent_id != row['player_id'] else None for opponent_id in player_ids])
+            for row in leaderboard['players']]
@@ -1,48 +1,89 @@
-from django.db.models import Max, Min, Count, Q
+from functools import cached_property
+
+from django.db.models import Max, Min, Count, Q, Sum
+from django.db.models.functions import ExtractHour, ExtractMinute
 from django.shortcuts import get_object_or_404
 
-from bg_tracker.models import Statistic, Player, Score
+from bg_tracker.models import Statistic, Player, Score, GameStatsRollup
+
+
+def get_user_player(user):
+    # The player standing for the user, 404 until the user added themselves as a player.
+    return get_object_or_404(Player, Q(username__contains=user.username) & Q(user_friend=user.pk))
 
 
 class StatsFromModels:
+    """
+    Overall statistics of the user's own player for a single game.
+
+    The values are read from the player's GameStatsRollup row. Without a rollup (e.g. history recorded before rollups
+    existed) they are computed by two conditional-aggregate queries, one over the statistics and one over the scores.
+    """
+
     def __init__(self, game_slug, user):
         self._played_game = Statistic.objects.filter(game__slug=game_slug)
-        self._user_player = get_object_or_404(Player,
-                                              Q(username__contains=user.username) & Q(user_friend=user.pk))
-        self._scores = Score.objects.filter(stats__in=self._played_game)
-        self._count_played_game = self._played_game.filter(players=self._user_player).aggregate(Count('id'))
+        self._user_player = get_user_player(user)
+        self._scores = Score.objects.filter(stats__game__slug=game_slug, player=self._user_player)
+        self._rollup = GameStatsRollup.objects.filter(user=user.pk, game__slug=game_slug,
+                                                      player=self._user_player).first()
+
+    @cached_property
+    def _stats_aggregate(self):
+        if self._rollup is not None:
+            return {'count_played_game': self._rollup.count_played_game, 'count_win': self._rollup.count_win,
+                    'minutes': self._rollup.played_minutes}
+        played = Q(players=self._user_player)
+        return self._played_game.aggregate(
+            count_played_game=Count('id', filter=played),
+            count_win=Count('id', filter=Q(winner=self._user_player), distinct=True),
+            minutes=Sum(ExtractHour('duration') * 60 + ExtractMinute('duration'), filter=played),
+        )
+
+    @cached_property
+    def _scores_aggregate(self):
+        if self._rollup is not None:
+            return {'mx': self._rollup.max_score, 'mn': self._rollup.min_score}
+        return self._scores.aggregate(mx=Max('score'), mn=Min('score'))
 
     def get_sum_played_times(self):
-        played_time = self._played_game.filter(players=self._user_player)
-        minutes = sum(map(lambda time: time.duration.hour * 60 + time.duration.minute, played_time))
+        minutes = self._stats_aggregate['minutes'] or 0
         sum_played_time = f'{minutes // 60:02}:{minutes % 60:02}'
         return sum_played_time
 
     def get_count_win(self):
-        return self._played_game.filter(winner=self._user_player).aggregate(Count('id'))
+        return {'id__count': self._stats_aggregate['count_win']}
 
     def get_count_lose(self, count_win):
-        return self._count_played_game.get('id__count') - count_win.get('id__count')
+        return self._stats_aggregate['count_played_game'] - count_win.get('id__count')
 
     def get_percent_win(self, count_win):
         try:
-            percent_win = round(count_win.get('id__count') / self._count_played_game.get('id__count') * 100, 2)
+            percent_win = round(count_win.get('id__count') / self._stats_aggregate['count_played_game'] * 100, 2)
         except ZeroDivisionError:
             percent_win = 0
         return percent_win
 
     def get_percent_lose(self, count_lose):
         try:
-            percent_lose = round(count_lose / self._count_played_game.get('id__count') * 100, 2)
+            percent_lose = round(count_lose / self._stats_aggregate['count_played_game'] * 100, 2)
         except ZeroDivisionError:
             percent_lose = 0
         return percent_lose
 
     def get_max_score(self):
-        return self._scores.filter(player=self._user_player).aggregate(mx=Max('score'))
+        return {'mx': self._scores_aggregate['mx']}
 
     def get_min_score(self):
-        return self._scores.filter(player=self._user_player).aggregate(mn=Min('score'))
+        return {'mn': self._scores_aggregate['mn']}
 
     def get_count_played_game(self):
-        return self._count_played_game
+        return {'id__count': self._stats_aggregate['count_played_game']}
+
+    def get_overall_stat(self):
+        count_win = self.get_count_win()
+        count_lose = self.get_count_lose(count_win=count_win)
+        return {'count_win': count_win['id__count'], 'percent_win': self.get_percent_win(count_win=count_win),
+                'count_played_game': self.get_count_played_game()['id__count'],
+                'count_lose': count_lose, 'percent_lose': self.get_percent_lose(count_lose=count_lose),
+                'sum_played_time': self.get_sum_played_times(),
+                'best_score': self.get_max_score()['mx'], 'min_score': self.get_min_score()['mn']}
@@ -0,0 +1,92 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+@dataclass
+class KeysetPage:
+    object_list: list
+    next_cursor: str = None
+    previous_cursor: str = None
+
+
+class KeysetPaginator:
+    """
+    Keyset (seek) pagination over a queryset ordered by unique ordering fields, e.g. ('-game_date', '-pk').
+
+    The cursor holds the ordering values of the row a page starts after (or ends before), so pages never use OFFSET
+    and stay stable when rows are inserted concurrently. Works for querysets of model instances and of values() dicts.
+    """
+
+    def __init__(self, queryset, ordering, page_size):
+        self.queryset = queryset.order_by(*ordering)
+        self.ordering = ordering
+        self.page_size = page_size
+
+    def _fields(self):
+        return [(field.lstrip('-'), field.startswith('-')) for field in self.ordering]
+
+    def _model_field(self, name):
+        opts = self.queryset.model._meta
+        return opts.pk if name == 'pk' else opts.get_field(name)
+
+    @staticmethod
+    def _value(obj, name):
+        return obj[name] if isinstance(obj, dict) else getattr(obj, name)
+
+    def encode_cursor(self, obj, reverse=False):
+        values = [str(self._value(obj, name)) for name, _ in self._fields()]
+        data = json.dumps({'v': values, 'r': int(reverse)}).encode()
+        return base64.urlsafe_b64encode(data).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(data['v']) != len(self.ordering):
+                raise ValueError('cursor does not match the ordering')
+            values = [self._model_field(name).to_python(value) for (name, _), value in zip(self._fields(), data['v'])]
+            return values, bool(data['r'])
+        except (binascii.Error, ValidationError, ValueError, KeyError, TypeError) as e:
+            raise InvalidCursor(e)
+
+    def _seek(self, values, reverse):
+        # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y), with the comparison flipped for descending fields.
+        conditions = []
+        for index, ((name, descending), value) in enumerate(zip(self._fields(), values)):
+            lookup = 'lt' if descending != reverse else 'gt'
+            equal = {prev_name: prev_value for (prev_name, _), prev_value in zip(self._fields()[:index], values)}
+            conditions.append(Q(**equal, **{f'{name}__{lookup}': value}))
+        return reduce(lambda left, right: left | right, conditions)
+
+    def page(self, cursor=None):
+        if not cursor:
+            rows = list(self.queryset[:self.page_size + 1])
+            has_next = len(rows) > self.page_size
+            rows = rows[:self.page_size]
+            return KeysetPage(rows, next_cursor=self.encode_cursor(rows[-1]) if has_next else None)
+
+        values, reverse = self.decode_cursor(cursor)
+        queryset = self.queryset.filter(self._seek(values, reverse))
+        if reverse:
+            queryset = queryset.reverse()
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if reverse:
+            rows.reverse()
+            return KeysetPage(rows,
+                              next_cursor=self.encode_cursor(rows[-1]) if rows else None,
+                              previous_cursor=self.encode_cursor(rows[0], reverse=True) if has_more else None)
+        return KeysetPage(rows,
+                          next_cursor=self.encode_cursor(rows[-1]) if has_more else None,
+                          previous_cursor=self.encode_cursor(rows[0], reverse=True) if rows else None)
@@ -1,7 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils.text import slugify
 
-from bg_tracker.models import Game
+from bg_tracker.models import Game, Player
 
 User = get_user_model()
 
@@ -57,13 +58,19 @@ def delete_instance(model, **fields):
     tuple.delete()
 
 
+def _same_game(game_name):
+    # Names are unique by slug (Game.save), so "Catan" and "catan " are the same game.
+    slug = slugify(game_name)
+    return {'slug': slug} if slug else {'game_name': game_name}
+
+
 def game_added_by_user(game_name, user):
     user_ = User.objects.get(pk=user.pk)
-    return user_.game_set.filter(game_name=game_name).first() is not None
+    return user_.game_set.filter(**_same_game(game_name)).first() is not None
 
 
 def game_exists_in_db(game_name):
-    return Game.objects.filter(game_name=game_name).first()
+    return Game.objects.filter(**_same_game(game_name)).first()
 
 
 def add_game_to_user(game, user):
@@ -87,3 +94,10 @@ def add_user_in_game_set(instance_game, user):
 
 def remove_user_from_game_set(instance_user, game):
     instance_user.game_set.remove(game)
+
+
+def get_players_by_username(user, usernames=None):
+    players = filter_model_or_qs(Player, user_friend=user)
+    if usernames is not None:
+        players = players.filter(username__in=usernames)
+    return {player.username: player for player in players}
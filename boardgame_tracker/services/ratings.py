@@ -0,0 +1,118 @@
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+
+from bg_tracker.models import Game, PlayerRating, Statistic
+from services.cache import invalidate_stats
+from services.tasks import enqueue_task
+
+REBUILD_CHUNK_SIZE = 2000
+
+
+def expected_score(rating, opponent_rating):
+    return 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+
+
+def rate_match(ratings, winner_id, player_ids, k_factor=None):
+    """
+    Apply one play to ratings, a {player_id: [rating, matches]} dict holding every player of the play.
+
+    The winner beats each other player in a pairwise Elo duel worth K / (players - 1), so a play moves the ratings
+    by at most K whatever the number of players and rating points are neither created nor lost. O(players).
+    """
+    k_factor = settings.RATING_K_FACTOR if k_factor is None else k_factor
+    losers = [player_id for player_id in set(player_ids) if player_id != winner_id]
+    winner = ratings[winner_id]
+    if losers:
+        weight = k_factor / len(losers)
+        winner_rating = winner[0]
+        for loser_id in losers:
+            loser = ratings[loser_id]
+            delta = weight * (1 - expected_score(winner_rating, loser[0]))
+            winner[0] += delta
+            loser[0] -= delta
+            loser[1] += 1
+    winner[1] += 1
+
+
+def add_statistic_to_ratings(stat, player_ids):
+    # Called once the players have been attached to a freshly created statistic, in its transaction.
+    player_ids = {*player_ids, stat.winner_id}
+    PlayerRating.objects.bulk_create(
+        [PlayerRating(player_id=player_id, game_id=stat.game_id, rating=settings.RATING_INITIAL)
+         for player_id in player_ids], ignore_conflicts=True)
+    rows = {rating.player_id: rating for rating in PlayerRating.objects.select_for_update()
+            .filter(game_id=stat.game_id, player_id__in=player_ids)}
+    ratings = {player_id: [rating.rating, rating.matches] for player_id, rating in rows.items()}
+    rate_match(ratings, stat.winner_id, player_ids)
+    for player_id, (rating, matches) in ratings.items():
+        rows[player_id].rating, rows[player_id].matches = rating, matches
+    PlayerRating.objects.bulk_update(rows.values(), ['rating', 'matches'])
+
+
+def compute_ratings(statistics, chunk_size=REBUILD_CHUNK_SIZE):
+    """
+    Replay the given statistics in (game_date, id) order, returns {(player_id, game_id): [rating, matches]}.
+
+    The players of every play are streamed by a single ordered query read with .iterator(), so memory only grows
+    with the number of ratings, not with the number of plays.
+    """
+    ratings = {}
+    rows = Statistic.players.through.objects.filter(statistic__in=statistics) \
+        .order_by('statistic__game_date', 'statistic_id', 'player_id') \
+        .values_list('statistic_id', 'statistic__game_id', 'statistic__winner_id', 'player_id') \
+        .iterator(chunk_size=chunk_size)
+    for (_, game_id, winner_id), play in groupby(rows, key=lambda row: row[:3]):
+        player_ids = [row[3] for row in play]
+        match = {player_id: ratings.setdefault((player_id, game_id), [settings.RATING_INITIAL, 0])
+                 for player_id in {*player_ids, winner_id}}
+        rate_match(match, winner_id, player_ids)
+    return ratings
+
+
+def rebuild_ratings(user_id=None, game_id=None, chunk_size=REBUILD_CHUNK_SIZE):
+    # Deterministic full rebuild of the ratings of a user and/or a game, all ratings by default.
+    scope = {'user_id': user_id, 'game_id': game_id}
+    statistics = Statistic.objects.filter(**{field: value for field, value in scope.items() if value is not None})
+    stored = PlayerRating.objects.all()
+    if user_id is not None:
+        stored = stored.filter(player__user_friend_id=user_id)
+    if game_id is not None:
+        stored = stored.filter(game_id=game_id)
+
+    with transaction.atomic():
+        ratings = compute_ratings(statistics, chunk_size=chunk_size)
+        updated, stale = [], []
+        for rating in stored.iterator(chunk_size=chunk_size):
+            values = ratings.pop((rating.player_id, rating.game_id), None)
+            if values is None:
+                stale.append(rating.id)
+                continue
+            rating.rating, rating.matches = values
+            updated.append(rating)
+        PlayerRating.objects.bulk_update(updated, ['rating', 'matches'], batch_size=chunk_size)
+        PlayerRating.objects.bulk_create([PlayerRating(player_id=player_id, game_id=game_id, rating=rating,
+                                                       matches=matches)
+                                          for (player_id, game_id), (rating, matches) in ratings.items()],
+                                         batch_size=chunk_size)
+        for start in range(0, len(stale), chunk_size):
+            PlayerRating.objects.filter(id__in=stale[start:start + chunk_size]).delete()
+
+        # ratings are shown on the cached leaderboards
+        affected = set(statistics.values_list('user_id', 'game__slug').distinct().order_by())
+        if user_id is not None and game_id is not None:
+            affected |= {(user_id, slug) for slug in Game.objects.filter(id=game_id).values_list('slug', flat=True)}
+        for user, slug in affected:
+            invalidate_stats(user, slug)
+    return len(updated) + len(ratings)
+
+
+def enqueue_ratings_rebuild(user_id, game_id):
+    # Deleted plays can't be taken back incrementally, the affected ratings are replayed in the background.
+    return enqueue_task('services.ratings.rebuild_ratings', user_id=user_id, game_id=game_id)
+
+
+def get_ratings(user, game_slug):
+    return dict(PlayerRating.objects.filter(player__user_friend=user, game__slug=game_slug)
+                .values_list('player_id', 'rating'))
@@ -0,0 +1,142 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Max, Min, Sum, Value, When
+from django.db.models.functions import Coalesce, ExtractHour, ExtractMinute, Greatest, Least
+
+from bg_tracker.models import GameStatsRollup, Statistic
+from services.queries import filter_model_or_qs
+from services.ratings import enqueue_ratings_rebuild
+
+ROLLUP_FIELDS = ('count_played_game', 'count_win', 'played_minutes', 'count_score', 'sum_score', 'min_score',
+                 'max_score')
+EMPTY_ROLLUP = dict.fromkeys(ROLLUP_FIELDS, 0) | {'min_score': None, 'max_score': None}
+
+
+def _duration_minutes(duration):
+    return duration.hour * 60 + duration.minute
+
+
+def _ensure_rollups(user_id, game_id, player_ids):
+    GameStatsRollup.objects.bulk_create(
+        [GameStatsRollup(user_id=user_id, game_id=game_id, player_id=player_id) for player_id in set(player_ids)],
+        ignore_conflicts=True)
+
+
+def add_statistic_to_rollups(stat, player_ids):
+    # Called once the players have been attached to a freshly created statistic.
+    user_id, game_id = stat.user_id_id, stat.game_id
+    _ensure_rollups(user_id, game_id, [*player_ids, stat.winner_id])
+    rollups = GameStatsRollup.objects.filter(user_id=user_id, game_id=game_id)
+    rollups.filter(player_id__in=player_ids).update(count_played_game=F('count_played_game') + 1,
+                                                    played_minutes=F('played_minutes') +
+                                                    _duration_minutes(stat.duration))
+    rollups.filter(player_id=stat.winner_id).update(count_win=F('count_win') + 1)
+
+
+def _per_player(values):
+    # CASE player_id WHEN ... THEN value END, lets a single UPDATE apply different values to every player's row.
+    return Case(*[When(player_id=player_id, then=Value(value)) for player_id, value in values.items()],
+                output_field=IntegerField())
+
+
+def add_scores_to_rollups(stat, *scores):
+    if not scores:
+        return
+    by_player = defaultdict(list)
+    for score in scores:
+        by_player[score.player_id].append(score.score)
+    _ensure_rollups(stat.user_id_id, stat.game_id, by_player)
+    mn = _per_player({player_id: min(values) for player_id, values in by_player.items()})
+    mx = _per_player({player_id: max(values) for player_id, values in by_player.items()})
+    GameStatsRollup.objects.filter(user_id=stat.user_id_id, game_id=stat.game_id, player_id__in=by_player).update(
+        count_score=F('count_score') + _per_player({player_id: len(values) for player_id, values in by_player.items()}),
+        sum_score=F('sum_score') + _per_player({player_id: sum(values) for player_id, values in by_player.items()}),
+        min_score=Least(Coalesce(F('min_score'), mn), mn),
+        max_score=Greatest(Coalesce(F('max_score'), mx), mx),
+    )
+
+
+def compute_rollups(statistics):
+    # Build rollup values for every (user, game, player) touched by the given statistics queryset. Related models
+    # are taken from the queryset's model, so migrations can pass a queryset of the historical Statistic.
+    played_model = statistics.model.players.through
+    score_model = statistics.model._meta.get_field('score').related_model
+    rollups = {}
+
+    def rollup(user_id, game_id, player_id):
+        return rollups.setdefault((user_id, game_id, player_id), EMPTY_ROLLUP.copy())
+
+    played = played_model.objects.filter(statistic__in=statistics) \
+        .values_list('statistic__user_id', 'statistic__game_id', 'player_id') \
+        .annotate(count=Count('id'),
+                  minutes=Sum(ExtractHour('statistic__duration') * 60 + ExtractMinute('statistic__duration')))
+    for user_id, game_id, player_id, count, minutes in played:
+        rollup(user_id, game_id, player_id).update(count_played_game=count, played_minutes=minutes or 0)
+
+    wins = statistics.values_list('user_id', 'game_id', 'winner_id').annotate(count=Count('id')).order_by()
+    for user_id, game_id, player_id, count in wins:
+        rollup(user_id, game_id, player_id)['count_win'] = count
+
+    scores = score_model.objects.filter(stats__in=statistics) \
+        .values_list('stats__user_id', 'stats__game_id', 'player_id') \
+        .annotate(count=Count('id'), total=Sum('score'), mn=Min('score'), mx=Max('score'))
+    for user_id, game_id, player_id, count, total, mn, mx in scores:
+        rollup(user_id, game_id, player_id).update(count_score=count, sum_score=total, min_score=mn, max_score=mx)
+
+    return rollups
+
+
+def _rollup_instances(rollups):
+    return [GameStatsRollup(user_id=user_id, game_id=game_id, player_id=player_id, **values)
+            for (user_id, game_id, player_id), values in rollups.items()]
+
+
+def refresh_rollups(user_id, game_id):
+    # Recompute the rollups of one (user, game) in place.
+    with transaction.atomic():
+        rollups = compute_rollups(Statistic.objects.filter(user_id=user_id, game_id=game_id))
+        existing = []
+        for instance in GameStatsRollup.objects.filter(user_id=user_id, game_id=game_id):
+            values = rollups.pop((user_id, game_id, instance.player_id), EMPTY_ROLLUP)
+            for field in ROLLUP_FIELDS:
+                setattr(instance, field, values[field])
+            existing.append(instance)
+        GameStatsRollup.objects.bulk_update(existing, ROLLUP_FIELDS)
+        GameStatsRollup.objects.bulk_create(_rollup_instances(rollups))
+
+
+def delete_statistics(statistics):
+    # Min/max scores can't be decremented, so affected (user, game) rollups are recomputed after the delete and
+    # their ratings replayed in the background.
+    with transaction.atomic():
+        affected = set(statistics.values_list('user_id', 'game_id'))
+        statistics.delete()
+        for user_id, game_id in affected:
+            refresh_rollups(user_id, game_id)
+            enqueue_ratings_rebuild(user_id, game_id)
+
+
+def _scoped(model_or_qs, user, user_field):
+    return filter_model_or_qs(model_or_qs, **{user_field: user}) if user is not None else model_or_qs.objects.all()
+
+
+def rebuild_rollups(user=None, batch_size=1000):
+    rollups = compute_rollups(_scoped(Statistic, user, 'user_id'))
+    with transaction.atomic():
+        _scoped(GameStatsRollup, user, 'user').delete()
+        GameStatsRollup.objects.bulk_create(_rollup_instances(rollups), batch_size=batch_size)
+    return len(rollups)
+
+
+def find_rollup_drift(user=None):
+    # Compare stored rollups against the live tables, returns {key: (stored, expected)} for every mismatch.
+    expected = compute_rollups(_scoped(Statistic, user, 'user_id'))
+    stored = {
+        (rollup['user_id'], rollup['game_id'], rollup['player_id']): {field: rollup[field] for field in ROLLUP_FIELDS}
+        for rollup in _scoped(GameStatsRollup, user, 'user').values('user_id', 'game_id', 'player_id',
+                                                                     *ROLLUP_FIELDS)
+    }
+    return {key: (stored.get(key), expected.get(key))
+            for key in stored.keys() | expected.keys()
+            if stored.get(key, EMPTY_ROLLUP) != expected.get(key, EMPTY_ROLLUP)}
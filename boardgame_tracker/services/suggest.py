@@ -0,0 +1,161 @@
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+
+from django.core.cache import cache
+from django.utils.text import slugify
+
+from bg_tracker.models import BggCatalog, Game
+
+SUGGEST_VERSION_KEY = 'suggest:version'
+# how long the changes of the names stay readable by the other processes, and the most they replay at once
+SUGGEST_CHANGE_TTL = 60 * 60
+SUGGEST_MAX_CHANGES = 1000
+
+
+def suggest_key(text):
+    # Same normalization as Game.slug: accents and case are dropped, words are joined by '-'.
+    return slugify(text)
+
+
+def _word_keys(key):
+    # Every word start of a key after the first one, so 'mars' finds 'terraforming-mars'.
+    return [key[i + 1:] for i, char in enumerate(key) if char == '-']
+
+
+class SuggestionIndex:
+    """
+    Game names (games and catalog) in sorted arrays of their keys, answered with two binary searches.
+
+    Names starting with the query come first, then names with a later word starting with it, each in key order.
+    Game saves and deletes bump a version in Django's cache and log their change under it for SUGGEST_CHANGE_TTL.
+    Every process applies the changes it's missing before answering. It only rebuilds the whole index when the log
+    has a gap: expired entries, more than SUGGEST_MAX_CHANGES behind, or a write sending no signals.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names = Counter()
+        self._prefixes = []
+        self._words = []
+        self.version = None
+
+    def build(self):
+        version = _current_version()
+        names = Counter(Game.objects.values_list('game_name', flat=True).iterator())
+        names.update(BggCatalog.objects.values_list('name', flat=True).iterator())
+        prefixes, words = [], []
+        for name in names:
+            key = suggest_key(name)
+            if key:
+                prefixes.append((key, name))
+                words.extend((word, name) for word in _word_keys(key))
+        prefixes.sort()
+        words.sort()
+        with self._lock:
+            self._names, self._prefixes, self._words, self.version = names, prefixes, words, version
+
+    def add(self, name):
+        self._log(name, 1)
+
+    def remove(self, name):
+        self._log(name, -1)
+
+    def _log(self, name, count):
+        version = _bump_version()
+        cache.set(_change_key(version), (name, count), SUGGEST_CHANGE_TTL)
+        with self._lock:
+            if self.version is not None and version <= self.version:
+                # the version was evicted and started over
+                self.version = None
+        self.sync(version)
+
+    def sync(self, version=None):
+        # Catch up with the shared version, from the change log when it has every missing change.
+        version = _current_version() if version is None else version
+        with self._lock:
+            if version == self.version:
+                return
+            missing = range(self.version + 1, version + 1) if self.version is not None else range(0)
+            # empty after a reset of the version, which the log can't bridge
+            changes = cache.get_many([_change_key(number) for number in missing]) \
+                if 0 < len(missing) <= SUGGEST_MAX_CHANGES else {}
+            if missing and len(changes) == len(missing):
+                for number in missing:
+                    self._apply(*changes[_change_key(number)])
+                self.version = version
+                return
+        self.build()
+
+    def _apply(self, name, count):
+        self._names[name] += count
+        if self._names[name] > 0 and (count < 0 or self._names[name] > 1):
+            # still indexed through another source, e.g. a game of the catalog
+            return
+        if self._names[name] <= 0:
+            del self._names[name]
+        key = suggest_key(name)
+        if not key:
+            return
+        entries = [(self._prefixes, key)] + [(self._words, word) for word in _word_keys(key)]
+        for array, entry_key in entries:
+            if count > 0:
+                insort(array, (entry_key, name))
+            else:
+                index = bisect_left(array, (entry_key, name))
+                if index < len(array) and array[index] == (entry_key, name):
+                    del array[index]
+
+    def search(self, text, limit=10):
+        self.sync()
+        query = suggest_key(text)
+        if not query:
+            return []
+        with self._lock:
+            names = _starting_with(self._prefixes, query, limit)
+            for name in _starting_with(self._words, query, limit + len(names)):
+                if len(names) == limit:
+                    break
+                if name not in names:
+                    names.append(name)
+        return names
+
+
+def _starting_with(array, query, limit):
+    names = []
+    index = bisect_left(array, (query,))
+    while index < len(array) and len(names) < limit and array[index][0].startswith(query):
+        names.append(array[index][1])
+        index += 1
+    return names
+
+
+def _change_key(version):
+    return f'suggest:change:{version}'
+
+
+def _current_version():
+    cache.add(SUGGEST_VERSION_KEY, 0, timeout=None)
+    return cache.get(SUGGEST_VERSION_KEY)
+
+
+def _bump_version():
+    try:
+        return cache.incr(SUGGEST_VERSION_KEY)
+    except ValueError:
+        # evicted since it was read
+        cache.add(SUGGEST_VERSION_KEY, 1, timeout=None)
+        return cache.get(SUGGEST_VERSION_KEY)
+
+
+def invalidate_suggestions():
+    # For writes sending no signals (catalog loads, bulk creates): the version has no logged change, so every
+    # process rebuilds its index.
+    _bump_version()
+
+
+suggestion_index = SuggestionIndex()
+
+
+def suggest_game_names(text, limit=10):
+    return suggestion_index.search(text, limit)
@@ -0,0 +1,95 @@
+import datetime
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils.text import slugify
+
+from bg_tracker.models import Game, Player, Score, Statistic
+from services.ratings import rebuild_ratings
+from services.rollups import rebuild_rollups
+from services.suggest import invalidate_suggestions
+
+User = get_user_model()
+
+SYNTHETIC_PASSWORD = 'synthetic'
+GENERATE_BATCH_SIZE = 5000
+HISTORY_DAYS = 5 * 365
+
+
+def _batched_create(model, objects, batch_size):
+    created = []
+    for start in range(0, len(objects), batch_size):
+        created.extend(model.objects.bulk_create(objects[start:start + batch_size]))
+    return created
+
+
+def _create_games(count, batch_size):
+    names = [f'synthetic game {index}' for index in range(count)]
+    existing = set(Game.objects.filter(game_name__in=names).values_list('game_name', flat=True))
+    # bulk_create skips Game.save, so the slug is set here
+    _batched_create(Game, [Game(game_name=name, slug=slugify(name), image='') for name in names
+                           if name not in existing], batch_size)
+    invalidate_suggestions()
+    return list(Game.objects.filter(game_name__in=names).order_by('id').values_list('id', flat=True))
+
+
+def _plays_of_user(rng, user, game_ids, player_ids, plays, today):
+    # One user's plays: 2 to 5 of its players per play, the first player is the user itself and plays most often.
+    stats, players, scores = [], [], []
+    for _ in range(plays):
+        count = rng.randint(2, min(5, len(player_ids)))
+        playing = [player_ids[0], *rng.sample(player_ids[1:], count - 1)] if rng.random() < 0.8 \
+            else rng.sample(player_ids, count)
+        stats.append(Statistic(user_id_id=user.id, game_id=rng.choice(game_ids), stats_name='synthetic play',
+                               game_date=today - datetime.timedelta(days=rng.randrange(HISTORY_DAYS)),
+                               duration=datetime.time(rng.randint(0, 3), rng.choice((0, 15, 30, 45))),
+                               winner_id=rng.choice(playing)))
+        players.append(playing)
+        scores.append([rng.randint(0, 150) for _ in playing])
+    return stats, players, scores
+
+
+def generate_dataset(users, games, players, plays, seed=0, batch_size=GENERATE_BATCH_SIZE, log=None):
+    """
+    Create `users` users, each owning `games` games and `players` players (the first one named like the user) and
+    recording `plays` plays with their players and scores. Everything is written with bulk_create, then the rollups
+    and ratings are rebuilt once. The same seed produces the same dataset.
+
+    Users are named synthetic-<n>@example.com, numbering continues after the synthetic users already present.
+    """
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    password = make_password(SYNTHETIC_PASSWORD)
+    game_pool = _create_games(games * 2, batch_size)
+    first = User.objects.filter(email__startswith='synthetic-').count()
+
+    for index in range(first, first + users):
+        with transaction.atomic():
+            user = User.objects.create(username=f'synthetic-{index}', email=f'synthetic-{index}@example.com',
+                                       password=password)
+            game_ids = rng.sample(game_pool, games)
+            Game.user_id.through.objects.bulk_create([Game.user_id.through(game_id=game_id, user_id=user.id)
+                                                      for game_id in game_ids])
+            # the user's own player is found by username, so the others must not contain it
+            player_ids = [player.id for player in Player.objects.bulk_create(
+                [Player(username=user.username if number == 0 else f'friend {number}',
+                        user_friend_id=user.id) for number in range(players)])]
+
+            for start in range(0, plays, batch_size):
+                stats, playing, scores = _plays_of_user(rng, user, game_ids, player_ids,
+                                                        min(batch_size, plays - start), today)
+                stats = Statistic.objects.bulk_create(stats)
+                _batched_create(Statistic.players.through, [
+                    Statistic.players.through(statistic_id=stat.id, player_id=player_id)
+                    for stat, player_ids_ in zip(stats, playing) for player_id in player_ids_], batch_size)
+                _batched_create(Score, [
+                    Score(stats_id=stat.id, player_id=player_id, score=score)
+                    for stat, player_ids_, scores_ in zip(stats, playing, scores)
+                    for player_id, score in zip(player_ids_, scores_)], batch_size)
+        if log is not None:
+            log(f'user {index - first + 1}/{users}: {plays} plays')
+
+    rebuild_rollups(batch_size=batch_size)
+    rebuild_ratings(chunk_size=batch_size)
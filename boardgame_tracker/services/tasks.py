@@ -0,0 +1,76 @@
+import datetime
+import logging
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from bg_tracker.models import BackgroundTask
+
+logger = logging.getLogger(__name__)
+
+
+class PermanentTaskError(Exception):
+    """Raised by a task function when retrying can't help, the task is failed right away."""
+
+
+def enqueue_task(func, run_after=None, **payload):
+    # func is the dotted path of a function taking the payload as keyword arguments.
+    return BackgroundTask.objects.create(func=func, payload=payload, max_attempts=settings.TASK_MAX_ATTEMPTS,
+                                         run_after=run_after or timezone.now())
+
+
+def get_retry_delay(attempts):
+    return min(settings.TASK_RETRY_BACKOFF * 2 ** (attempts - 1), settings.TASK_RETRY_BACKOFF_MAX)
+
+
+def requeue_stale_tasks():
+    # Tasks left running by a crashed worker go back to the queue.
+    stale = timezone.now() - datetime.timedelta(seconds=settings.TASK_RUNNING_TIMEOUT)
+    return BackgroundTask.objects.filter(status=BackgroundTask.RUNNING, updated_at__lt=stale) \
+        .update(status=BackgroundTask.PENDING, updated_at=timezone.now())
+
+
+def claim_next_task():
+    # The conditional update makes sure a task is claimed by a single worker.
+    while True:
+        task_id = BackgroundTask.objects.filter(status=BackgroundTask.PENDING, run_after__lte=timezone.now()) \
+            .order_by('run_after', 'id').values_list('id', flat=True).first()
+        if task_id is None:
+            return None
+        claimed = BackgroundTask.objects.filter(id=task_id, status=BackgroundTask.PENDING) \
+            .update(status=BackgroundTask.RUNNING, attempts=F('attempts') + 1, updated_at=timezone.now())
+        if claimed:
+            return BackgroundTask.objects.get(id=task_id)
+
+
+def run_task(task):
+    try:
+        import_string(task.func)(**task.payload)
+    except PermanentTaskError as e:
+        logger.warning(f'{type(e)}, {e}; task: {task.id} {task.func}')
+        task.status, task.last_error = BackgroundTask.FAILED, str(e)
+    except Exception as e:
+        logger.warning(f'{type(e)}, {e}; task: {task.id} {task.func}, attempt {task.attempts}')
+        task.last_error = f'{type(e).__name__}: {e}'
+        if task.attempts >= task.max_attempts:
+            task.status = BackgroundTask.FAILED
+        else:
+            task.status = BackgroundTask.PENDING
+            task.run_after = timezone.now() + datetime.timedelta(seconds=get_retry_delay(task.attempts))
+    else:
+        task.status, task.last_error = BackgroundTask.DONE, ''
+    task.save(update_fields=['status', 'last_error', 'run_after', 'updated_at'])
+    return task
+
+
+def run_pending_tasks(limit=None):
+    processed = 0
+    while limit is None or processed < limit:
+        task = claim_next_task()
+        if task is None:
+            break
+        run_task(task)
+        processed += 1
+    return processed
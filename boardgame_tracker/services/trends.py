@@ -0,0 +1,154 @@
+import datetime
+from functools import reduce
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Avg, Count, Max, Min, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import ExtractHour, ExtractMinute, TruncMonth, TruncWeek, TruncYear
+from django.utils import timezone
+
+from bg_tracker.models import Score, Statistic
+from services.cache import bump_scopes, get_or_set, get_scope_versions
+from services.overall_stat import get_user_player
+
+PERIODS = {'week': TruncWeek, 'month': TruncMonth, 'year': TruncYear}
+
+
+def period_start(period, day):
+    if period == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day.replace(month=1, day=1)
+
+
+def next_period_start(period, start):
+    if period == 'week':
+        return start + datetime.timedelta(days=7)
+    if period == 'month':
+        return (start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return start.replace(year=start.year + 1)
+
+
+def count_periods(period, date_from, date_to):
+    # Number of buckets iter_periods yields, without building them.
+    if date_from > date_to:
+        return 0
+    if period == 'week':
+        return (period_start(period, date_to) - period_start(period, date_from)).days // 7 + 1
+    if period == 'month':
+        return (date_to.year - date_from.year) * 12 + date_to.month - date_from.month + 1
+    return date_to.year - date_from.year + 1
+
+
+def latest_date_to():
+    # Far enough for plays entered ahead, short of the calendar end where the next bucket can't be computed.
+    return timezone.localdate() + datetime.timedelta(days=366)
+
+
+def iter_periods(period, date_from, date_to):
+    start = period_start(period, date_from)
+    while start <= date_to:
+        yield start
+        start = next_period_start(period, start)
+
+
+def _as_date(value):
+    # game_date defaults to timezone.now, a datetime, until the statistic is read back from the database
+    return value.date() if isinstance(value, datetime.datetime) else value
+
+
+def _bucket_scope(user_id, game_slug, period, start):
+    return f'trend:version:{user_id}:{game_slug}:{period}:{start.isoformat()}'
+
+
+def invalidate_trend_buckets(user_id, game_slug, *dates):
+    # Only the week, month and year containing each changed play are recomputed.
+    bump_scopes([_bucket_scope(user_id, game_slug, period, period_start(period, _as_date(day)))
+                 for day in set(dates) for period in PERIODS])
+
+
+def _ranges(period, starts):
+    # Merge consecutive buckets into [start, end) date ranges.
+    ranges = []
+    for start in starts:
+        end = next_period_start(period, start)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    return ranges
+
+
+def _aggregate(player, statistics, period, starts):
+    in_buckets = reduce(lambda left, right: left | right,
+                        [Q(game_date__gte=start, game_date__lt=end) for start, end in _ranges(period, starts)])
+    player_score = Score.objects.filter(stats=OuterRef('pk'), player=player).values('score')[:1]
+    rows = statistics.filter(in_buckets, players=player) \
+        .annotate(period_start=PERIODS[period]('game_date'), player_score=Subquery(player_score)) \
+        .values('period_start') \
+        .annotate(count_played_game=Count('id'), count_win=Count('id', filter=Q(winner=player)),
+                  minutes=Sum(ExtractHour('duration') * 60 + ExtractMinute('duration')),
+                  avg_score=Avg('player_score'), best_score=Max('player_score'), min_score=Min('player_score')) \
+        .order_by()
+    return {_as_date(row['period_start']): row for row in rows}
+
+
+def _bucket(start, row):
+    played, won, minutes = (row['count_played_game'], row['count_win'], row['minutes'] or 0) if row else (0, 0, 0)
+    avg_score = row and row['avg_score']
+    return {'period_start': start, 'count_played_game': played, 'count_win': won,
+            'percent_win': round(won / played * 100, 2) if played else 0,
+            'sum_played_time': f'{minutes // 60:02}:{minutes % 60:02}',
+            'avg_score': round(avg_score, 2) if avg_score is not None else None,
+            'best_score': row and row['best_score'], 'min_score': row and row['min_score']}
+
+
+def _earliest_date_from(period, date_to):
+    start = period_start(period, date_to)
+    if period == 'week':
+        return start - datetime.timedelta(weeks=settings.TRENDS_MAX_BUCKETS - 1)
+    if period == 'month':
+        months = start.year * 12 + start.month - settings.TRENDS_MAX_BUCKETS
+        return start.replace(year=months // 12, month=months % 12 + 1)
+    return start.replace(year=start.year - settings.TRENDS_MAX_BUCKETS + 1)
+
+
+def get_trends(user, game_slug, period='month', date_from=None, date_to=None):
+    """
+    Per week, month or year statistics of the user's own player for a game, oldest bucket first.
+
+    Every bucket overlapping [date_from, date_to] is returned whole, empty ones included. date_from defaults to the
+    first play and date_to to today. Closed buckets are cached until a play inside them changes, the others are
+    computed by a single grouped query.
+    """
+    player = get_user_player(user)
+    statistics = Statistic.objects.filter(user_id=user, game__slug=game_slug)
+    date_to = date_to or timezone.localdate()
+    if date_from is None:
+        date_from = get_or_set('trend-first-play', user.pk, game_slug=game_slug,
+                               build=lambda: statistics.order_by('game_date').values_list('game_date', flat=True)
+                               .first())
+        if date_from is None:
+            return []
+    if count_periods(period, date_from, date_to) > settings.TRENDS_MAX_BUCKETS:
+        # a first play far back only shows the latest buckets
+        date_from = _earliest_date_from(period, date_to)
+
+    cache = caches[settings.RESPONSE_CACHE_ALIAS]
+    starts = list(iter_periods(period, date_from, date_to))
+    today = timezone.localdate()
+    closed = [start for start in starts if next_period_start(period, start) <= today]
+    versions = get_scope_versions([_bucket_scope(user.pk, game_slug, period, start) for start in closed])
+    keys = {start: f'trend:{user.pk}:{game_slug}:{player.pk}:{period}:{start.isoformat()}:{version}'
+            for start, version in zip(closed, versions)}
+    cached = cache.get_many(keys.values())
+    buckets = {start: cached[key] for start, key in keys.items() if key in cached}
+
+    missing = [start for start in starts if start not in buckets]
+    if missing:
+        rows = _aggregate(player, statistics, period, missing)
+        computed = {start: _bucket(start, rows.get(start)) for start in missing}
+        cache.set_many({keys[start]: bucket for start, bucket in computed.items() if start in keys}, timeout=None)
+        buckets |= computed
+    return [buckets[start] for start in starts]